@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for Vaporize.
+
+Each module can be run on its own, e.g. ``python -m benchmarks.dotdict``.
+"""
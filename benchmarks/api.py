@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""Measure Vaporize end to end against a local stand-in for the API.
+
+Runs list, find, pagination and bulk mutation scenarios through the real
+transport and decoders against :class:`benchmarks.fakeapi.FakeAPI`, and
+reports for each the best wall time, requests made, throughput, request
+latency percentiles and peak memory allocated (Python 3 only).
+
+    $ python -m benchmarks.api --count 5000 --output 0.4.json
+    $ python -m benchmarks.api --count 5000 --compare 0.4.json
+
+Reports saved with ``--output`` record the Vaporize and Python versions and
+the JSON codec, and can be compared against later runs with ``--compare``.
+The stand-in runs in the benchmark's own process and shares its
+interpreter, so only compare reports made on the same machine.
+"""
+
+import argparse
+import json
+import platform
+import threading
+import time
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2.x
+    tracemalloc = None
+
+import vaporize
+from vaporize import batch, core
+from vaporize.databases import Instance
+from vaporize.domains import Domain
+from vaporize.loadbalancers import LoadBalancer
+from vaporize.nextgen_servers import NextGenServer
+from vaporize.servers import Server
+from vaporize.volumes import Volume
+
+from benchmarks.fakeapi import FakeAPI
+
+
+class Latencies(core.Observer):
+    """Records the time taken by every request."""
+    def __init__(self):
+        self.values = []
+        self._lock = threading.Lock()
+
+    def after_response(self, request, response):
+        with self._lock:
+            self.values.append(request.elapsed)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def scenarios(finds, mutations):
+    """Returns ``(name, setup, run)`` for every scenario.
+
+    ``setup`` is called once and returns the argument given to ``run``,
+    which returns the number of resources handled.
+    """
+    def nextgen_servers():
+        return NextGenServer.list(detail=True)
+
+    def records():
+        return Domain(id=1).records
+
+    return [
+        ('list servers', None,
+         lambda arg: len(Server.list(detail=True))),
+        ('list nextgen servers', None,
+         lambda arg: len(NextGenServer.list(detail=True))),
+        ('list load balancers', None,
+         lambda arg: len(LoadBalancer.list())),
+        ('list database instances', None,
+         lambda arg: len(Instance.list())),
+        ('list volumes', None,
+         lambda arg: len(Volume.list())),
+        ('list records', None,
+         lambda arg: len(records())),
+        ('find load balancers', None,
+         lambda arg: len([LoadBalancer.find(i) for i in range(finds)])),
+        ('find nextgen servers', nextgen_servers,
+         lambda servers: len([NextGenServer.find(s.id)
+                              for s in servers[:finds]])),
+        ('iter nextgen servers', None,
+         lambda arg: sum(1 for s in NextGenServer.iter_all(True))),
+        ('iter nextgen servers prefetch', None,
+         lambda arg: sum(1 for s in NextGenServer.iter_all(True,
+                                                           prefetch=True))),
+        ('iter records', None,
+         lambda arg: sum(1 for r in Domain(id=1).iter_records())),
+        ('stream records', None,
+         lambda arg: sum(1 for r in Domain(id=1).stream_records())),
+        ('list all domains', None,
+         lambda arg: len(Domain.list_all())),
+        ('list all domains compact', None,
+         lambda arg: len(Domain.list_all(compact=True))),
+        ('batch reboot', nextgen_servers,
+         lambda servers: len(batch.run([(s.reboot, ('HARD',))
+                                        for s in servers[:mutations]],
+                                       concurrency=10))),
+        ('batch modify load balancers', None,
+         lambda arg: len(batch.run([(LoadBalancer(id=i).modify,
+                                     ('lb%d' % i,))
+                                    for i in range(mutations)],
+                                   concurrency=10))),
+    ]
+
+
+def measure(client, api, setup, run, repeat):
+    latencies = Latencies()
+    with client:
+        arg = setup() if setup is not None else None
+        core.add_observer(latencies)
+        requests = api.requests
+        try:
+            best = None
+            for i in range(repeat):
+                start = time.time()
+                handled = run(arg)
+                elapsed = time.time() - start
+                best = elapsed if best is None else min(best, elapsed)
+            requests = (api.requests - requests) // repeat
+            peak = None
+            if tracemalloc is not None:
+                tracemalloc.start()
+                run(arg)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        finally:
+            core.remove_observer(latencies)
+    return {
+        'time': best,
+        'requests': requests,
+        'handled': handled,
+        'per_second': handled / best if best else 0.0,
+        'p50': percentile(latencies.values, 0.5),
+        'p95': percentile(latencies.values, 0.95),
+        'p99': percentile(latencies.values, 0.99),
+        'peak_memory': peak,
+        }
+
+
+def main(count=1000, finds=100, mutations=100, latency=0.0, repeat=3,
+         pool_maxsize=10):
+    api = FakeAPI(servers=count, loadbalancers=count, domains=count,
+                  records=count, instances=count, volumes=count,
+                  latency=latency).start()
+    try:
+        client = api.connect(pool_maxsize=pool_maxsize, conditional=False)
+        results = {}
+        for name, setup, run in scenarios(finds, mutations):
+            results[name] = measure(client, api, setup, run, repeat)
+        client.close()
+    finally:
+        api.stop()
+    return {
+        'vaporize': vaporize.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'codec': core.get_codec().name,
+        'count': count,
+        'latency': latency,
+        'results': results,
+        }
+
+
+def report(results, baseline=None):
+    print('vaporize %s, %s %s, codec %s, %d resources, %.1f ms latency' % (
+        results['vaporize'], results['implementation'], results['python'],
+        results['codec'], results['count'], results['latency'] * 1000))
+    print('%-30s %9s %5s %10s %8s %8s %9s' % (
+        'scenario', 'time ms', 'reqs', 'per sec', 'p50 ms', 'p95 ms',
+        'peak KiB'))
+    for name, result in sorted(results['results'].items()):
+        peak = result['peak_memory']
+        line = '%-30s %9.2f %5d %10.0f %8.2f %8.2f %9s' % (
+            name, result['time'] * 1000, result['requests'],
+            result['per_second'], result['p50'] * 1000,
+            result['p95'] * 1000, '-' if peak is None else peak // 1024)
+        previous = (baseline or {}).get('results', {}).get(name)
+        if previous and result['time']:
+            line += '  %5.2fx' % (previous['time'] / result['time'])
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--count', type=int, default=1000,
+                        help='resources of each type served')
+    parser.add_argument('--finds', type=int, default=100,
+                        help='resources looked up one at a time')
+    parser.add_argument('--mutations', type=int, default=100,
+                        help='resources modified in bulk')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every response')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--compare', help='compare with saved results')
+    args = parser.parse_args()
+    results = main(args.count, args.finds, args.mutations, args.latency,
+                   args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
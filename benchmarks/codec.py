@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Measure the JSON codecs on large list responses.
+
+Times serializing and parsing a detailed CloudServers server list and a
+CloudDNS record list with every installed :data:`vaporize.core.CODECS`.
+
+    $ python -m benchmarks.codec [count]
+"""
+
+import sys
+import timeit
+
+from vaporize import core
+
+from benchmarks.compact import make_records
+from benchmarks.dotdict import make_servers
+
+
+def main(count=10000, repeat=5):
+    payloads = [('servers', {'servers': make_servers(count)}),
+                ('records', {'records': make_records(count),
+                             'totalEntries': count})]
+    for label, payload in payloads:
+        print('%d %s' % (count, label))
+        for name, codec in core.CODECS.items():
+            body = codec.dumps(payload)
+            dumps_time = min(timeit.repeat(lambda: codec.dumps(payload),
+                                           number=1, repeat=repeat))
+            loads_time = min(timeit.repeat(lambda: codec.loads(body),
+                                           number=1, repeat=repeat))
+            print('  %-7s dumps %8.2f ms  loads %8.2f ms' % (
+                name, dumps_time * 1000, loads_time * 1000))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
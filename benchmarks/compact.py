@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Measure the memory and time cost of compact resources.
+
+Compares a list of CloudDNS Records wrapped in :class:`~vaporize.domains.Record`
+DotDicts against the same Records as compact resources. Sizes count the
+objects themselves, not the values they share.
+
+    $ python -m benchmarks.compact [count]
+"""
+
+import sys
+import timeit
+
+from vaporize import utils
+from vaporize.domains import Record
+
+
+def make_records(count):
+    return [{'id': 'A-%d' % i, 'name': 'host%d.example.com' % i, 'type': 'A',
+             'data': '10.0.%d.%d' % (i // 255 % 255, i % 255), 'ttl': 300,
+             'created': '2012-01-01T00:00:00.000+0000',
+             'updated': '2012-01-01T00:00:00.000+0000'}
+            for i in range(count)]
+
+
+def size(objects):
+    total = 0
+    for obj in objects:
+        total += sys.getsizeof(obj)
+        if isinstance(obj, utils.Compact) and obj._extra:
+            total += sys.getsizeof(obj._extra)
+    return total
+
+
+def main(count=50000, repeat=3):
+    records = make_records(count)
+    compact = utils.compact_type(Record)
+    dotdict_time = min(timeit.repeat(
+        lambda: [Record(r, domain_id=1) for r in records],
+        number=1, repeat=repeat))
+    compact_time = min(timeit.repeat(
+        lambda: [compact(r, domain_id=1) for r in records],
+        number=1, repeat=repeat))
+    dotdict_size = size([Record(r, domain_id=1) for r in records])
+    compact_size = size([compact(r, domain_id=1) for r in records])
+    print('wrap %d records' % count)
+    print('  dotdict: %8.2f ms %8d bytes/record' % (
+        dotdict_time * 1000, dotdict_size // count))
+    print('  compact: %8.2f ms %8d bytes/record' % (
+        compact_time * 1000, compact_size // count))
+    print('  memory:  %8.2fx smaller' % (float(dotdict_size) / compact_size))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
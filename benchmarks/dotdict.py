@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Measure the cost of wrapping API responses in DotDicts.
+
+Compares wrapping a detailed CloudServers server list with the memoized
+:func:`vaporize.utils.camelcase_to_underscore` against converting every key
+with the regular expression, and against the compiled decoder used by
+:func:`vaporize.core.handle_response`.
+
+    $ python -m benchmarks.dotdict [count]
+"""
+
+import sys
+import timeit
+
+from vaporize import utils
+from vaporize.servers import Server
+
+
+def make_servers(count):
+    return [{'progress': 100, 'id': i, 'imageId': 112, 'flavorId': 4,
+             'status': 'ACTIVE', 'name': 'server%d' % i,
+             'hostId': 'e4d909c290d0fb1ca068ffaddf22cbd0',
+             'addresses': {'public': ['198.0.0.%d' % (i % 255)],
+                           'private': ['10.0.0.%d' % (i % 255)]},
+             'metadata': {'role': 'web'}} for i in range(count)]
+
+
+def wrap(servers):
+    return [Server(s) for s in servers]
+
+
+def decode(servers):
+    return [Server.decode(s) for s in servers]
+
+
+def main(count=10000, repeat=5):
+    servers = make_servers(count)
+    cached = utils.camelcase_to_underscore
+    cached_time = min(timeit.repeat(lambda: wrap(servers), number=1,
+                                    repeat=repeat))
+    utils.camelcase_to_underscore = utils.convert_camelcase
+    try:
+        uncached_time = min(timeit.repeat(lambda: wrap(servers), number=1,
+                                          repeat=repeat))
+    finally:
+        utils.camelcase_to_underscore = cached
+    decode_time = min(timeit.repeat(lambda: decode(servers), number=1,
+                                    repeat=repeat))
+    print('wrap %d servers' % count)
+    print('  regex:    %8.2f ms' % (uncached_time * 1000))
+    print('  memoized: %8.2f ms' % (cached_time * 1000))
+    print('  decoder:  %8.2f ms' % (decode_time * 1000))
+    print('  speedup:  %8.2fx' % (uncached_time / decode_time))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""A local stand-in for the Rackspace Cloud API.
+
+Serves generated servers, load balancers, domains and records, database
+instances and volumes over HTTP/1.1 keep-alive connections, with the
+pagination of the real services, so that benchmarks measure the transport
+and decoding code paths Vaporize uses in production.
+
+    >>> api = FakeAPI(servers=5000).start()
+    >>> client = api.connect()
+    >>> with client:
+    ...     servers = NextGenServer.list(detail=True)
+    >>> api.stop()
+
+Mutating requests (``POST``, ``PUT`` and ``DELETE``) are accepted but do not
+change the data served.
+"""
+
+import json
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import time
+try:
+    # Python 3.x
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl, urlsplit
+except ImportError:
+    # Python 2.x
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qsl, urlsplit
+
+from vaporize import core
+
+from benchmarks.compact import make_records
+
+TENANT = '123456'
+
+# Service catalog names and the path each service is served under.
+SERVICES = (
+    ('cloudServers', '/v1.0/' + TENANT),
+    ('cloudServersOpenStack', '/v2/' + TENANT),
+    ('cloudLoadBalancers', '/lb/' + TENANT),
+    ('cloudDNS', '/dns/' + TENANT),
+    ('cloudDatabases', '/db/' + TENANT),
+    ('cloudBlockStorage', '/bs/' + TENANT),
+)
+
+TIMESTAMP = '2012-01-01T00:00:00.000+0000'
+
+
+def make_servers(count):
+    return [{'id': i, 'name': 'server%d' % i, 'status': 'ACTIVE',
+             'progress': 100, 'imageId': 112, 'flavorId': 4,
+             'hostId': 'e4d909c290d0fb1ca068ffaddf22cbd0',
+             'addresses': {'public': ['198.0.%d.%d' % (i // 255 % 255,
+                                                       i % 255)],
+                           'private': ['10.0.%d.%d' % (i // 255 % 255,
+                                                       i % 255)]},
+             'metadata': {'role': 'web'}} for i in range(count)]
+
+
+def make_nextgen_servers(count):
+    return [{'id': '%08d-0000-4000-8000-000000000000' % i,
+             'name': 'server%d' % i, 'status': 'ACTIVE', 'progress': 100,
+             'tenant_id': TENANT, 'user_id': '98765',
+             'hostId': 'e4d909c290d0fb1ca068ffaddf22cbd0',
+             'accessIPv4': '198.0.%d.%d' % (i // 255 % 255, i % 255),
+             'accessIPv6': '2001:4800::%x' % i,
+             'image': {'id': '3afe97b2-26dc-49c5-a2cc-a2fc8d80c001',
+                       'links': []},
+             'flavor': {'id': '2', 'links': []},
+             'addresses': {'public': [{'addr': '198.0.%d.%d' % (
+                 i // 255 % 255, i % 255), 'version': 4}],
+                           'private': [{'addr': '10.0.%d.%d' % (
+                               i // 255 % 255, i % 255), 'version': 4}]},
+             'metadata': {'role': 'web'}, 'OS-DCF:diskConfig': 'AUTO',
+             'created': TIMESTAMP, 'updated': TIMESTAMP,
+             'links': [{'href': 'http://localhost/servers/%d' % i,
+                        'rel': 'self'}]} for i in range(count)]
+
+
+def make_loadbalancers(count):
+    return [{'id': i, 'name': 'lb%d' % i, 'protocol': 'HTTP', 'port': 80,
+             'algorithm': 'RANDOM', 'status': 'ACTIVE', 'nodeCount': 4,
+             'virtualIps': [{'id': i, 'address': '198.0.%d.%d' % (
+                 i // 255 % 255, i % 255), 'type': 'PUBLIC',
+                 'ipVersion': 'IPV4'}],
+             'nodes': [{'id': i * 4 + n, 'address': '10.0.%d.%d' % (n,
+                                                                    i % 255),
+                        'port': 80, 'condition': 'ENABLED',
+                        'status': 'ONLINE', 'weight': 1, 'type': 'PRIMARY'}
+                       for n in range(4)],
+             'created': {'time': TIMESTAMP}, 'updated': {'time': TIMESTAMP}}
+            for i in range(count)]
+
+
+def make_domains(count):
+    return [{'id': i, 'name': 'example%d.com' % i, 'accountId': TENANT,
+             'ttl': 300, 'emailAddress': 'admin@example%d.com' % i,
+             'created': TIMESTAMP, 'updated': TIMESTAMP}
+            for i in range(count)]
+
+
+def make_instances(count):
+    return [{'id': '%08d-0000-4000-8000-000000000000' % i,
+             'name': 'db%d' % i, 'status': 'ACTIVE',
+             'hostname': 'db%d.rackspaceclouddb.com' % i,
+             'flavor': {'id': '1', 'links': []}, 'volume': {'size': 2},
+             'links': [], 'created': TIMESTAMP, 'updated': TIMESTAMP}
+            for i in range(count)]
+
+
+def make_volumes(count):
+    return [{'id': '%08d-0000-4000-8000-000000000000' % i,
+             'display_name': 'volume%d' % i, 'display_description': '',
+             'size': 100, 'volume_type': 'SATA', 'status': 'available',
+             'availability_zone': 'nova', 'attachments': [], 'metadata': {},
+             'created_at': TIMESTAMP} for i in range(count)]
+
+
+class Collection(object):
+    """A paginated collection of resources served under one path.
+
+    With a ``page_size`` a page holds at most that many resources, as many
+    as when no ``limit`` is asked for, like the real services.
+    """
+    def __init__(self, container, single, items, total=False,
+                 page_size=None):
+        self.container = container
+        self.single = single
+        self.items = items
+        self.total = total
+        self.page_size = page_size
+        self.index = dict((str(item['id']), n)
+                          for n, item in enumerate(items))
+        self.pages = {}
+
+    def page(self, params):
+        """Returns the encoded page asked for by query ``params``."""
+        key = tuple(sorted(params.items()))
+        body = self.pages.get(key)
+        if body is None:
+            start = int(params.get('offset', 0))
+            if 'marker' in params:
+                start = self.index.get(params['marker'], -1) + 1
+            limit = params.get('limit', self.page_size)
+            if limit is not None and self.page_size is not None:
+                limit = min(int(limit), self.page_size)
+            stop = len(self.items)
+            if limit is not None:
+                stop = min(start + int(limit), stop)
+            content = {self.container: self.items[start:stop]}
+            if self.total:
+                content['totalEntries'] = len(self.items)
+            body = self.pages[key] = json.dumps(content).encode('utf-8')
+        return body
+
+    def find(self, id):
+        """Returns the encoded resource with this ID, or ``None``."""
+        index = self.index.get(id)
+        if index is None:
+            return None
+        return json.dumps({self.single: self.items[index]}).encode('utf-8')
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # Headers and body are written separately; don't let Nagle's
+        # algorithm hold the body back until the client acknowledges them.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self, status, body=b''):
+        if self.server.api.latency:
+            time.sleep(self.server.api.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def consume(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+    def do_GET(self):
+        self.server.api.requests += 1
+        status, body = self.server.api.get(self.path)
+        self.respond(status, body)
+
+    def do_POST(self):
+        self.server.api.requests += 1
+        self.consume()
+        self.respond(202)
+
+    do_PUT = do_POST
+    do_DELETE = do_POST
+
+
+class FakeAPI(object):
+    """Serves generated Rackspace Cloud resources on a local port.
+
+    :param servers: Number of CloudServers and NextGen servers.
+    :param loadbalancers: Number of load balancers.
+    :param domains: Number of domains.
+    :param records: Number of records in every domain.
+    :param instances: Number of database instances.
+    :param volumes: Number of volumes.
+    :param latency: Seconds to wait before each response, simulating the
+        round trip to the real API.
+    """
+    def __init__(self, servers=1000, loadbalancers=1000, domains=1000,
+                 records=1000, instances=1000, volumes=1000, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self.collections = [
+            (r'/v1\.0/%s/servers(?:/detail)?' % TENANT,
+             Collection('servers', 'server', make_servers(servers))),
+            (r'/v2/%s/servers(?:/detail)?' % TENANT,
+             Collection('servers', 'server', make_nextgen_servers(servers),
+                        page_size=1000)),
+            (r'/lb/%s/loadbalancers' % TENANT,
+             Collection('loadBalancers', 'loadBalancer',
+                        make_loadbalancers(loadbalancers))),
+            (r'/dns/%s/domains' % TENANT,
+             Collection('domains', 'domain', make_domains(domains), True,
+                        100)),
+            (r'/dns/%s/domains/[^/]+/records' % TENANT,
+             Collection('records', 'record', make_records(records), True,
+                        100)),
+            (r'/db/%s/instances' % TENANT,
+             Collection('instances', 'instance', make_instances(instances))),
+            (r'/bs/%s/volumes' % TENANT,
+             Collection('volumes', 'volume', make_volumes(volumes))),
+        ]
+        self.routes = [(re.compile('%s(?:/([^/]+))?$' % pattern), collection)
+                       for pattern, collection in self.collections]
+        self.server = None
+        self.thread = None
+        self.path = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def start(self):
+        """Start serving in a background thread. Returns the FakeAPI."""
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server.api = self
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.path is not None:
+            shutil.rmtree(self.path)
+            self.path = None
+
+    def get(self, path):
+        url = urlsplit(path)
+        params = dict(parse_qsl(url.query))
+        params.pop('fresh', None)
+        for route, collection in self.routes:
+            match = route.match(url.path)
+            if match is None:
+                continue
+            id = match.group(1)
+            if id is None or id == 'detail':
+                return 200, collection.page(params)
+            body = collection.find(id)
+            if body is not None:
+                return 200, body
+            break
+        return 404, json.dumps({'itemNotFound': {
+            'code': 404, 'message': 'Not found'}}).encode('utf-8')
+
+    def identity(self):
+        """Returns an identity response pointing every service here."""
+        return core.dumps({'access': {
+            'token': {'id': 'benchmark', 'expires': '2099-01-01T00:00:00Z'},
+            'serviceCatalog': [
+                {'name': name, 'endpoints': [
+                    {'publicURL': self.url + path, 'region': 'DFW',
+                     'tenantId': TENANT}]}
+                for name, path in SERVICES]}})
+
+    def connect(self, **options):
+        """Returns a :class:`~vaporize.core.Client` connected to this API.
+
+        The identity response is placed in a private token cache, so the
+        Client connects through :func:`vaporize.core.connect`'s usual code
+        path without reaching the real identity service.
+        """
+        if self.path is None:
+            self.path = tempfile.mkdtemp()
+        token_cache = core.TokenCache(self.path)
+        token_cache.store('benchmark', 'DFW', self.identity())
+        return core.Client('benchmark', 'apikey', 'DFW', token_cache,
+                           **options)
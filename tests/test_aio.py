@@ -0,0 +1,243 @@
+import json
+import unittest
+
+try:
+    import asyncio
+    from aiohttp import web
+    from vaporize import aio
+except (ImportError, SyntaxError):
+    # Python 2.x or aiohttp is not installed.
+    aio = None
+
+import vaporize
+from vaporize import waiters
+from vaporize.domains import Domain
+from vaporize.loadbalancers import LoadBalancer
+from vaporize.metrics import Metrics
+from vaporize.volumes import Volume
+
+from tests.test_core import RecordingTracer
+
+
+def make_identity(token, base):
+    return json.dumps({'access': {
+        'token': {'id': token, 'expires': '2099-01-01T00:00:00.000-06:00'},
+        'serviceCatalog': [
+            {'name': 'cloudDNS', 'endpoints': [
+                {'publicURL': base + '/dns', 'region': 'DFW'}]},
+            {'name': 'cloudLoadBalancers', 'endpoints': [
+                {'publicURL': base + '/dfw/lb', 'region': 'DFW'},
+                {'publicURL': base + '/lon/lb', 'region': 'LON'}]},
+            {'name': 'cloudBlockStorage', 'endpoints': [
+                {'publicURL': base + '/bs', 'region': 'DFW'}]}]}})
+
+
+class FakeAPI(object):
+    """Answers requests from a table of responses by path.
+
+    The last response for a path is repeated; requests without the current
+    token are answered with 401.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self.base = None
+        self.token = None
+        self.tokens = 0
+        self.routes = {}
+        self.requests = []
+
+    def handle(self, request):
+        # A completed future, as handlers are awaited.
+        future = self.loop.create_future()
+        future.set_result(self.respond(request))
+        return future
+
+    def respond(self, request):
+        token = request.headers.get('X-Auth-Token')
+        self.requests.append((request.method, request.path_qs, token))
+        if request.path == '/v2.0/tokens':
+            self.tokens += 1
+            self.token = 'token%d' % self.tokens
+            return web.Response(text=make_identity(self.token, self.base),
+                                content_type='application/json')
+        if token != self.token:
+            return web.Response(status=401, text='{}')
+        responses = (self.routes.get(request.path_qs) or
+                     self.routes[request.path])
+        status, body = responses.pop(0) if len(responses) > 1 else responses[0]
+        return web.Response(status=status, text=json.dumps(body),
+                            content_type='application/json')
+
+
+class TestAio(unittest.TestCase):
+    def setUp(self):
+        if aio is None:
+            raise unittest.SkipTest('vaporize.aio requires aiohttp')
+        self.loop = asyncio.new_event_loop()
+        self.api = FakeAPI(self.loop)
+        self.server = web.Server(self.api.handle, loop=self.loop)
+        self.listener = self.await_(
+            self.loop.create_server(self.server, '127.0.0.1', 0))
+        port = self.listener.sockets[0].getsockname()[1]
+        self.api.base = 'http://127.0.0.1:%d' % port
+        self.auth_urls = (vaporize.core.US_AUTH_URL,
+                          vaporize.core.UK_AUTH_URL)
+        vaporize.core.US_AUTH_URL = self.api.base + '/v2.0/tokens'
+        vaporize.core.UK_AUTH_URL = self.api.base + '/v2.0/tokens'
+
+    def tearDown(self):
+        vaporize.core.US_AUTH_URL, vaporize.core.UK_AUTH_URL = self.auth_urls
+        self.await_(aio.close())
+        self.listener.close()
+        self.await_(self.listener.wait_closed())
+        self.await_(self.server.shutdown())
+        self.loop.close()
+
+    def await_(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_find(self):
+        self.api.routes['/dfw/lb/loadbalancers/1'] = [
+            (200, {'loadBalancer': {'id': 1, 'status': 'ACTIVE'}})]
+        self.await_(aio.connect('username', 'apikey'))
+        lb = self.await_(aio.LoadBalancer.find(1))
+        self.assertTrue(isinstance(lb, LoadBalancer))
+        self.assertEqual('ACTIVE', lb.status)
+        self.assertEqual(('GET', '/dfw/lb/loadbalancers/1', 'token1'),
+                         self.api.requests[-1])
+
+    def test_memoized(self):
+        pages = [[{'id': i, 'name': 'd%d.com' % i} for i in ids]
+                 for ids in ([1, 2], [3, 4], [5])]
+        for offset, page in zip([0, 2, 4], pages):
+            self.api.routes['/dns/domains?limit=2&offset=%d' % offset] = [
+                (200, {'domains': page, 'totalEntries': 5})]
+        self.await_(aio.connect('username', 'apikey'))
+        handle_response = vaporize.core.handle_response
+        decoded = []
+
+        def counting(*args, **kwargs):
+            decoded.append(args[0])
+            return handle_response(*args, **kwargs)
+        vaporize.core.handle_response = counting
+        try:
+            domains = self.await_(aio.Domain.list_all(page_size=2))
+        finally:
+            vaporize.core.handle_response = handle_response
+        self.assertEqual([1, 2, 3, 4, 5], [d.id for d in domains])
+        self.assertTrue(all(isinstance(d, Domain) for d in domains))
+        # Each response is decoded once, however often the method is run.
+        self.assertEqual(3, len(decoded))
+
+    def test_reauthenticate(self):
+        self.api.routes['/dfw/lb/loadbalancers/1'] = [
+            (200, {'loadBalancer': {'id': 1, 'status': 'ACTIVE'}})]
+        self.await_(aio.connect('username', 'apikey'))
+        self.api.token = 'revoked'
+        lb = self.await_(aio.LoadBalancer.find(1))
+        self.assertEqual(1, lb.id)
+        self.assertEqual([('GET', 'token1'), ('POST', 'token1'),
+                          ('GET', 'token2')],
+                         [(r[0], r[2]) for r in self.api.requests[1:]])
+
+    def test_client(self):
+        self.api.routes['/lon/lb/loadbalancers/1'] = [
+            (200, {'loadBalancer': {'id': 1, 'status': 'ACTIVE'}})]
+        default = vaporize.core.current_client()
+        settings = dict(default.settings)
+        client = self.await_(aio.connect('username', 'apikey', 'LON'))
+        self.assertFalse(client is default)
+        self.assertEqual(settings, default.settings)
+        self.assertEqual(self.api.base + '/lon/lb',
+                         client.get_url('cloudloadbalancers'))
+        lb = self.await_(aio.LoadBalancer.find(1))
+        self.assertEqual(1, lb.id)
+        self.assertEqual('/lon/lb/loadbalancers/1', self.api.requests[-1][1])
+
+    def test_generator(self):
+        self.await_(aio.connect('username', 'apikey'))
+        self.assertRaises(TypeError, self.await_, aio.LoadBalancer.iter_all())
+
+    def test_wait_all(self):
+        self.api.routes['/dfw/lb/loadbalancers'] = [
+            (200, {'loadBalancers': [{'id': 1, 'status': 'BUILD'}]}),
+            (200, {'loadBalancers': [{'id': 1, 'status': 'ACTIVE'}]})]
+        self.await_(aio.connect('username', 'apikey'))
+        lb = LoadBalancer({'id': 1, 'status': 'BUILD'})
+        self.assertRaises(RuntimeError, self.await_,
+                          aio.call(waiters.wait, [lb], interval=0.01))
+        handles = self.await_(aio.LoadBalancer.wait_all([lb], interval=0.01))
+        self.assertEqual(None, handles[0].exception())
+        self.assertEqual('ACTIVE', lb.status)
+
+    def test_wait_mixed(self):
+        self.api.routes['/dfw/lb/loadbalancers'] = [
+            (200, {'loadBalancers': [{'id': 1, 'status': 'BUILD'}]}),
+            (200, {'loadBalancers': [{'id': 1, 'status': 'ACTIVE'}]})]
+        self.api.routes['/bs/volumes'] = [
+            (200, {'volumes': [{'id': 2, 'status': 'CREATING'}]}),
+            (200, {'volumes': [{'id': 2, 'status': 'CREATING'}]}),
+            (200, {'volumes': [{'id': 2, 'status': 'ERROR'}]})]
+        self.await_(aio.connect('username', 'apikey'))
+        lb = LoadBalancer({'id': 1, 'status': 'BUILD'})
+        volume = Volume({'id': 2, 'status': 'CREATING'})
+        finish = waiters.Handle.finish
+        finished = []
+
+        def counting(handle, exception=None):
+            finished.append(handle)
+            finish(handle, exception)
+        waiters.Handle.finish = counting
+        try:
+            handles = self.await_(aio.wait([lb, volume],
+                                           ['ACTIVE', 'AVAILABLE'],
+                                           interval=0.01))
+        finally:
+            waiters.Handle.finish = finish
+        # The load balancer's listing is replayed while the volumes are
+        # listed, without finishing its handle again.
+        self.assertEqual(handles, finished)
+        self.assertEqual(None, handles[0].exception())
+        self.assertTrue(isinstance(handles[1].exception(),
+                                   vaporize.exceptions.WaitError))
+        self.assertEqual(['ACTIVE', 'ERROR'], [lb.status, volume.status])
+        self.assertEqual(5, len([r for r in self.api.requests
+                                 if r[0] == 'GET']))
+
+    def test_traced(self):
+        self.api.routes['/dfw/lb/loadbalancers/1'] = [
+            (200, {'loadBalancer': {'id': 1, 'status': 'ACTIVE'}})]
+        self.await_(aio.connect('username', 'apikey'))
+        tracer = RecordingTracer()
+        metrics = Metrics().install()
+        vaporize.core.set_tracer(tracer)
+        try:
+            self.await_(aio.LoadBalancer.find(1))
+        finally:
+            vaporize.core.set_tracer(None)
+            metrics.uninstall()
+        operation, request = tracer.spans
+        self.assertEqual('LoadBalancer.find', operation.name)
+        self.assertEqual('GET loadbalancers/{id}', request.name)
+        self.assertEqual(operation, request.parent)
+        self.assertEqual(200, request.attributes['http.status_code'])
+        self.assertTrue(operation.ended and request.ended)
+        stats = metrics.stats()['cloudloadbalancers GET loadbalancers/{id}']
+        self.assertEqual(1, stats['count'])
+        self.assertEqual({200: 1}, stats['statuses'])
+
+    def test_property_traced(self):
+        self.api.routes['/dfw/lb/loadbalancers/1/nodes'] = [
+            (200, {'nodes': []})]
+        self.await_(aio.connect('username', 'apikey'))
+        tracer = RecordingTracer()
+        vaporize.core.set_tracer(tracer)
+        try:
+            nodes = self.await_(aio.wrap(LoadBalancer(id=1)).nodes)
+        finally:
+            vaporize.core.set_tracer(None)
+        self.assertEqual([], nodes)
+        self.assertEqual(['LoadBalancer.nodes', 'GET loadbalancers/{id}/nodes'],
+                         [span.name for span in tracer.spans])
+        self.assertEqual('1', tracer.spans[0].attributes['vaporize.resource_id'])
+        self.assertTrue(all(span.ended for span in tracer.spans))
@@ -0,0 +1,59 @@
+import functools
+import threading
+import unittest
+
+import vaporize
+from vaporize import batch
+from vaporize.exceptions import NotFound
+from vaporize.servers import Server
+
+
+def double(x):
+    return x * 2
+
+
+def missing():
+    raise NotFound('gone')
+
+
+class TestBatch(unittest.TestCase):
+    def test_results_in_order(self):
+        results = batch.run([(double, (i,)) for i in range(50)], concurrency=8)
+        self.assertEqual([i * 2 for i in range(50)], [r.get() for r in results])
+
+    def test_exceptions(self):
+        results = batch.run([(double, (1,)), missing, (double, (), {'x': 3})])
+        self.assertEqual([True, False, True], [r.ok for r in results])
+        self.assertTrue(isinstance(results[1].exception, NotFound))
+        self.assertRaises(NotFound, results[1].get)
+        self.assertEqual(6, results[2].value)
+
+    def test_get_service(self):
+        self.assertEqual('cloudservers', batch.get_service(Server(id=1).reboot))
+        self.assertEqual(None, batch.get_service(double))
+
+    def test_get_service_partial(self):
+        reboot = functools.partial(Server(id=1).reboot, 'HARD')
+        self.assertEqual('cloudservers', batch.get_service(reboot))
+        bound = vaporize.core.Client().bind(Server(id=1))
+        self.assertEqual('cloudservers', batch.get_service(bound.reboot))
+        self.assertEqual(None, batch.get_service(functools.partial(double)))
+
+    def test_service_concurrency(self):
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def reboot(self, kind):
+            with lock:
+                running.append(self)
+                peak.append(len(running))
+            threading.Event().wait(0.01)
+            with lock:
+                running.remove(self)
+        reboot.__module__ = Server.reboot.__module__
+        calls = [functools.partial(reboot, i, 'HARD') for i in range(8)]
+        results = batch.run(calls, concurrency=8,
+                            service_concurrency={'cloudservers': 2})
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(2, max(peak))
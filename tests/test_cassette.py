@@ -0,0 +1,142 @@
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import requests
+
+import vaporize
+from vaporize import cassette
+from vaporize.domains import Domain
+
+
+class FakeAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, responses):
+        super(FakeAdapter, self).__init__()
+        self.responses = responses
+
+    def send(self, request, **kwargs):
+        status_code, content = self.responses.pop(0)
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers['Content-Type'] = 'application/json'
+        response.headers['Set-Cookie'] = 'secret'
+        if kwargs.get('stream'):
+            response.raw = io.BytesIO(content)
+        else:
+            response._content = content
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(seconds=0.05)
+        return response
+
+    def close(self):
+        pass
+
+
+class TestCassette(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.client = vaporize.core.Client().__enter__()
+        self.client.settings['cloudloadbalancers_url'] = 'http://lb/123'
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+        shutil.rmtree(self.path)
+
+    def record(self, filename, responses, **options):
+        path = os.path.join(self.path, filename)
+        with cassette.Cassette(path, record=True) as recorder:
+            transport = vaporize.core.Transport(cassette=recorder, **options)
+            adapter = recorder.adapter(FakeAdapter(responses))
+            transport.session.mount('http://', adapter)
+            self.client.session = transport
+            vaporize.core.handle_request('get', 'http://lb/123/loadbalancers')
+            vaporize.core.handle_request('get', 'http://lb/123/loadbalancers')
+        return path
+
+    def test_replay(self):
+        path = self.record('lb.jsonl.gz', [
+            (200, b'{"loadBalancers": []}'),
+            (200, b'{"loadBalancers": [{"id": 1}]}')], cache_bust=True)
+        self.client.session = vaporize.core.Transport(
+            cassette=cassette.Cassette(path), cache_bust=True)
+        url = 'http://lb/123/loadbalancers'
+        self.assertEqual({'load_balancers': []},
+                         vaporize.core.handle_request('get', url))
+        self.assertEqual({'load_balancers': [{'id': 1}]},
+                         vaporize.core.handle_request('get', url))
+        self.assertRaises(vaporize.exceptions.CassetteError,
+                          vaporize.core.handle_request, 'get', url)
+
+    def test_stored(self):
+        path = os.path.join(self.path, 'lb.jsonl')
+        with cassette.Cassette(path, record=True) as recorder:
+            session = requests.Session()
+            session.mount('http://', recorder.adapter(
+                FakeAdapter([(200, b'{}'), (200, b'\xff')])))
+            session.get('http://lb/123/loadbalancers')
+            session.get('http://lb/123/loadbalancers/1/errorpage')
+        with open(path) as f:
+            exchanges = [json.loads(line) for line in f]
+        self.assertEqual({'Content-Type': 'application/json'},
+                         exchanges[0]['headers'])
+        self.assertEqual('{}', exchanges[0]['content'])
+        self.assertEqual('/w==', exchanges[1]['base64'])
+
+    def test_latency(self):
+        path = self.record('lb.jsonl', [(200, b'{}'), (200, b'{}')])
+        self.client.session = vaporize.core.Transport(
+            cassette=cassette.Cassette(path, latency=2.0))
+        start = time.time()
+        vaporize.core.handle_request('get', 'http://lb/123/loadbalancers')
+        self.assertTrue(time.time() - start >= 0.1)
+
+    def test_redact(self):
+        content = json.dumps({'access': {'token': {'id': 'abc'}}})
+        content = cassette.redact('https://identity/v2.0/tokens',
+                                  content.encode('utf-8'))
+        self.assertEqual(cassette.TOKEN,
+                         json.loads(content.decode('utf-8'))
+                         ['access']['token']['id'])
+
+    def test_stream(self):
+        self.client.settings['clouddns_url'] = 'http://dns/123'
+        path = os.path.join(self.path, 'records.jsonl')
+        with cassette.Cassette(path, record=True) as recorder:
+            transport = vaporize.core.Transport(cassette=recorder)
+            transport.session.mount('http://', recorder.adapter(FakeAdapter([
+                (200, b'{"records": [{"id": "A-1"}, {"id": "A-2"}]}'),
+                (404, b'{"itemNotFound": {"code": 404}}')])))
+            self.client.session = transport
+            list(Domain(id=1).stream_records())
+            self.assertRaises(vaporize.exceptions.NotFound,
+                              Domain(id=2).stream_records)
+        self.client.session = vaporize.core.Transport(
+            cassette=cassette.Cassette(path))
+        self.assertEqual(['A-1', 'A-2'],
+                         [r.id for r in Domain(id=1).stream_records()])
+        self.assertRaises(vaporize.exceptions.NotFound,
+                          Domain(id=2).stream_records)
+
+    def test_stream_recorded_as_read(self):
+        self.client.settings['clouddns_url'] = 'http://dns/123'
+        path = os.path.join(self.path, 'records.jsonl')
+        with cassette.Cassette(path, record=True) as recorder:
+            transport = vaporize.core.Transport(cassette=recorder)
+            transport.session.mount('http://', recorder.adapter(FakeAdapter([
+                (200, b'{"records": [{"id": "A-1"}, {"id": "A-2"}]}')])))
+            self.client.session = transport
+            records = Domain(id=1).stream_records()
+            exchange, = recorder.exchanges
+            # The body is recorded once it has been read to the end.
+            self.assertEqual('', exchange['content'])
+            self.assertEqual('A-1', next(records).id)
+            self.assertEqual('', exchange['content'])
+            self.assertEqual(['A-2'], [r.id for r in records])
+            self.assertEqual({'records': [{'id': 'A-1'}, {'id': 'A-2'}]},
+                             json.loads(exchange['content']))
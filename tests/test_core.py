@@ -0,0 +1,884 @@
+import gc
+import inspect
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+import zlib
+
+import dateutil.parser
+import requests
+
+import vaporize
+from vaporize.core import (CatalogCache, ConditionalCache, RateLimiter,
+                           RetryPolicy, StreamDecoder, TokenBucket, TokenCache,
+                           Transport)
+from vaporize.domains import Domain, Record
+from vaporize.loadbalancers import LoadBalancer
+from vaporize.nextgen_servers import NextGenFlavor, NextGenImage
+
+
+def make_response(content, headers=None, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.headers.update(headers or {})
+    return response
+
+
+class TestTransport(unittest.TestCase):
+    def test_pool_options(self):
+        transport = Transport(pool_maxsize=50, connect_timeout=3,
+                              read_timeout=30)
+        self.assertEqual(50, transport.adapter._pool_maxsize)
+        self.assertEqual((3, 30), transport.timeout)
+        self.assertIn(transport.adapter, transport.session.adapters.values())
+
+    def test_socket_options(self):
+        transport = Transport(keep_alive=False)
+        self.assertEqual([(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)],
+                         transport.adapter.socket_options)
+
+    def test_stats_empty(self):
+        stats = Transport().stats()
+        self.assertEqual(0, stats['in_flight'])
+        self.assertEqual(0, stats['requests'])
+        self.assertEqual({}, stats['pools'])
+
+
+class TestConditionalCache(unittest.TestCase):
+    def test_etag(self):
+        cache = ConditionalCache()
+        cache.store('http://localhost/a', make_response(b'{}', {'ETag': '"x"'}))
+        self.assertEqual({'If-None-Match': '"x"'},
+                         cache.headers('http://localhost/a'))
+        self.assertEqual(b'{}', cache.fetch('http://localhost/a'))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_no_validator(self):
+        cache = ConditionalCache()
+        cache.store('http://localhost/a', make_response(b'{}'))
+        self.assertEqual({}, cache.headers('http://localhost/a'))
+        self.assertEqual(0, len(cache))
+
+    def test_eviction(self):
+        cache = ConditionalCache(maxsize=2)
+        for url in ['a', 'b', 'c']:
+            cache.store(url, make_response(b'{}', {'ETag': url}))
+        self.assertEqual(2, len(cache))
+        self.assertEqual({}, cache.headers('a'))
+
+    def test_size(self):
+        cache = ConditionalCache(maxbytes=10, max_entry_bytes=6)
+        cache.store('a', make_response(b'{"a":1}', {'ETag': 'a'}))
+        self.assertEqual(0, len(cache))
+        for url in ['b', 'c', 'd']:
+            cache.store(url, make_response(b'[1,2]', {'ETag': url}))
+        self.assertEqual(2, len(cache))
+        self.assertEqual(10, cache.size)
+        self.assertEqual({}, cache.headers('b'))
+
+    def test_evicted(self):
+        cache = ConditionalCache()
+        cache.store('a', make_response(b'{}', {'ETag': 'a'}))
+        cache.clear()
+        self.assertEqual(None, cache.fetch('a'))
+
+    def test_not_modified(self):
+        transport = Transport(retry=False)
+        adapter = RecordingAdapter([304], b'')
+        transport.session.mount('http://', adapter)
+        transport.cache.store('http://dns/a',
+                              make_response(b'{}', {'ETag': '"x"'}))
+        response = transport.request('get', 'http://dns/a')
+        self.assertEqual((200, b'{}'), (response.status_code, response.content))
+        self.assertEqual(1, transport.cache.hits)
+
+    def test_evicted_after_request(self):
+        class Adapter(RecordingAdapter):
+            def send(self, request, **kwargs):
+                transport.cache.clear()
+                return super(Adapter, self).send(request, **kwargs)
+        transport = Transport(retry=False)
+        adapter = Adapter([304, 200], b'{"a": 1}')
+        transport.session.mount('http://', adapter)
+        transport.cache.store('http://dns/a',
+                              make_response(b'{}', {'ETag': '"x"'}))
+        response = transport.request('get', 'http://dns/a')
+        self.assertEqual(b'{"a": 1}', response.content)
+        self.assertEqual(['"x"', None],
+                         [r.headers.get('If-None-Match')
+                          for r in adapter.requests])
+
+    def test_cache_bust_disabled_by_default(self):
+        self.assertFalse(Transport().cache_bust)
+
+
+class TestCatalogCache(unittest.TestCase):
+    def setUp(self):
+        vaporize.core.catalog_cache.clear()
+
+    def tearDown(self):
+        vaporize.core.catalog_cache.clear()
+
+    def connect(self, responses, region='DFW'):
+        client = vaporize.core.Client()
+        client.settings['cloudserversopenstack_url'] = 'http://localhost/123'
+        client.session = FakeTransport(responses)
+        client.credentials = ('user', 'key', region, None, False)
+        return client
+
+    def test_ttl(self):
+        cache = CatalogCache(ttl=0.05)
+        cache.store('a', b'{}')
+        self.assertEqual(b'{}', cache.get('a'))
+        time.sleep(0.1)
+        self.assertEqual(None, cache.get('a'))
+        self.assertEqual({'entries': 0, 'hits': 1, 'misses': 1,
+                          'evictions': 0}, cache.stats())
+
+    def test_eviction(self):
+        cache = CatalogCache(maxsize=2)
+        for key in [('u', 'DFW', 'a'), ('u', 'DFW', 'b'), ('u', 'DFW', 'a'),
+                    ('u', 'DFW', 'c')]:
+            cache.store(key, b'{}')
+        self.assertEqual(None, cache.get(('u', 'DFW', 'b')))
+        self.assertEqual(1, cache.stats()['evictions'])
+        self.assertEqual(1, cache.invalidate('a'))
+        self.assertEqual(1, len(cache))
+
+    def test_list(self):
+        content = b'{"flavors": [{"id": "2", "name": "512MB"}]}'
+        client = self.connect([make_response(content)])
+        with client:
+            first = NextGenFlavor.list()
+            second = NextGenFlavor.list()
+        self.assertEqual(first, second)
+        self.assertIsNot(first[0], second[0])
+        self.assertEqual(1, len(client.session.tokens))
+        lon = self.connect([make_response(content)], 'LON')
+        with lon:
+            NextGenFlavor.list()
+        self.assertEqual(1, len(lon.session.tokens))
+
+    def test_invalidate(self):
+        content = b'{"images": []}'
+        client = self.connect([make_response(content),
+                               make_response(b'', status_code=204),
+                               make_response(content)])
+        with client:
+            NextGenImage.list()
+            NextGenImage(id='abc').delete()
+            NextGenImage.list()
+        self.assertEqual(3, len(client.session.tokens))
+
+    def test_create_failed(self):
+        content = b'{"images": []}'
+        client = self.connect([make_response(content),
+                               make_response(b'{}', status_code=400)])
+        with client:
+            NextGenImage.list()
+            self.assertRaises(vaporize.exceptions.BadRequest,
+                              NextGenImage.create, 'backup', 1)
+            NextGenImage.list()
+        self.assertEqual(2, len(client.session.tokens))
+
+    def test_invalidated_in_flight(self):
+        content = b'{"images": []}'
+        client = self.connect([make_response(content),
+                               make_response(content)])
+        request = client.session.request
+
+        def racing(*args, **kwargs):
+            # An image is created while the first listing is in flight.
+            client.session.request = request
+            vaporize.core.catalog_cache.invalidate()
+            return request(*args, **kwargs)
+        client.session.request = racing
+        with client:
+            NextGenImage.list()
+            NextGenImage.list()
+        self.assertEqual(2, len(client.session.tokens))
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_not_retryable(self):
+        policy = RetryPolicy()
+        self.assertEqual(None, policy.delay('get', 404, {}, 0))
+        self.assertEqual(None, policy.delay('post', 503, {}, 0))
+
+    def test_retry_after(self):
+        policy = RetryPolicy()
+        self.assertEqual(7.0, policy.delay('get', 413, {'Retry-After': '7'}, 0))
+        self.assertEqual({'get': 1}, policy.stats()['retries'])
+        policy = RetryPolicy(max_backoff=5)
+        self.assertEqual(5, policy.delay('get', 413, {'Retry-After': '3600'}, 0))
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+        delays = [policy.delay('put', 503, {}, i) for i in range(4)]
+        self.assertEqual([1, 2, 4, 5], delays)
+
+    def test_jitter(self):
+        policy = RetryPolicy(backoff=1, max_backoff=5)
+        for i in range(10):
+            self.assertTrue(0 <= policy.delay('get', 503, {}, 3) <= 5)
+
+    def test_exhausted(self):
+        policy = RetryPolicy(max_retries=2)
+        self.assertEqual(None, policy.delay('get', 413, {}, 2))
+        self.assertEqual(1, policy.stats()['exhausted'])
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.client = vaporize.core.Client().__enter__()
+        self.client.settings['clouddns_url'] = 'http://localhost/123'
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=1, capacity=2)
+        self.assertEqual(0, bucket.take())
+        self.assertEqual(0, bucket.take())
+        self.assertAlmostEqual(1, bucket.take(), places=2)
+
+    def test_get_service(self):
+        self.assertEqual('clouddns',
+                         vaporize.core.get_service('http://localhost/123/domains'))
+        self.assertEqual(None, vaporize.core.get_service('http://other/'))
+
+    def test_delay(self):
+        limiter = RateLimiter()
+        limiter.set_limit('clouddns', 'get', 1, 'SECOND', regex='status')
+        url = 'http://localhost/123/status/1'
+        self.assertEqual(0, limiter.delay('clouddns', 'get', url))
+        self.assertTrue(limiter.delay('clouddns', 'get', url) > 0)
+        self.assertEqual(0, limiter.delay('clouddns', 'get',
+                                          'http://localhost/123/domains'))
+
+    def test_load_limits(self):
+        class FakeTransport(object):
+            def request(self, verb, url):
+                return make_response(b'{"limits": {"rate": [{"uri": "*", '
+                    b'"regex": ".*", "limit": [{"verb": "POST", "value": 10, '
+                    b'"unit": "MINUTE", "remaining": 0}]}]}}')
+        limiter = RateLimiter()
+        limiter.load_limits('clouddns', FakeTransport())
+        self.assertEqual({'.*': 10 / 60.0},
+                         limiter.stats()['limits']['clouddns:post'])
+        self.assertTrue(limiter.delay('clouddns', 'post',
+                                      'http://localhost/123/domains') > 5)
+
+
+def test_handle_request_not_connected():
+    with vaporize.core.Client():
+        try:
+            vaporize.core.handle_request('get', 'http://localhost/')
+        except vaporize.exceptions.ConnectionError:
+            pass
+        else:
+            assert False, "ConnectionError not raised"
+
+
+def test_get_session():
+    with vaporize.core.Client() as client:
+        assert vaporize.core.get_session() is None
+        client.session = FakeTransport([])
+        assert vaporize.core.get_transport() is client.session
+        assert isinstance(vaporize.core.get_session(), requests.Session)
+
+
+class TestPaginate(unittest.TestCase):
+    def setUp(self):
+        self.items = [{'id': i} for i in range(25)]
+        self.calls = []
+
+    def by_offset(self, limit, offset):
+        self.calls.append(offset)
+        return self.items[offset:offset + limit]
+
+    def by_marker(self, limit, marker):
+        self.calls.append(marker)
+        start = 0 if marker is None else marker + 1
+        return self.items[start:start + limit]
+
+    def test_offset(self):
+        results = list(vaporize.core.paginate(self.by_offset, 10))
+        self.assertEqual(self.items, results)
+        self.assertEqual([0, 10, 20], self.calls)
+
+    def test_marker(self):
+        results = list(vaporize.core.paginate(self.by_marker, 5, marker=True))
+        self.assertEqual(self.items, results)
+        self.assertEqual([None, 4, 9, 14, 19, 24], self.calls)
+
+    def test_lazy(self):
+        results = vaporize.core.paginate(self.by_offset, 10)
+        self.assertEqual({'id': 0}, next(results))
+        self.assertEqual([0], self.calls)
+
+    def test_prefetch(self):
+        results = list(vaporize.core.paginate(self.by_offset, 10,
+                                              prefetch=True))
+        self.assertEqual(self.items, results)
+
+
+class TestFetchAll(unittest.TestCase):
+    def setUp(self):
+        self.handle_request = vaporize.core.handle_request
+        self.domains = [{'id': i, 'name': 'd%d.com' % i} for i in range(23)]
+        self.total = True
+        vaporize.core.handle_request = self.fake
+
+    def tearDown(self):
+        vaporize.core.handle_request = self.handle_request
+
+    def fake(self, verb, url, data=None, wrapper=None, container=None):
+        query = dict(q.split('=') for q in url.split('?')[1].split('&'))
+        offset, limit = int(query['offset']), int(query['limit'])
+        container = url.split('?')[0].split('/')[-1]
+        content = {container: self.domains[offset:offset + limit]}
+        if self.total:
+            content['totalEntries'] = len(self.domains)
+        return wrapper(content)
+
+    def test_total(self):
+        results = vaporize.core.fetch_all('http://localhost/domains',
+                                          'domains', vaporize.domains.Domain,
+                                          page_size=5, workers=3)
+        self.assertEqual(list(range(23)), [d.id for d in results])
+        self.assertTrue(isinstance(results[0], vaporize.domains.Domain))
+
+    def test_records(self):
+        self.domains = [{'id': 'A-%d' % i} for i in range(23)]
+        client = vaporize.core.Client()
+        client.settings['clouddns_url'] = 'http://localhost'
+        domain = Domain(id=1)
+        with client:
+            records = domain.fetch_records(page_size=5, workers=3)
+        self.assertEqual(['A-%d' % i for i in range(23)],
+                         [r.id for r in records])
+        self.assertTrue(all(isinstance(r, Record) and r.domain_id == 1
+                            for r in records))
+        self.assertTrue(domain.records is records)
+
+    def test_waves(self):
+        self.total = False
+        results = vaporize.core.fetch_all('http://localhost/domains',
+                                          'domains', page_size=5, workers=2)
+        self.assertEqual(list(range(23)), [d.id for d in results])
+
+
+class TestCodec(unittest.TestCase):
+    def setUp(self):
+        self.codec = vaporize.core.get_codec()
+
+    def tearDown(self):
+        vaporize.core.set_codec(self.codec)
+
+    def test_default(self):
+        self.assertIs(list(vaporize.core.CODECS.values())[0], self.codec)
+
+    def test_round_trip(self):
+        data = {'server': {'name': u'caf\xe9', 'flavorId': 1,
+                           'metadata': {'a': [1.5, None, True]}}}
+        for name in vaporize.core.CODECS:
+            vaporize.core.set_codec(name)
+            self.assertEqual(data, vaporize.core.loads(vaporize.core.dumps(data)))
+            response = vaporize.core.handle_response(
+                200, vaporize.core.dumps(data), container='server')
+            self.assertEqual(1, response.flavor_id)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, vaporize.core.set_codec, 'missing')
+
+
+class TestConvertDatetime(unittest.TestCase):
+    TIMESTAMPS = ['2012-01-01T00:00:00.000+0000', '2011-03-17T19:17:07Z',
+                  '2012-04-13T13:15:00.000-05:00', '2012-05-14T21:08:38.000000',
+                  '2010-10-10T12:00:00-0600', '2012-01-01 00:00:00',
+                  '2012-01-01T00:00:00.5+00:00']
+
+    def test_matches_dateutil(self):
+        for value in self.TIMESTAMPS:
+            expected = dateutil.parser.parse(value)
+            result = vaporize.core.parse_datetime(value)
+            self.assertEqual(expected, result)
+            self.assertEqual(repr(expected), repr(result))
+
+    def test_fallback(self):
+        self.assertEqual(None, vaporize.core.parse_datetime('Jan 1 2012'))
+        self.assertEqual(dateutil.parser.parse('Jan 1 2012'),
+                         vaporize.core.convert_datetime('Jan 1 2012'))
+
+    def test_cache(self):
+        value = '2013-02-03T04:05:06Z'
+        result = vaporize.core.convert_datetime(value)
+        self.assertIs(result, vaporize.core.convert_datetime(value))
+        self.assertIs(result, vaporize.core.convert_datetime(result))
+
+
+def make_identity(token, expires='2099-01-01T00:00:00.000-06:00'):
+    return vaporize.core.dumps({'access': {
+        'token': {'id': token, 'expires': expires},
+        'serviceCatalog': [{'name': 'cloudDNS', 'endpoints': [
+            {'publicURL': 'http://localhost/dns', 'region': 'DFW'}]}]}})
+
+
+class TestTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = TokenCache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_store(self):
+        self.assertEqual(None, self.cache.load('user', 'DFW'))
+        with self.cache.lock('user', 'DFW'):
+            self.cache.store('user', 'DFW', make_identity('abc'))
+        content = vaporize.core.loads(self.cache.load('user', 'dfw'))
+        self.assertEqual('abc', content['access']['token']['id'])
+        self.assertEqual(None, self.cache.load('user', 'LON'))
+        self.assertEqual(None, self.cache.load('user', 'DFW', reject='abc'))
+        self.cache.clear('user', 'DFW')
+        self.assertEqual(None, self.cache.load('user', 'DFW'))
+
+    def test_expired(self):
+        self.cache.store('user', 'DFW',
+                         make_identity('abc', '2012-01-01T00:00:00.000+0000'))
+        self.assertEqual(None, self.cache.load('user', 'DFW'))
+
+
+class FakeTransport(Transport):
+    def __init__(self, responses):
+        super(FakeTransport, self).__init__(retry=False)
+        self.responses = responses
+        self.tokens = []
+        self.urls = []
+
+    def request(self, verb, url, data=None, **kwargs):
+        self.tokens.append(self.auth.token if self.auth else None)
+        self.urls.append(url)
+        return self.responses.pop(0)
+
+
+class TestReauthenticate(unittest.TestCase):
+    def setUp(self):
+        self.client = vaporize.core.Client().__enter__()
+        self.path = tempfile.mkdtemp()
+        self.cache = TokenCache(self.path)
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+        shutil.rmtree(self.path)
+
+    def connect(self, responses):
+        transport = FakeTransport(responses)
+        transport.auth = vaporize.core.Auth('old')
+        self.client.settings['token'] = 'old'
+        self.client.session = transport
+        self.client.credentials = ('user', 'key', 'DFW', self.cache, False)
+        return transport
+
+    def test_unauthorized(self):
+        transport = self.connect([
+            make_response(b'', status_code=401),
+            make_response(make_identity('new')),
+            make_response(b'{"a": 1}')])
+        response = vaporize.core.handle_request('get', 'http://localhost/dns')
+        self.assertEqual(1, response.a)
+        self.assertEqual(['old', 'old', 'new'], transport.tokens)
+        self.assertEqual('new', self.client.settings['token'])
+        self.assertTrue(self.cache.load('user', 'DFW'))
+
+    def test_cached(self):
+        self.cache.store('user', 'DFW', make_identity('cached'))
+        transport = self.connect([
+            make_response(b'', status_code=401),
+            make_response(b'{"a": 1}')])
+        vaporize.core.handle_request('get', 'http://localhost/dns')
+        self.assertEqual(['old', 'cached'], transport.tokens)
+
+    def test_refresh(self):
+        self.connect([make_response(make_identity('new'))])
+        self.client.credentials = ('user', 'key', 'DFW', None, True)
+        self.client.settings['expires'] = vaporize.core.convert_datetime(
+            '2012-01-01T00:00:00Z')
+        self.client.schedule_refresh()
+        self.client.refresher.join(5)
+        self.assertEqual('new', self.client.settings['token'])
+        self.assertTrue(self.client.refresher.is_alive())
+        self.client.close()
+        self.assertEqual(None, self.client.refresher)
+
+    def test_unauthorized_twice(self):
+        self.connect([
+            make_response(b'', status_code=401),
+            make_response(make_identity('new')),
+            make_response(b'', status_code=401)])
+        self.assertRaises(vaporize.exceptions.Unauthorized,
+                          vaporize.core.handle_request, 'get',
+                          'http://localhost/dns')
+
+
+class TestClient(unittest.TestCase):
+    def make_client(self, url):
+        client = vaporize.core.Client()
+        client.settings['clouddns_url'] = url
+        return client
+
+    def test_current_client(self):
+        default = vaporize.core.current_client()
+        dfw = self.make_client('http://dfw/123')
+        lon = self.make_client('http://lon/123')
+        with dfw:
+            self.assertEqual('http://dfw/123', vaporize.core.get_url('clouddns'))
+            with lon:
+                self.assertIs(lon, vaporize.core.current_client())
+                self.assertEqual('clouddns',
+                                 vaporize.core.get_service('http://lon/123/x'))
+            self.assertIs(dfw, vaporize.core.current_client())
+        self.assertIs(default, vaporize.core.current_client())
+
+    def test_bind(self):
+        lon = self.make_client('http://lon/123')
+        url = lon.bind(vaporize.core).get_url('clouddns')
+        self.assertEqual('http://lon/123', url)
+        self.assertEqual('http://lon/123',
+                         lon.call(vaporize.core.get_url, 'clouddns'))
+
+    def test_batch(self):
+        lon = self.make_client('http://lon/123')
+        with lon:
+            results = vaporize.batch.run([(vaporize.core.get_url, ('clouddns',))
+                                          for i in range(4)], concurrency=4)
+        self.assertEqual(['http://lon/123'] * 4, [r.get() for r in results])
+
+
+class TestIdentityMap(unittest.TestCase):
+    def connect(self, responses):
+        client = vaporize.core.Client(identity_map=True)
+        client.settings['cloudloadbalancers_url'] = 'http://localhost/123'
+        client.session = FakeTransport(responses)
+        return client
+
+    def test_find(self):
+        client = self.connect([
+            make_response(b'{"loadBalancer": {"id": 1, "name": "a"}}'),
+            make_response(b'{"loadBalancers": [{"id": 1, "name": "b"}, '
+                          b'{"id": 2, "name": "c"}]}'),
+            make_response(b'{"loadBalancer": {"id": 1, "name": "d"}}')])
+        with client:
+            lb = LoadBalancer.find(1)
+            self.assertIs(lb, LoadBalancer.find('1'))
+            listed = LoadBalancer.list()
+            self.assertIs(lb, listed[0])
+            self.assertEqual('b', lb.name)
+            self.assertIs(lb, lb.reload())
+            self.assertEqual('d', lb.name)
+        self.assertEqual(3, len(client.session.tokens))
+        self.assertEqual(1, client.identity.hits)
+
+    def test_weak(self):
+        client = self.connect([
+            make_response(b'{"loadBalancer": {"id": 1, "name": "a"}}')])
+        with client:
+            LoadBalancer.find(1)
+        gc.collect()
+        self.assertEqual(0, len(client.identity))
+
+    def test_delete(self):
+        client = self.connect([
+            make_response(b'{"loadBalancer": {"id": 1, "name": "a"}}'),
+            make_response(b'', status_code=202),
+            make_response(b'{"loadBalancer": {"id": 1, "name": "a"}}')])
+        with client:
+            lb = LoadBalancer.find(1)
+            lb.delete()
+            self.assertIsNot(lb, LoadBalancer.find(1))
+
+
+class RecordingSpan(vaporize.core.Span):
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.exceptions = []
+        self.ended = False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exception):
+        self.exceptions.append(exception)
+
+    def end(self):
+        self.ended = True
+
+
+class RecordingTracer(vaporize.core.Tracer):
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, parent=None, attributes=None):
+        span = RecordingSpan(name, parent, attributes)
+        self.spans.append(span)
+        return span
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.tracer = RecordingTracer()
+        vaporize.core.set_tracer(self.tracer)
+        self.client = vaporize.core.Client().__enter__()
+        self.client.settings['cloudloadbalancers_url'] = 'http://lb/123'
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+        vaporize.core.set_tracer(None)
+
+    def test_spans(self):
+        self.client.session = FakeTransport([
+            make_response(b'', status_code=413),
+            make_response(b'{"nodes": []}')])
+        self.client.session.retry = RetryPolicy(backoff=0)
+        lb = LoadBalancer(id=1)
+        node = vaporize.loadbalancers.Node.create('10.0.0.1', 80, 'ENABLED',
+                                                  'PRIMARY', 1)
+        lb.add_nodes(node)
+        operation, first, second = self.tracer.spans
+        self.assertEqual('LoadBalancer.add_nodes', operation.name)
+        self.assertEqual('1', operation.attributes['vaporize.resource_id'])
+        self.assertEqual('loadbalancers/{id}/nodes',
+                         operation.attributes['vaporize.endpoint'])
+        self.assertEqual(['POST loadbalancers/{id}/nodes'] * 2,
+                         [first.name, second.name])
+        self.assertEqual([operation, operation], [first.parent, second.parent])
+        self.assertEqual([0, 1], [first.attributes['vaporize.attempt'],
+                                  second.attributes['vaporize.attempt']])
+        self.assertEqual(413, first.attributes['http.status_code'])
+        self.assertTrue(all(s.ended for s in self.tracer.spans))
+
+    def test_base_exception(self):
+        class Interrupt(BaseException):
+            pass
+
+        def interrupt(*args, **kwargs):
+            raise Interrupt()
+        self.client.session = FakeTransport([])
+        self.client.session.request = interrupt
+        self.assertRaises(Interrupt, LoadBalancer.find, 1)
+        self.assertTrue(all(s.ended for s in self.tracer.spans))
+
+    def test_setter(self):
+        self.client.session = FakeTransport([make_response(b'')])
+        LoadBalancer.error_page.__set__(LoadBalancer(id=1), '<html></html>')
+        operation, request = self.tracer.spans
+        self.assertEqual('LoadBalancer.error_page', operation.name)
+        self.assertEqual('PUT loadbalancers/{id}/errorpage', request.name)
+        self.assertEqual(operation, request.parent)
+        self.assertTrue(operation.ended)
+
+    def test_generator(self):
+        self.client.settings['clouddns_url'] = 'http://dns/123'
+        self.client.session = FakeTransport([
+            make_response(b'{"records": [{"id": "A-1"}, {"id": "A-2"}]}'),
+            make_response(b'{"records": [{"id": "A-3"}]}')])
+        records = Domain(id=1).iter_records(page_size=2)
+        operation = self.tracer.spans[0]
+        self.assertEqual('Domain.iter_records', operation.name)
+        self.assertEqual(None, vaporize.core.current_span())
+        self.assertEqual(['A-1', 'A-2', 'A-3'], [r.id for r in records])
+        self.assertEqual([operation, operation],
+                         [s.parent for s in self.tracer.spans[1:]])
+        self.assertTrue(operation.ended)
+
+    def test_exception(self):
+        self.client.session = FakeTransport([
+            make_response(b'', status_code=404)])
+        self.assertRaises(vaporize.exceptions.NotFound, LoadBalancer.find, 1)
+        self.assertEqual(1, len(self.tracer.spans[0].exceptions))
+
+    def test_disabled(self):
+        vaporize.core.set_tracer(None)
+        self.assertEqual([], vaporize.core._observers)
+        self.client.session = FakeTransport([make_response(b'{}')])
+        vaporize.core.handle_request('get', 'http://lb/123/loadbalancers')
+        self.assertEqual([], self.tracer.spans)
+
+
+class TestStreamDecoder(unittest.TestCase):
+    def chunks(self, content, size):
+        content = content.encode('utf-8')
+        return [content[i:i + size] for i in range(0, len(content), size)]
+
+    def test_items(self):
+        content = (u'{"totalEntries": 3, "links": [{"href": "x"}], '
+                   u'"records": [{"id": 1, "name": "caf\u00e9"}, {"id": 22}, '
+                   u'12345], "more": true}')
+        for size in (1, 2, 7, 1000):
+            decoder = StreamDecoder(self.chunks(content, size))
+            self.assertEqual([{'id': 1, 'name': u'caf\u00e9'}, {'id': 22},
+                              12345], list(decoder.items('records')))
+
+    def test_empty(self):
+        decoder = StreamDecoder(self.chunks(u'{"records": [ ]}', 3))
+        self.assertEqual([], list(decoder.items('records')))
+
+    def test_object(self):
+        decoder = StreamDecoder(self.chunks(u'{"domain": {"id": 1}}', 4))
+        self.assertEqual([{'id': 1}], list(decoder.items('domain')))
+
+    def test_missing(self):
+        decoder = StreamDecoder(self.chunks(u'{"a": [1, 2]}', 4))
+        self.assertRaises(KeyError, list, decoder.items('records'))
+
+    def test_truncated(self):
+        decoder = StreamDecoder(self.chunks(u'{"records": [{"id": 1}, {"i', 4))
+        items = decoder.items('records')
+        self.assertEqual({'id': 1}, next(items))
+        self.assertRaises(ValueError, next, items)
+
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        self.client = vaporize.core.Client().__enter__()
+        self.client.settings['clouddns_url'] = 'http://dns/123'
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+
+    def make_response(self, content, status_code=200):
+        response = make_response(content, status_code=status_code)
+        response._content_consumed = True
+        return response
+
+    def test_records(self):
+        self.client.session = FakeTransport([self.make_response(
+            b'{"records": [{"id": "A-1", "name": "www.example.com"}, '
+            b'{"id": "A-2", "name": "mail.example.com"}], "totalEntries": 2}')])
+        records = Domain(id=1).stream_records()
+        self.assertTrue(inspect.isgenerator(records))
+        records = list(records)
+        self.assertEqual(['A-1', 'A-2'], [r.id for r in records])
+        self.assertTrue(all(isinstance(r, Record) for r in records))
+        self.assertEqual(1, records[0].domain_id)
+
+    def test_error(self):
+        self.client.session = FakeTransport([
+            self.make_response(b'', status_code=404)])
+        self.assertRaises(vaporize.exceptions.NotFound,
+                          Domain(id=1).stream_records)
+
+    def test_pages(self):
+        transport = self.client.session = FakeTransport([
+            self.make_response(b'{"records": [{"id": "A-1"}, {"id": "A-2"}], '
+                               b'"totalEntries": 3}'),
+            self.make_response(b'{"records": [{"id": "A-3"}], '
+                               b'"totalEntries": 3}')])
+        records = Domain(id=1).stream_records(page_size=2)
+        self.assertEqual(['A-1', 'A-2', 'A-3'], [r.id for r in records])
+        self.assertEqual(
+            ['http://dns/123/domains/1/records?limit=2&offset=0',
+             'http://dns/123/domains/1/records?limit=2&offset=2'],
+            transport.urls)
+
+
+class RecordingAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, statuses, content=b'{"a": 1}'):
+        super(RecordingAdapter, self).__init__()
+        self.statuses = statuses
+        self.content = content
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        response = make_response(self.content,
+                                 status_code=self.statuses.pop(0))
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class TestCompression(unittest.TestCase):
+    def transport(self, statuses, content=b'{"a": 1}', **options):
+        transport = Transport(conditional=False, retry=False, **options)
+        adapter = RecordingAdapter(statuses, content)
+        transport.session.mount('http://', adapter)
+        return transport, adapter
+
+    def test_accept_encoding(self):
+        self.assertEqual('gzip, deflate',
+                         Transport().headers['Accept-Encoding'])
+        self.assertEqual('identity',
+                         Transport(compression=False).headers['Accept-Encoding'])
+
+    def test_compress(self):
+        transport, adapter = self.transport([202, 202, 202],
+                                            compress_min_size=100)
+        data = '{"contents": "%s"}' % ('a' * 1000)
+        transport.request('post', 'http://dns/import', data, compress=True)
+        transport.request('post', 'http://dns/import', '{}', compress=True)
+        transport.request('post', 'http://dns/domains', data)
+        large, small, other = adapter.requests
+        self.assertEqual('gzip', large.headers['Content-Encoding'])
+        self.assertEqual(data.encode('utf-8'),
+                         zlib.decompress(large.body, 16 + zlib.MAX_WBITS))
+        self.assertFalse('Content-Encoding' in small.headers)
+        self.assertFalse('Content-Encoding' in other.headers)
+        stats = transport.stats()['bytes']
+        self.assertEqual(len(data) * 2 + 2, stats['sent'])
+        self.assertEqual(len(large.body) + len(data) + 2, stats['sent_wire'])
+        self.assertEqual(24, stats['received'])
+
+    def test_rejected(self):
+        transport, adapter = self.transport([415, 202, 202],
+                                            compress_min_size=0)
+        response = transport.request('post', 'http://dns/import', '{}',
+                                     compress=True)
+        self.assertEqual(202, response.status_code)
+        transport.request('post', 'http://dns/import', '{}', compress=True)
+        self.assertEqual(['gzip', None, None],
+                         [r.headers.get('Content-Encoding')
+                          for r in adapter.requests])
+
+    def test_encoding_error(self):
+        transport, adapter = self.transport(
+            [400, 202, 202], b'{"badRequest": {"message": "Unsupported '
+            b'Content-Encoding gzip"}}', compress_min_size=0)
+        transport.request('post', 'http://dns/import', '{}', compress=True)
+        transport.request('post', 'http://dns/import', '{}', compress=True)
+        self.assertEqual(['gzip', None, 'gzip'],
+                         [r.headers.get('Content-Encoding')
+                          for r in adapter.requests])
+
+    def test_validation_error(self):
+        transport, adapter = self.transport(
+            [400, 202], b'{"badRequest": {"message": "Invalid zone"}}',
+            compress_min_size=0)
+        client = vaporize.core.Client()
+        client.settings['clouddns_url'] = 'http://dns/123'
+        client.session = transport
+        with client:
+            self.assertRaises(vaporize.exceptions.BadRequest,
+                              vaporize.domains.Domain.import_zone, 'bad')
+        self.assertEqual(1, len(adapter.requests))
+        transport.request('post', 'http://dns/import', '{}', compress=True)
+        self.assertEqual('gzip', adapter.requests[1].headers['Content-Encoding'])
+
+    def test_handle_request(self):
+        transport, adapter = self.transport([202], b'{"domains": []}',
+                                            compress_min_size=0)
+        client = vaporize.core.Client()
+        client.settings['clouddns_url'] = 'http://dns/123'
+        client.session = transport
+        with client:
+            vaporize.domains.Domain.import_zone('example.com. 300 IN A 1.2.3.4')
+        self.assertEqual('gzip', adapter.requests[0].headers['Content-Encoding'])
@@ -1,5 +1,8 @@
+import copy
+import pickle
 import unittest
 
+from vaporize import utils
 from vaporize.servers import BackupSchedule
 
 
@@ -9,3 +12,134 @@ class TestBackupSchedule(unittest.TestCase):
         bs_dict = bs.to_dict()
         self.assertIn('daily', bs_dict['backupSchedule'])
         self.assertEqual('test', bs_dict['backupSchedule']['daily'])
+
+
+class TestCamelcaseToUnderscore(unittest.TestCase):
+    def test_known_keys(self):
+        for key in utils.KNOWN_KEYS:
+            self.assertEqual(utils.convert_camelcase(key),
+                             utils.camelcase_to_underscore(key))
+
+    def test_conversion(self):
+        self.assertEqual('max_connection_rate',
+                         utils.camelcase_to_underscore('maxConnectionRate'))
+        self.assertEqual('server_id', utils.camelcase_to_underscore('serverId'))
+        self.assertEqual('some_new_key', utils.camelcase_to_underscore('someNewKey'))
+        self.assertIn('someNewKey', utils._key_cache)
+
+    def test_dotdict(self):
+        d = utils.DotDict({'hostId': 'abc', 'flavorId': 1})
+        self.assertEqual('abc', d.host_id)
+        self.assertEqual(1, d['flavor_id'])
+
+
+class TestCompact(unittest.TestCase):
+    RECORD = {'id': 'A-1234', 'name': 'www.example.com', 'type': 'A',
+              'data': '127.0.0.1', 'ttl': 300,
+              'created': '2012-01-01T00:00:00.000+0000',
+              'updated': '2012-01-01T00:00:00.000+0000'}
+
+    def setUp(self):
+        from vaporize.domains import Record
+        self.Record = Record
+        self.CompactRecord = utils.compact_type(Record)
+
+    def test_compact_type(self):
+        self.assertIs(self.CompactRecord, utils.compact_type(self.Record))
+        self.assertFalse(hasattr(self.CompactRecord(), '__dict__'))
+
+    def test_matches_dotdict(self):
+        record = self.Record(self.RECORD, domain_id=1)
+        compact = self.CompactRecord(self.RECORD, domain_id=1)
+        for key, value in record.items():
+            self.assertEqual(value, getattr(compact, key))
+        self.assertFalse(hasattr(compact, 'priority'))
+
+    def test_round_trip(self):
+        compact = self.CompactRecord(self.RECORD, domain_id=1)
+        self.assertEqual(compact, self.CompactRecord(compact.to_dict()))
+        self.assertEqual(self.Record(self.RECORD, domain_id=1),
+                         compact.expand())
+        record = self.Record(self.RECORD, domain_id=1)
+        self.assertEqual(compact, self.CompactRecord.from_resource(record))
+
+    def test_extra(self):
+        compact = self.CompactRecord(self.RECORD, someNewKey=1)
+        self.assertEqual(1, compact.some_new_key)
+        compact.other = 2
+        self.assertEqual(2, compact.to_dict()['other'])
+        self.assertRaises(AttributeError, getattr, compact, 'missing')
+
+    def test_lazy(self):
+        compact = self.CompactRecord(self.RECORD)
+        self.assertEqual(self.RECORD['created'], compact._lazy_created)
+        self.assertEqual(self.Record(self.RECORD).created, compact.created)
+        self.assertFalse(isinstance(compact._lazy_created, str))
+
+    def test_copy(self):
+        compact = self.CompactRecord(self.RECORD, someNewKey=1)
+        compact.created
+        for duplicate in (copy.copy(compact), copy.deepcopy(compact)):
+            self.assertEqual(compact, duplicate)
+            self.assertEqual(1, duplicate.some_new_key)
+        self.assertRaises(AttributeError, getattr,
+                          self.CompactRecord.__new__(self.CompactRecord),
+                          'missing')
+
+    def test_pickle(self):
+        compact = self.CompactRecord(self.RECORD, domain_id=1, someNewKey=1)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(compact, protocol))
+            self.assertIs(self.CompactRecord, type(loaded))
+            self.assertEqual(compact, loaded)
+            self.assertEqual(compact.created, loaded.created)
+
+
+class TestDecode(unittest.TestCase):
+    def assertDecodes(self, cls, data, **kwargs):
+        # Nested resources only get their parent's id if it is set first.
+        expected = cls(dict((k, v) for k, v in data.items() if k == 'id'))
+        expected.update(data, **kwargs)
+        decoded = cls.decode(data, **kwargs)
+        self.assertIs(cls, type(decoded))
+        self.assertEqual(expected, decoded)
+        for key, value in expected.items():
+            self.assertIs(type(value), type(decoded[key]))
+        return decoded
+
+    def test_dotdict(self):
+        self.assertDecodes(utils.DotDict, {'hostId': 'abc', 'someNewKey': 1})
+
+    def test_loadbalancer(self):
+        from vaporize.loadbalancers import LoadBalancer, Node
+        lb = self.assertDecodes(LoadBalancer, {
+            'id': 1234, 'name': 'lb', 'port': 80, 'protocol': 'HTTP',
+            'created': {'time': '2012-01-01T00:00:00Z'},
+            'connectionLogging': {'enabled': False},
+            'nodes': [{'id': 1, 'address': '10.0.0.1', 'port': 80}],
+            'virtualIps': [{'id': 2, 'address': '1.1.1.1', 'ipVersion': 'IPV4'}],
+            'accessList': [{'id': 3, 'address': '0.0.0.0/0', 'type': 'DENY'}]})
+        self.assertTrue(isinstance(lb.nodes[0], Node))
+        self.assertEqual(1234, lb.nodes[0].loadbalancer_id)
+        self.assertEqual('IPV4', lb.virtual_ips[0].version)
+
+    def test_domain(self):
+        from vaporize.domains import Domain
+        domain = self.assertDecodes(Domain, {
+            'id': 1, 'name': 'example.com', 'accountId': 2,
+            'created': '2012-01-01T00:00:00.000+0000',
+            'recordsList': {'records': [{'id': 'A-1', 'type': 'A'}]},
+            'subdomains': {'domains': [{'id': 3, 'name': 'a.example.com'}]}})
+        self.assertEqual(1, domain.records[0].domain_id)
+
+    def test_instance(self):
+        from vaporize.databases import Instance
+        self.assertDecodes(Instance, {
+            'id': 'abc', 'name': 'db', 'flavor': {'id': 1},
+            'volume': {'size': 2}, 'databases': [{'name': 'a'}],
+            'users': [{'name': 'b'}]})
+
+    def test_fallback(self):
+        from vaporize.servers import SharedIPGroup
+        self.assertIs(SharedIPGroup, utils.compile_decoder(SharedIPGroup))
+        self.assertDecodes(SharedIPGroup, {'sharedIpGroupId': 1, 'name': 'a'})
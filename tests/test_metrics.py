@@ -0,0 +1,72 @@
+import unittest
+
+import requests
+
+import vaporize
+from vaporize import metrics
+
+
+def make_response(content, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    return response
+
+
+class FakeTransport(vaporize.core.Transport):
+    def __init__(self, responses):
+        super(FakeTransport, self).__init__(retry=False)
+        self.responses = responses
+
+    def request(self, verb, url, data=None, **kwargs):
+        if not self.responses:
+            raise requests.exceptions.Timeout('timed out')
+        return self.responses.pop(0)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = metrics.Metrics(buckets=(0.5, 60)).install()
+        self.client = vaporize.core.Client().__enter__()
+        self.client.settings['cloudloadbalancers_url'] = 'http://lb/123'
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+        self.metrics.uninstall()
+
+    def test_collect(self):
+        self.client.session = FakeTransport([
+            make_response(b'{"a": 1}'),
+            make_response(b'', status_code=404)])
+        vaporize.core.handle_request('put', 'http://lb/123/loadbalancers/1',
+                                     data='{}')
+        self.assertRaises(vaporize.exceptions.NotFound,
+                          vaporize.core.handle_request, 'put',
+                          'http://lb/123/loadbalancers/2')
+        stats = self.metrics.stats()
+        stats = stats['cloudloadbalancers PUT loadbalancers/{id}']
+        self.assertEqual(2, stats['count'])
+        self.assertEqual({0.5: 2, 60: 2}, stats['buckets'])
+        self.assertEqual({200: 1, 404: 1}, stats['statuses'])
+        self.assertEqual(2, stats['sent'])
+        self.assertEqual(8, stats['received'])
+
+    def test_error(self):
+        self.client.session = FakeTransport([])
+        self.assertRaises(requests.exceptions.Timeout,
+                          vaporize.core.handle_request, 'get',
+                          'http://lb/123/loadbalancers')
+        stats = self.metrics.stats()['cloudloadbalancers GET loadbalancers']
+        self.assertEqual({'Timeout': 1}, stats['errors'])
+
+    def test_prometheus(self):
+        self.client.session = FakeTransport([make_response(b'{}')])
+        vaporize.core.handle_request('get', 'http://lb/123/loadbalancers')
+        text = self.metrics.prometheus()
+        labels = ('service="cloudloadbalancers",method="GET",'
+                  'endpoint="loadbalancers"')
+        self.assertIn('vaporize_request_duration_seconds_bucket'
+                      '{%s,le="+Inf"} 1' % labels, text)
+        self.assertIn('vaporize_responses_total{%s,status="200"} 1' % labels,
+                      text)
+        self.assertIn('vaporize_retries_total{%s} 0' % labels, text)
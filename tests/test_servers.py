@@ -239,3 +239,16 @@ def test_server_find():
     assert server.id == 12345
     assert hasattr(server, 'name')
     assert server.name == 'foo'
+
+
+def test_server_iter_all():
+    servers = [{"id": i, "name": "server%d" % i} for i in range(7)]
+    def handle_mock(verb, url, data=None, wrapper=None, container=None, **kwargs):
+        query = dict(q.split('=') for q in url.split('?')[1].split('&'))
+        offset, limit = int(query['offset']), int(query['limit'])
+        return [wrapper(s) for s in servers[offset:offset + limit]]
+    vaporize.servers.handle_request = handle_mock
+    results = list(vaporize.servers.Server.iter_all(page_size=3))
+    assert [s.id for s in results] == list(range(7))
+    for server in results:
+        assert isinstance(server, vaporize.servers.Server)
@@ -0,0 +1,103 @@
+import unittest
+
+from vaporize import waiters
+from vaporize.exceptions import WaitError, WaitTimeout
+from vaporize.loadbalancers import LoadBalancer
+from vaporize.servers import Server
+
+
+class TestWaiter(unittest.TestCase):
+    def setUp(self):
+        self.listers = dict(waiters.LISTERS)
+        self.calls = 0
+        self.servers = {}
+        waiters.LISTERS[Server] = self.list_servers
+
+    def tearDown(self):
+        waiters.LISTERS.clear()
+        waiters.LISTERS.update(self.listers)
+
+    def list_servers(self):
+        self.calls += 1
+        listed = []
+        for id, statuses in self.servers.items():
+            if statuses:
+                status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+                listed.append(Server(id=id, status=status, progress=0))
+        return listed
+
+    def test_wait(self):
+        self.servers = {1: ['BUILD', 'BUILD', 'ACTIVE'], 2: ['BUILD', 'ACTIVE'],
+                        3: ['BUILD', 'ERROR']}
+        objects = [Server(id=i, status='BUILD') for i in range(1, 4)]
+        done = []
+        handles = waiters.wait(objects, 'ACTIVE', interval=0, timeout=5,
+                               callback=done.append)
+        self.assertEqual(3, self.calls)
+        self.assertEqual(['ACTIVE', 'ACTIVE', 'ERROR'],
+                         [s.status for s in objects])
+        self.assertEqual(0, objects[0].progress)
+        self.assertIs(objects[0], handles[0].result())
+        self.assertRaises(WaitError, handles[2].result)
+        self.assertEqual(3, len(done))
+        self.assertIs(handles[1], done[0])
+
+    def test_wait_all(self):
+        self.servers = dict((i, ['BUILD', 'ACTIVE']) for i in range(200))
+        objects = [Server(id=i, status='BUILD') for i in range(200)]
+        handles = Server.wait_all(objects, interval=0, timeout=5)
+        self.assertEqual(2, self.calls)
+        self.assertEqual(set(['ACTIVE']), set(s.status for s in objects))
+        self.assertTrue(all(h.done() for h in handles))
+
+    def test_timeout(self):
+        self.servers = {1: ['BUILD']}
+        handle = waiters.wait([Server(id=1)], 'ACTIVE', interval=0,
+                              timeout=0)[0]
+        self.assertTrue(isinstance(handle.exception(), WaitTimeout))
+
+    def test_deleted(self):
+        self.servers = {1: ['ACTIVE']}
+        waiter = waiters.Waiter(interval=0)
+        handle = waiter.add(Server(id=1), 'DELETED')
+        waiter.poll()
+        self.assertFalse(handle.done())
+        self.servers = {}
+        waiter.poll()
+        self.assertTrue(handle.done())
+        self.assertEqual(None, handle.exception())
+
+    def test_poll_again(self):
+        failures = [RuntimeError('connection reset')]
+
+        def list_loadbalancers():
+            return [LoadBalancer(id=1, status='ACTIVE')]
+
+        def list_servers():
+            if failures:
+                raise failures.pop()
+            return [Server(id=1, status='ACTIVE')]
+        waiters.LISTERS[LoadBalancer] = list_loadbalancers
+        waiters.LISTERS[Server] = list_servers
+        waiter = waiters.Waiter(interval=0)
+        done = []
+        lb = waiter.add(LoadBalancer(id=1, status='BUILD'),
+                        callback=done.append)
+        server = waiter.add(Server(id=1, status='BUILD'),
+                            callback=done.append)
+        self.assertRaises(RuntimeError, waiter.poll)
+        self.assertEqual(2, waiter.poll())
+        self.assertEqual([lb, server], sorted(done, key=[lb, server].index))
+        self.assertEqual([], waiter.pending)
+
+    def test_background(self):
+        self.servers = {1: ['BUILD', 'ACTIVE']}
+        waiter = waiters.Waiter(interval=0)
+        handle = waiter.add(Server(id=1))
+        waiter.start()
+        self.assertEqual('ACTIVE', handle.result(5).status)
+
+    def test_unsupported(self):
+        self.assertRaises(TypeError, waiters.Waiter().add, object())
+        self.assertEqual(('ERROR', 'SUSPENDED'),
+                         waiters.get_failures(LoadBalancer))
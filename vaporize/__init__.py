@@ -7,5 +7,6 @@ __version__ = '0.3.0'
 __license__ = 'MIT'
 __copyright__ = 'Copyright 2012 Michael Lavers'
 
-from . import databases, domains, loadbalancers, servers, nextgen_servers, volumes
-from .core import connect
+from . import batch, databases, domains, loadbalancers, servers, nextgen_servers, volumes
+from . import cassette, metrics, waiters
+from .core import Client, connect
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+"""Native asyncio support for Vaporize.
+
+Every resource in Vaporize is available here with the same API, except that
+anything which talks to the Rackspace Cloud API must be awaited::
+
+    >>> from vaporize import aio
+    >>> await aio.connect('username', 'apikey')
+    >>> servers = await aio.NextGenServer.list()
+    >>> lb = await aio.LoadBalancer.find(1234)
+    >>> await aio.wrap(lb).add_nodes(node1, node2)
+    >>> nodes = await aio.wrap(lb).nodes
+
+Results are the very same :class:`~vaporize.utils.DotDict` wrappers returned
+by the synchronous API.
+
+Requests are made with `aiohttp <https://docs.aiohttp.org/>`_, which must be
+installed separately. This module requires Python 3.5 or later.
+
+The asyncio API has a :class:`~vaporize.core.Client` of its own, so it can be
+connected to another account or region than :func:`vaporize.connect`.
+Expired or revoked tokens are renewed when a request is answered with
+``401 Unauthorized``, and the request is sent again.
+
+.. note::
+
+    A resource method is run until it makes a request, at which point it is
+    suspended while the request is awaited, then run again from the start
+    with the responses received so far. Each response is decoded once, and
+    the same result is returned to every later run. Methods are expected to
+    be deterministic given the same responses, which holds for the whole of
+    Vaporize.
+
+    For the same reason, batches and parallel pagination make their
+    requests one after another, and methods returning generators, such as
+    ``iter_all``, raise :class:`TypeError`; use the methods returning lists
+    instead. Await :func:`wait` instead of :func:`vaporize.waiters.wait`;
+    ``wait_all`` is awaitable as is.
+"""
+
+import asyncio
+import functools
+import inspect
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from vaporize import (core, databases, domains, loadbalancers,
+                      nextgen_servers, servers, volumes, waiters)
+from vaporize.exceptions import ConnectionError
+
+_client = core.Client()
+
+
+class Pending(BaseException):
+    """Raised to suspend a resource method waiting on a request."""
+    def __init__(self, verb, url, data):
+        super(Pending, self).__init__(verb, url)
+        self.verb = verb
+        self.url = url
+        self.data = data
+
+
+class Replay(object):
+    """Answers :func:`~vaporize.core.handle_request` from prior responses.
+
+    Each response is decoded the first time it is replayed; later replays
+    return the same result, or raise the same exception.
+    """
+    def __init__(self):
+        self.responses = []
+        self.results = []
+        self.index = 0
+
+    def __call__(self, verb, url, data=None, wrapper=None, container=None,
+                 **kwargs):
+        index = self.index
+        if index == len(self.responses):
+            raise Pending(verb, url, data)
+        self.index += 1
+        if index == len(self.results):
+            status_code, content = self.responses[index]
+            try:
+                result = core.handle_response(status_code, content, wrapper,
+                                              container, **kwargs), None
+            except Exception as e:
+                result = None, e
+            self.results.append(result)
+        value, error = self.results[index]
+        if error is not None:
+            raise error
+        return value
+
+    def rewind(self):
+        """Start answering from the first response again."""
+        self.index = 0
+
+
+class Response(object):
+    """A response read by :class:`AsyncTransport`, with the attributes of
+    :class:`requests.Response` that observers use."""
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+def notify(span, event, *args):
+    """Notify the observers of ``event``, with ``span`` as the current
+    span."""
+    if span is None:
+        core.notify(event, *args)
+    else:
+        with core.activate(span):
+            core.notify(event, *args)
+
+
+def start_span(func):
+    """Returns the span of an awaited call of ``func``."""
+    resource = getattr(func, '__self__', None)
+    if resource is None or inspect.ismodule(resource):
+        name = getattr(func, '__qualname__', None) or repr(func)
+        return core.get_tracer().start_span(name, core.current_span())
+    return core.operation_span(resource, func.__name__)
+
+
+class AsyncTransport(object):
+    """A pooled asyncio HTTP transport for the Rackspace Cloud API.
+
+    :param limit: Maximum number of simultaneous connections.
+    :type limit: int
+    :param limit_per_host: Maximum number of simultaneous connections to a
+        single host (``0`` for no limit).
+    :type limit_per_host: int
+    :param connect_timeout: Seconds to wait for a connection to be made.
+    :type connect_timeout: float
+    :param read_timeout: Seconds to wait for the server to send data.
+    :type read_timeout: float
+    :param cache_bust: Append a unique ``fresh`` parameter to every GET.
+    :type cache_bust: bool
+    :param retry: How to retry throttled requests, as for
+        :class:`vaporize.core.Transport`.
+    :type retry: bool or :class:`vaporize.core.RetryPolicy`
+    :param limiter: Pace requests to stay within the account's rate limits.
+    :type limiter: :class:`vaporize.core.RateLimiter`
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, limit=100, limit_per_host=0, connect_timeout=None,
+                 read_timeout=None, cache_bust=False, retry=True,
+                 limiter=None):
+        if aiohttp is None:
+            raise ImportError('aiohttp is required for vaporize.aio')
+        self.connector = aiohttp.TCPConnector(limit=limit,
+                                              limit_per_host=limit_per_host)
+        self.timeout = aiohttp.ClientTimeout(connect=connect_timeout,
+                                             sock_read=read_timeout)
+        self.headers = {}
+        self.session = None
+        self.lock = asyncio.Lock()
+        self.cache_bust = cache_bust
+        if retry is True:
+            retry = core.RetryPolicy()
+        self.retry = retry or None
+        self.limiter = limiter
+
+    async def request(self, verb, url, data=None, client=None, span=None):
+        """Perform an HTTP request.
+
+        Each attempt is notified to the observers (see
+        :class:`vaporize.core.Observer`) when the request is made for a
+        ``client``.
+
+        :param client: The Client the request is made for.
+        :type client: :class:`vaporize.core.Client`
+        :param span: The span of the operation making the request.
+        :type span: :class:`vaporize.core.Span`
+        :returns: A tuple of ``(status_code, content)``.
+        :rtype: tuple
+        """
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector=self.connector,
+                                                 timeout=self.timeout)
+        service = client.get_service(url) if client is not None else None
+        attempt = 0
+        while True:
+            if self.limiter is not None and service is not None:
+                delay = self.limiter.delay(service, verb, url)
+                if delay:
+                    await asyncio.sleep(delay)
+            info = None
+            if client is not None and core._observers:
+                info = core.RequestInfo(client, verb, url, data, attempt)
+                notify(span, 'before_request', info)
+            try:
+                async with self.session.request(
+                        verb.upper(), url, data=data,
+                        headers=self.headers) as response:
+                    content = await response.read()
+            except BaseException as e:
+                if info is not None:
+                    info.elapsed = time.time() - info.started
+                    notify(span, 'on_error', info, e)
+                raise
+            if info is not None:
+                info.elapsed = time.time() - info.started
+                notify(span, 'after_response', info,
+                       Response(response.status, response.headers, content))
+            if (response.status == 413 and self.limiter is not None and
+                    service is not None):
+                self.limiter.throttled(service, verb, url)
+            if self.retry is None:
+                break
+            delay = self.retry.delay(verb, response.status, response.headers,
+                                     attempt)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+            attempt += 1
+        return response.status, content
+
+    async def close(self):
+        """Close all pooled connections."""
+        if self.session is not None:
+            await self.session.close()
+        else:
+            await self.connector.close()
+
+
+async def authenticate(transport, user, apikey, region='DFW'):
+    """Returns an identity response body.
+
+    :raises: ConnectionError
+
+    .. versionadded:: 0.4
+    """
+    auth_url, headers, data = core.auth_request(user, apikey, region)
+    transport.headers.update(headers)
+    status_code, content = await transport.request('post', auth_url, data)
+    if status_code not in [200, 203]:
+        raise ConnectionError("HTTP %d: %s" % (status_code, content))
+    return content
+
+
+async def connect(user, apikey, region='DFW', **options):
+    """Create an asyncio session with the Rackspace Cloud API.
+
+    Accepts the same arguments as :func:`vaporize.core.connect`; additional
+    keyword arguments are used to build the :class:`AsyncTransport`. The
+    default :class:`~vaporize.core.Client` of the synchronous API is left
+    untouched.
+
+    :returns: The :class:`~vaporize.core.Client` of the asyncio API.
+    :raises: ConnectionError
+
+    .. versionadded:: 0.4
+    """
+    transport = AsyncTransport(**options)
+    try:
+        content = await authenticate(transport, user, apikey, region)
+    except BaseException:
+        await transport.close()
+        raise
+    previous = _client.session
+    _client.settings.clear()
+    _client.handle_auth(content, region)
+    transport.headers['X-Auth-Token'] = _client.settings['token']
+    _client.session = transport
+    _client.credentials = (user, apikey, region, None, False)
+    if previous is not None:
+        await previous.close()
+    return _client
+
+
+async def reauthenticate(token=None):
+    """Renew the token of the asyncio session.
+
+    :param token: The token found to be invalid. Nothing is done if the
+        token has changed since, so that concurrent requests failing with
+        the same token renew it once.
+    :type token: str
+    :returns: ``True`` if the session has a new token.
+    :rtype: bool
+    :raises: ConnectionError
+
+    .. versionadded:: 0.4
+    """
+    transport = _client.session
+    if _client.credentials is None or transport is None:
+        return False
+    async with transport.lock:
+        if token is not None and token != _client.settings.get('token'):
+            return True
+        user, apikey, region = _client.credentials[:3]
+        content = await authenticate(transport, user, apikey, region)
+        _client.handle_auth(content, region)
+        transport.headers['X-Auth-Token'] = _client.settings['token']
+        return True
+
+
+async def close():
+    """Close the asyncio session.
+
+    .. versionadded:: 0.4
+    """
+    transport = _client.session
+    _client.session = None
+    _client.credentials = None
+    if transport is not None:
+        await transport.close()
+
+
+async def send(request, span=None):
+    """Returns ``(status_code, content)`` for a suspended request."""
+    transport = _client.session
+    if not isinstance(transport, AsyncTransport):
+        raise ConnectionError('Not connected to the Rackspace Cloud API.')
+    url = request.url
+    if request.verb == 'get' and transport.cache_bust:
+        url = core.munge_url(url)
+    token = _client.settings.get('token')
+    response = await transport.request(request.verb, url, request.data,
+                                       _client, span)
+    if response[0] == 401 and await reauthenticate(token):
+        response = await transport.request(request.verb, url, request.data,
+                                           _client, span)
+    return response
+
+
+async def call(func, *args, **kwargs):
+    """Run any Vaporize function or method, awaiting its requests.
+
+        >>> await aio.call(server.reboot, 'HARD')
+
+    The call is traced as one operation, however many times it is run.
+
+    :raises: TypeError if ``func`` returns a generator.
+
+    .. versionadded:: 0.4
+    """
+    current = start_span(func)
+    replay = Replay()
+    try:
+        while True:
+            core.intercept(replay)
+            try:
+                with _client, core.activate(current):
+                    result = func(*args, **kwargs)
+            except Pending as pending:
+                request = pending
+            else:
+                if inspect.isgenerator(result):
+                    result.close()
+                    raise TypeError('%s returns a generator, which cannot be '
+                                    'awaited; use a method returning a list' %
+                                    getattr(func, '__qualname__', func))
+                return result
+            finally:
+                core.intercept(None)
+            replay.responses.append(await send(request, current))
+            replay.rewind()
+    finally:
+        current.end()
+
+
+async def wait(objects, status='ACTIVE', failure=None, timeout=3600.0,
+               interval=5.0, max_interval=60.0, callback=None):
+    """Wait until every resource reaches a status.
+
+    The same as :func:`vaporize.waiters.wait`, except that the event loop
+    keeps running between ticks.
+
+        >>> handles = await aio.wait(servers, 'ACTIVE', timeout=1800)
+
+    .. versionadded:: 0.4
+    """
+    with _client:
+        waiter = waiters.Waiter(interval, max_interval, timeout=timeout)
+    handles = [waiter.add(obj, status, failure, callback=callback)
+               for obj in objects]
+    while True:
+        delay = await call(waiter.tick)
+        if delay is None:
+            return handles
+        await asyncio.sleep(delay)
+
+
+async def wait_all(objects, status='ACTIVE', timeout=3600.0, interval=5.0,
+                   callback=None):
+    """Awaited in place of the ``wait_all`` classmethods of resources."""
+    return await wait(objects, status, timeout=timeout, interval=interval,
+                      callback=callback)
+
+
+class Proxy(object):
+    """An awaitable view of a Vaporize module, resource class or object."""
+    def __init__(self, target):
+        self.__target = target
+
+    def __repr__(self):
+        return '<Proxy %r>' % (self.__target,)
+
+    def __getattr__(self, name):
+        target = self.__target
+        if name == 'wait_all' and inspect.isclass(target):
+            return wait_all
+        if not inspect.isclass(target):
+            prop = getattr(type(target), name, None)
+            if isinstance(prop, property):
+                return call(prop.fget.__get__(target))
+        attr = getattr(target, name)
+        if inspect.ismodule(attr) or inspect.isclass(attr):
+            return Proxy(attr)
+        if callable(attr):
+            return functools.partial(call, attr)
+        return attr
+
+
+def wrap(target):
+    """Returns an awaitable view of a module, resource class or object.
+
+        >>> lb = await aio.LoadBalancer.find(1234)
+        >>> await aio.wrap(lb).add_nodes(node)
+
+    .. versionadded:: 0.4
+    """
+    return Proxy(target)
+
+
+databases = Proxy(databases)
+domains = Proxy(domains)
+loadbalancers = Proxy(loadbalancers)
+nextgen_servers = Proxy(nextgen_servers)
+servers = Proxy(servers)
+volumes = Proxy(volumes)
+
+Domain = domains.Domain
+Instance = databases.Instance
+LoadBalancer = loadbalancers.LoadBalancer
+NextGenServer = nextgen_servers.NextGenServer
+Server = servers.Server
+Volume = volumes.Volume
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Run many Vaporize operations concurrently.
+
+    >>> from vaporize import batch
+    >>> results = batch.run([(server.reboot, ('HARD',)) for server in servers],
+    ...                     concurrency=20)
+    >>> [r.exception for r in results if not r.ok]
+    []
+
+Calls are spread over a bounded pool of threads that share the connection
+pool of the current :class:`~vaporize.core.Client`'s
+:class:`~vaporize.core.Transport`, so make sure it was created with a
+``pool_maxsize`` at least as large as ``concurrency``.
+
+While requests are intercepted, as they are by :mod:`vaporize.aio`, the
+calls are made one after another in the calling thread instead.
+"""
+
+import functools
+import sys
+import threading
+try:
+    # Python 3.x
+    import queue
+except ImportError:
+    # Python 2.x
+    import Queue as queue
+
+SERVICES = {
+    'vaporize.databases': 'clouddatabases',
+    'vaporize.domains': 'clouddns',
+    'vaporize.loadbalancers': 'cloudloadbalancers',
+    'vaporize.nextgen_servers': 'cloudserversopenstack',
+    'vaporize.servers': 'cloudservers',
+    'vaporize.volumes': 'cloudblockstorage',
+}
+
+
+class Result(object):
+    """The outcome of a single call in a batch.
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, call, value=None, exception=None, traceback=None):
+        self.call = call
+        self.value = value
+        self.exception = exception
+        self.traceback = traceback
+
+    def __repr__(self):
+        if self.ok:
+            return '<Result %r>' % (self.value,)
+        return '<Result %r>' % (self.exception,)
+
+    @property
+    def ok(self):
+        """``True`` if the call did not raise an exception."""
+        return self.exception is None
+
+    def get(self):
+        """Returns the call's return value or raises its exception."""
+        if self.exception is not None:
+            raise self.exception
+        return self.value
+
+
+def get_service(func):
+    """Returns the service name a Vaporize function or method talks to.
+
+    :func:`functools.partial` objects, including the methods of a
+    :class:`~vaporize.core.Bound` view, are unwrapped first.
+
+    .. versionadded:: 0.4
+    """
+    from vaporize.core import Client
+    while isinstance(func, functools.partial):
+        if isinstance(getattr(func.func, '__self__', None), Client):
+            # A Bound method: partial(client.call, method)
+            if not func.args:
+                return None
+            func = func.args[0]
+        else:
+            func = func.func
+    return SERVICES.get(getattr(func, '__module__', None))
+
+
+def normalize(call):
+    """Returns ``(func, args, kwargs)`` for a batch entry.
+
+    A batch entry is a callable, ``(callable, args)`` or
+    ``(callable, args, kwargs)``.
+    """
+    if callable(call):
+        return call, (), {}
+    if len(call) == 2:
+        return call[0], tuple(call[1]), {}
+    return call[0], tuple(call[1]), dict(call[2])
+
+
+def run(calls, concurrency=10, service_concurrency=None):
+    """Run calls concurrently and return their results in order.
+
+    Exceptions do not stop the batch; each is stored on the
+    :class:`Result` of the call that raised it.
+
+    :param calls: Callables, ``(callable, args)`` or
+        ``(callable, args, kwargs)`` tuples, e.g. ``(node.modify, (),
+        {'condition': 'DRAINING'})``.
+    :type calls: list
+    :param concurrency: Maximum number of calls in flight.
+    :type concurrency: int
+    :param service_concurrency: Maximum number of calls in flight per
+        service, e.g. ``{'clouddns': 4}``.
+    :type service_concurrency: dict
+    :returns: A result for each call, in the same order.
+    :rtype: list of :class:`Result`
+
+    .. versionadded:: 0.4
+    """
+    from vaporize.core import current_client, intercepted
+    client = current_client()
+    calls = [normalize(c) for c in calls]
+    results = [None] * len(calls)
+    semaphores = dict((k, threading.BoundedSemaphore(v))
+                      for k, v in (service_concurrency or {}).items())
+
+    def execute(index):
+        func, args, kwargs = calls[index]
+        try:
+            results[index] = Result(calls[index],
+                                    client.call(func, *args, **kwargs))
+        except Exception as e:
+            results[index] = Result(calls[index], exception=e,
+                                    traceback=sys.exc_info()[2])
+
+    if intercepted():
+        # Requests are answered for this thread only (see vaporize.aio), so
+        # make the calls one after another here.
+        for index in range(len(calls)):
+            execute(index)
+        return results
+
+    pending = queue.Queue()
+    for index in range(len(calls)):
+        pending.put(index)
+
+    def worker():
+        while True:
+            try:
+                index = pending.get_nowait()
+            except queue.Empty:
+                return
+            semaphore = semaphores.get(get_service(calls[index][0]))
+            if semaphore is not None:
+                semaphore.acquire()
+            try:
+                execute(index)
+            finally:
+                if semaphore is not None:
+                    semaphore.release()
+
+    threads = [threading.Thread(target=worker)
+               for i in range(min(concurrency, len(calls)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
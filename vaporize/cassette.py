@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""Record API traffic to a file and replay it without the API.
+
+    >>> from vaporize.cassette import Cassette
+    >>> with Cassette('deploy.jsonl.gz', record=True) as cassette:
+    ...     vaporize.connect('username', 'apikey', cassette=cassette)
+    ...     deploy()
+    >>> cassette = Cassette('deploy.jsonl.gz', latency=1.0)
+    >>> vaporize.connect('username', 'apikey', cassette=cassette)
+    >>> deploy()  # Same responses, same timing, no requests made
+
+A cassette sits below the :class:`~vaporize.core.Transport`, so retries,
+token renewal and conditional GETs are recorded and replayed exactly as
+they happened. Streamed responses are recorded as they are read, so
+recording does not buffer them. Responses are replayed in the order they
+were recorded for each verb and URL, ignoring the ``fresh`` parameter added
+by ``cache_bust``.
+
+Cassettes are stored one exchange per line as JSON, gzipped when the file
+name ends in ``.gz``. Request headers and bodies are not stored, and the
+token in identity responses is replaced, so a cassette holds neither the
+API key nor a usable token.
+"""
+
+import base64
+import collections
+import datetime
+import gzip
+import io
+import json
+import threading
+import time
+try:
+    # Python 3.x
+    from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+except ImportError:
+    # Python 2.x
+    from urllib import urlencode
+    from urlparse import parse_qsl, urlsplit, urlunsplit
+
+import requests
+
+from vaporize.exceptions import CassetteError
+
+# Response headers kept in a cassette.
+HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Location',
+           'Retry-After')
+
+# The token put in recorded identity responses.
+TOKEN = 'cassette'
+
+
+def normalize(url):
+    """Returns ``url`` without the ``fresh`` cache busting parameter."""
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    if 'fresh=' not in query:
+        return url
+    query = urlencode([(k, v) for k, v in parse_qsl(query) if k != 'fresh'])
+    return urlunsplit((scheme, netloc, path, query, fragment))
+
+
+def redact(url, content):
+    """Replace the token in an identity response."""
+    if not url.endswith('/tokens'):
+        return content
+    try:
+        data = json.loads(content.decode('utf-8'))
+        data['access']['token']['id'] = TOKEN
+    except (ValueError, KeyError, TypeError):
+        return content
+    return json.dumps(data).encode('utf-8')
+
+
+class Cassette(object):
+    """Recorded request and response pairs.
+
+    :param path: The cassette file.
+    :type path: str
+    :param record: Make requests and record them, instead of replaying the
+        file.
+    :type record: bool
+    :param latency: When replaying, wait this multiple of the time each
+        response originally took (``0`` to answer at once).
+    :type latency: float
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, path, record=False, latency=0.0):
+        self.path = path
+        self.record = record
+        self.latency = latency
+        self.exchanges = []
+        self._queues = None
+        self._lock = threading.Lock()
+        if not record:
+            self.load()
+
+    def __repr__(self):
+        return '<Cassette %s>' % self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.record:
+            self.save()
+
+    def open(self, mode):
+        if self.path.endswith('.gz'):
+            return gzip.open(self.path, mode + 'b')
+        return io.open(self.path, mode + 'b')
+
+    def load(self):
+        """Read the exchanges in the cassette file."""
+        with self.open('r') as f:
+            self.exchanges = [json.loads(line.decode('utf-8'))
+                              for line in f if line.strip()]
+        self._queues = collections.defaultdict(collections.deque)
+        for exchange in self.exchanges:
+            key = (exchange['method'], exchange['url'])
+            self._queues[key].append(exchange)
+
+    def save(self):
+        """Write the recorded exchanges to the cassette file."""
+        with self._lock:
+            exchanges = list(self.exchanges)
+        with self.open('w') as f:
+            for exchange in exchanges:
+                line = json.dumps(exchange, sort_keys=True,
+                                  separators=(',', ':'))
+                f.write(line.encode('utf-8') + b'\n')
+
+    def add(self, request, response, content=None):
+        """Record ``response`` as the answer to ``request``.
+
+        :param content: The response body, if not ``response.content``.
+        :type content: bytes
+        :returns: The recorded exchange.
+        :rtype: dict
+        """
+        if content is None:
+            content = response.content or b''
+        exchange = {
+            'method': request.method,
+            'url': normalize(request.url),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': dict((k, response.headers[k]) for k in HEADERS
+                            if k in response.headers),
+            'elapsed': round(response.elapsed.total_seconds(), 6),
+            }
+        exchange.update(self.body(exchange['url'], content))
+        with self._lock:
+            self.exchanges.append(exchange)
+        return exchange
+
+    def body(self, url, content):
+        """Returns the fields storing ``content`` in an exchange."""
+        content = redact(url, content)
+        try:
+            return {'content': content.decode('utf-8')}
+        except UnicodeDecodeError:
+            return {'base64': base64.b64encode(content).decode('ascii')}
+
+    def update(self, exchange, content):
+        """Replace the body of a recorded exchange."""
+        body = self.body(exchange['url'], content)
+        with self._lock:
+            exchange.pop('content', None)
+            exchange.pop('base64', None)
+            exchange.update(body)
+
+    def play(self, request):
+        """Returns the next recorded exchange for ``request``.
+
+        :raises: :class:`~vaporize.exceptions.CassetteError` if none is left.
+        """
+        key = (request.method, normalize(request.url))
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                raise CassetteError('No recorded response to %s %s' % key)
+            return queue.popleft()
+
+    def adapter(self, adapter):
+        """Returns the requests adapter to mount in place of ``adapter``."""
+        if self.record:
+            return RecordingAdapter(adapter, self)
+        return ReplayAdapter(self)
+
+
+class RecordingAdapter(requests.adapters.BaseAdapter):
+    """Sends requests with another adapter and records them.
+
+    Streamed responses are recorded as their body is read, rather than read
+    up front, so the body recorded is as much of it as was read.
+    """
+    def __init__(self, adapter, cassette):
+        super(RecordingAdapter, self).__init__()
+        self.adapter = adapter
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        response = self.adapter.send(request, **kwargs)
+        if kwargs.get('stream') and response.raw is not None:
+            # Keep the exchange's place in the cassette now, its body once
+            # it has been read.
+            exchange = self.cassette.add(request, response, b'')
+            response.raw = RecordingBody(response.raw, self.cassette,
+                                         exchange)
+        else:
+            self.cassette.add(request, response)
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+class RecordingBody(object):
+    """A streamed response body that records what is read from it."""
+    def __init__(self, raw, cassette, exchange):
+        self.raw = raw
+        self.cassette = cassette
+        self.exchange = exchange
+        self.chunks = []
+        self.recorded = False
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def read(self, *args, **kwargs):
+        chunk = self.raw.read(*args, **kwargs)
+        if chunk:
+            self.chunks.append(chunk)
+        else:
+            self.record()
+        return chunk
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        if hasattr(self.raw, 'stream'):
+            for chunk in self.raw.stream(amt, decode_content=decode_content):
+                self.chunks.append(chunk)
+                yield chunk
+        else:
+            chunk = self.raw.read(amt)
+            while chunk:
+                self.chunks.append(chunk)
+                yield chunk
+                chunk = self.raw.read(amt)
+        self.record()
+
+    def record(self):
+        if not self.recorded:
+            self.recorded = True
+            self.cassette.update(self.exchange, b''.join(self.chunks))
+
+    def close(self):
+        self.record()
+        self.raw.close()
+
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    """Answers requests from a cassette."""
+    def __init__(self, cassette):
+        super(ReplayAdapter, self).__init__()
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        exchange = self.cassette.play(request)
+        if self.cassette.latency:
+            time.sleep(exchange['elapsed'] * self.cassette.latency)
+        response = requests.Response()
+        response.status_code = exchange['status']
+        response.reason = exchange.get('reason')
+        response.headers.update(exchange['headers'])
+        if 'base64' in exchange:
+            content = base64.b64decode(exchange['base64'])
+        else:
+            content = exchange['content'].encode('utf-8')
+        # Read like a body from the connection, so streamed requests work.
+        response.raw = io.BytesIO(content)
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(seconds=exchange['elapsed'])
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
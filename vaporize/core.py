@@ -1,8 +1,29 @@
 # -*- coding: utf-8 -*-
 
+import codecs
+import collections
+import contextlib
 import datetime
+import email.utils
+import functools
+import hashlib
+import inspect
 import json
+import os
+import random
+import re
+import socket
+import sys
+import tempfile
+import threading
 import time
+import weakref
+import zlib
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
 try:
     # Python 3.x
     from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
@@ -12,17 +33,132 @@ except ImportError:
     from urlparse import parse_qsl, urlsplit, urlunsplit
 
 import dateutil.parser
+import dateutil.tz
 import requests
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
 
-from vaporize import __version__
+from vaporize import __version__, batch
 from vaporize.exceptions import ConnectionError, handle_exception
 from vaporize.utils import DotDict
 
 US_AUTH_URL = "https://identity.api.rackspacecloud.com/v2.0/tokens"
 UK_AUTH_URL = "https://lon.identity.api.rackspacecloud.com/v2.0/tokens"
 
-_settings = {}
-_session = {}
+# Timestamps as emitted by the Rackspace Cloud APIs, e.g.
+# 2012-01-01T00:00:00.000+0000, 2011-03-17T19:17:07Z or
+# 2012-05-14T21:08:38.000000.
+ISO8601_RE = re.compile(r'(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)'
+                        r'(?:\.(\d{1,6}))?(Z|[+-]\d\d:?\d\d)?$')
+
+# Path segments of API URLs that identify a resource, e.g. 1234, A-1234 or
+# a UUID.
+ID_RE = re.compile(r'\d')
+
+# Maximum number of timestamps remembered by convert_datetime.
+DATETIME_CACHE_SIZE = 4096
+
+# Seconds before a token expires that it is renewed.
+REFRESH_MARGIN = 300
+
+# Bytes read from the socket at a time when streaming a response.
+STREAM_CHUNK_SIZE = 65536
+
+# Smallest request body gzipped when a request allows compression.
+COMPRESS_MIN_SIZE = 16384
+
+# Matches a 400 error blaming the encoding of a compressed request body,
+# rather than what the body contains.
+ENCODING_ERROR_RE = re.compile(r'content.?encoding|gzip|compress', re.I)
+
+_local = threading.local()
+_datetime_cache = {}
+_tzinfos = {}
+_observers = []
+_tracer = None
+
+
+class Codec(object):
+    """A JSON implementation for request bodies and responses.
+
+    :param name: The name of the codec, such as ``orjson``.
+    :type name: str
+    :param dumps: Serializes an object to JSON (``str`` or ``bytes``).
+    :type dumps: callable
+    :param loads: Deserializes JSON from ``str`` or ``bytes``.
+    :type loads: callable
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return '<Codec %s>' % self.name
+
+
+CODECS = collections.OrderedDict()
+if orjson is not None:
+    CODECS['orjson'] = Codec('orjson', orjson.dumps, orjson.loads)
+if ujson is not None:
+    CODECS['ujson'] = Codec('ujson', ujson.dumps, ujson.loads)
+CODECS['json'] = Codec('json', json.dumps, json.loads)
+
+_codec = list(CODECS.values())[0]
+
+
+def get_codec():
+    """Returns the :class:`Codec` in use.
+
+    The fastest installed codec is used by default: ``orjson``, then
+    ``ujson``, then the standard library's ``json``.
+
+    .. versionadded:: 0.4
+    """
+    return _codec
+
+
+def set_codec(codec):
+    """Set the JSON codec used by Vaporize.
+
+        >>> vaporize.core.set_codec('json')
+
+    :param codec: A name from :data:`CODECS` or a :class:`Codec`.
+    :type codec: str or :class:`Codec`
+    :raises: ValueError if the codec is not installed.
+
+    .. versionadded:: 0.4
+    """
+    global _codec
+    if not isinstance(codec, Codec):
+        if codec not in CODECS:
+            raise ValueError('JSON codec %s is not installed' % codec)
+        codec = CODECS[codec]
+    _codec = codec
+
+
+def dumps(obj):
+    """Serialize a request body with the current :class:`Codec`.
+
+    .. versionadded:: 0.4
+    """
+    return _codec.dumps(obj)
+
+
+def loads(content):
+    """Deserialize a response body with the current :class:`Codec`.
+
+    .. versionadded:: 0.4
+    """
+    return _codec.loads(content)
 
 
 class Auth(requests.auth.AuthBase):
@@ -34,24 +170,1258 @@ class Auth(requests.auth.AuthBase):
         return r
 
 
-def connect(user, apikey, region='DFW'):
+class PoolAdapter(requests.adapters.HTTPAdapter):
+    """An HTTP adapter that applies socket options to pooled connections."""
+    __attrs__ = requests.adapters.HTTPAdapter.__attrs__ + ['socket_options']
+
+    def __init__(self, socket_options=None, **kwargs):
+        self.socket_options = socket_options
+        super(PoolAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.socket_options is not None:
+            kwargs['socket_options'] = self.socket_options
+        super(PoolAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+class RetryPolicy(object):
+    """When and how long to wait before retrying a throttled request.
+
+    Requests answered with ``413 Over Limit`` or ``503 Service Unavailable``
+    are retried up to ``max_retries`` times. The delay honours a
+    ``Retry-After`` header when the API sends one, up to ``max_backoff``
+    seconds, otherwise it is a capped exponential backoff with full jitter: a random delay between zero and
+    ``min(max_backoff, backoff * 2 ** attempt)`` seconds.
+
+    Which statuses are retried is configured per verb. By default ``GET``,
+    ``PUT`` and ``DELETE`` are retried on both statuses, while ``POST`` is
+    only retried on ``413``, which the API returns before acting on the
+    request.
+
+    :param max_retries: Maximum number of retries per request.
+    :type max_retries: int
+    :param backoff: Base delay in seconds.
+    :type backoff: float
+    :param max_backoff: Maximum delay in seconds between retries.
+    :type max_backoff: float
+    :param jitter: Randomize delays so that concurrent callers spread out.
+    :type jitter: bool
+    :param verbs: Maps a verb to the status codes to retry it on.
+    :type verbs: dict
+
+    .. versionadded:: 0.4
+    """
+    VERBS = {'get': (413, 503),
+             'put': (413, 503),
+             'delete': (413, 503),
+             'post': (413,)}
+
+    def __init__(self, max_retries=5, backoff=0.5, max_backoff=60.0,
+                 jitter=True, verbs=None):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.verbs = self.VERBS if verbs is None else verbs
+        self.retries = collections.defaultdict(int)
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def delay(self, verb, status_code, headers, attempt):
+        """Returns the seconds to wait before retrying, or ``None``.
+
+        :param verb: The HTTP verb of the request.
+        :type verb: str
+        :param status_code: The HTTP status code of the response.
+        :type status_code: int
+        :param headers: The headers of the response.
+        :type headers: dict
+        :param attempt: The number of retries made so far.
+        :type attempt: int
+        """
+        if status_code not in self.verbs.get(verb, ()):
+            return None
+        if attempt >= self.max_retries:
+            with self._lock:
+                self.exhausted += 1
+            return None
+        with self._lock:
+            self.retries[verb] += 1
+        delay = parse_retry_after(headers.get('Retry-After'))
+        if delay is not None:
+            return min(self.max_backoff, delay)
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def stats(self):
+        """Returns retry counts per verb and the number of requests that ran
+        out of retries."""
+        with self._lock:
+            return {'retries': dict(self.retries),
+                    'exhausted': self.exhausted}
+
+
+def parse_retry_after(value):
+    """Returns the seconds to wait from a ``Retry-After`` header value.
+
+    .. versionadded:: 0.4
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+
+class TokenBucket(object):
+    """A token bucket refilled at ``rate`` tokens per second.
+
+    Tokens are reserved rather than waited for: :meth:`take` debits a token
+    straight away and returns how long the caller must wait before using
+    it, so the bucket works the same for threads and coroutines.
+
+    :param rate: Tokens added per second.
+    :type rate: float
+    :param capacity: Maximum number of tokens held, i.e. the largest burst.
+    :type capacity: float
+    :param tokens: Tokens available to begin with (default: ``capacity``).
+    :type tokens: float
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, rate, capacity, tokens=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity if tokens is None else float(tokens)
+        self.updated = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def take(self):
+        """Reserve a token and return the seconds to wait for it."""
+        with self._lock:
+            self._refill(time.time())
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def drain(self):
+        """Empty the bucket, e.g. after the API reported ``413``."""
+        with self._lock:
+            self._refill(time.time())
+            self.tokens = min(self.tokens, 0.0)
+
+
+class RateLimiter(object):
+    """A client-side rate limiter for the Rackspace Cloud API.
+
+    Requests are paced per service (``cloudservers``, ``cloudloadbalancers``,
+    ``clouddns``, ...) and verb so that bulk operations run at the highest
+    rate the account allows instead of bursting into ``413 Over Limit``.
+    Limits may be set by hand with :meth:`set_limit` or learned from each
+    service's ``/limits`` resource; with ``learn`` enabled this happens the
+    first time a service is used.
+
+        >>> limiter = RateLimiter()
+        >>> limiter.set_limit('clouddns', 'post', 60, 'MINUTE')
+        >>> vaporize.connect('username', 'apikey', limiter=limiter)
+
+    :param learn: Load each service's limits on first use.
+    :type learn: bool
+
+    .. versionadded:: 0.4
+    """
+    UNITS = {'SECOND': 1, 'MINUTE': 60, 'HOUR': 3600, 'DAY': 86400}
+
+    def __init__(self, learn=False):
+        self.learn = learn
+        self.waited = 0.0
+        self._buckets = {}
+        self._learned = set()
+        self._lock = threading.Lock()
+
+    def set_limit(self, service, verb, value, unit='MINUTE', regex='.*',
+                  remaining=None):
+        """Allow ``value`` requests per ``unit`` to matching URLs.
+
+        :param service: A service name, such as ``clouddns``.
+        :type service: str
+        :param verb: An HTTP verb, such as ``post``.
+        :type verb: str
+        :param value: Number of requests allowed per ``unit``.
+        :type value: int
+        :param unit: ``SECOND``, ``MINUTE``, ``HOUR`` or ``DAY``.
+        :type unit: str
+        :param regex: Only apply to URL paths matching this expression.
+        :type regex: str
+        :param remaining: Requests still allowed in the current period.
+        :type remaining: int
+        """
+        rate = float(value) / self.UNITS[unit.upper()]
+        bucket = TokenBucket(rate, value, remaining)
+        key = (service, verb.lower())
+        with self._lock:
+            buckets = [b for b in self._buckets.get(key, [])
+                       if b[0].pattern != regex]
+            buckets.append((re.compile(regex), bucket))
+            self._buckets[key] = buckets
+
+    def load_limits(self, service, transport):
+        """Learn ``service``'s rate limits from its ``/limits`` resource.
+
+        :param service: A service name, such as ``clouddns``.
+        :type service: str
+        :param transport: The transport to make the request with.
+        :type transport: :class:`Transport`
+        """
+        with self._lock:
+            self._learned.add(service)
+        url = '/'.join([get_url(service), 'limits'])
+        response = transport.request('get', url)
+        if response.status_code != 200:
+            return
+        limits = loads(response.content).get('limits', {})
+        for rate in limits.get('rate', []):
+            # CloudServers v1.0 lists limits directly, the other services
+            # group them by URI.
+            regex = rate.get('regex', '.*')
+            for limit in rate.get('limit', [rate]):
+                if 'verb' in limit and 'value' in limit:
+                    self.set_limit(service, limit['verb'], limit['value'],
+                                   limit.get('unit', 'MINUTE'), regex,
+                                   limit.get('remaining'))
+
+    def delay(self, service, verb, url):
+        """Returns the seconds to wait before sending a request."""
+        path = urlsplit(url).path
+        delay = 0.0
+        for regex, bucket in self._buckets.get((service, verb), []):
+            if regex.search(path):
+                delay = max(delay, bucket.take())
+        if delay:
+            with self._lock:
+                self.waited += delay
+        return delay
+
+    def throttled(self, service, verb, url):
+        """Record that the API rejected a request with ``413``."""
+        path = urlsplit(url).path
+        for regex, bucket in self._buckets.get((service, verb), []):
+            if regex.search(path):
+                bucket.drain()
+
+    def wait(self, verb, url, transport):
+        """Block until a request may be sent."""
+        service = get_service(url)
+        if service is None:
+            return
+        if self.learn and service not in self._learned:
+            try:
+                self.load_limits(service, transport)
+            except Exception:
+                pass
+        delay = self.delay(service, verb, url)
+        if delay:
+            time.sleep(delay)
+
+    def stats(self):
+        """Returns the total seconds spent waiting and the configured
+        limits, keyed by ``service:verb``."""
+        limits = {}
+        with self._lock:
+            for (service, verb), buckets in self._buckets.items():
+                limits['%s:%s' % (service, verb)] = dict(
+                    (r.pattern, b.rate) for r, b in buckets)
+            return {'waited': self.waited, 'limits': limits}
+
+
+class ConditionalCache(object):
+    """A bounded cache of validated GET responses.
+
+    Responses carrying an ``ETag`` or ``Last-Modified`` header are kept per
+    URL so that the next GET can be made conditional. When the API answers
+    ``304 Not Modified`` the cached body is used instead, saving the transfer
+    of the full JSON document.
+
+    The cache holds raw bodies, not decoded resources, so a ``304`` saves the
+    transfer but the body is decoded again. Resources are mutable and owned
+    by their caller, and handing the same objects to every caller of a URL
+    would let one caller's changes leak into another's results; to share
+    resources, use a Client with an :class:`IdentityMap` instead.
+
+    The least recently used entry is evicted once ``maxsize`` URLs or
+    ``maxbytes`` bytes of bodies are cached. Bodies larger than
+    ``max_entry_bytes``, such as long listings, are not cached so that they
+    are not kept in memory after they have been decoded.
+
+    :param maxsize: Maximum number of URLs to keep.
+    :type maxsize: int
+    :param maxbytes: Maximum total size of the cached bodies.
+    :type maxbytes: int
+    :param max_entry_bytes: Largest body to cache.
+    :type max_entry_bytes: int
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, maxsize=256, maxbytes=8 * 1024 * 1024,
+                 max_entry_bytes=256 * 1024):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def headers(self, url):
+        """Returns the conditional request headers for ``url``."""
+        with self._lock:
+            entry = self._entries.get(url)
+        if entry is None:
+            return {}
+        etag, last_modified, content = entry
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if last_modified is not None:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def store(self, url, response):
+        """Remember ``response`` if it carries a validator."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        content = response.content
+        with self._lock:
+            self.misses += 1
+            self.discard(url)
+            if etag is None and last_modified is None:
+                return
+            if content is None or len(content) > self.max_entry_bytes:
+                return
+            self._entries[url] = (etag, last_modified, content)
+            self.size += len(content)
+            while self._entries and (len(self._entries) > self.maxsize or
+                                     self.size > self.maxbytes):
+                self.size -= len(self._entries.popitem(last=False)[1][2])
+
+    def discard(self, url):
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self.size -= len(entry[2])
+
+    def fetch(self, url):
+        """Returns the cached body for ``url`` after a ``304``, or ``None``
+        if it was evicted since the request was made."""
+        with self._lock:
+            entry = self._entries.pop(url, None)
+            if entry is None:
+                return None
+            self._entries[url] = entry
+            self.hits += 1
+        return entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class CatalogCache(object):
+    """A bounded cache of catalog listings that rarely change.
+
+        >>> flavors = NextGenFlavor.list()  # Requested
+        >>> flavors = NextGenFlavor.list()  # Cached
+        >>> vaporize.core.catalog_cache.invalidate()
+
+    Listings of flavors, images, load balancer algorithms, protocols and
+    allowed domains, volume types and database flavors are kept for ``ttl``
+    seconds per account, region and URL, so that provisioning code can list
+    them freely. The least recently used listing is evicted once
+    ``maxsize`` are cached. Creating or deleting an image invalidates the
+    image listings of its service once the request succeeded, and a listing
+    requested before an invalidation is not stored after it.
+
+    :param maxsize: Maximum number of listings to keep.
+    :type maxsize: int
+    :param ttl: Seconds a listing is used for; ``0`` disables the cache.
+    :type ttl: float
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, maxsize=128, ttl=3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, client, url):
+        """Returns the cache key of ``url`` for ``client``, or ``None`` if
+        the Client is not connected."""
+        if client.credentials is None:
+            return None
+        return (client.credentials[0], client.credentials[2].upper(), url)
+
+    def get(self, key):
+        """Returns the cached body for ``key``, or ``None``."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > time.time():
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def store(self, key, content, generation=None):
+        """Keep a response body for ``ttl`` seconds.
+
+        :param generation: The :attr:`generation` when the listing was
+            requested. The body is not kept if anything was invalidated
+            since.
+        :type generation: int
+        """
+        if not self.ttl:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.ttl, content)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, url=None):
+        """Forget the listings whose URL starts with ``url``, or every
+        listing.
+
+        :returns: The number of listings forgotten.
+        :rtype: int
+        """
+        with self._lock:
+            self.generation += 1
+            keys = [k for k in self._entries
+                    if url is None or k[2].startswith(url)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self):
+        """Returns the number of cached listings (``entries``), listings
+        answered from the cache (``hits``) or requested (``misses``) and
+        listings evicted to stay within ``maxsize`` (``evictions``).
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+
+class IdentityMap(object):
+    """Keeps one object per resource, so lookups share what is loaded.
+
+        >>> client = vaporize.Client('username', 'apikey', identity_map=True)
+        >>> with client:
+        ...     lb = LoadBalancer.find(1234)
+        ...     lb is LoadBalancer.find(1234)  # No request made
+        True
+
+    Every resource returned by the API is merged into the object already
+    loaded for its type and ID, if there is one, and that object is returned
+    instead. Listings and reloads thus update the objects held elsewhere, and
+    properties loaded on demand, such as :attr:`LoadBalancer.nodes`, are
+    loaded once. Objects are only weakly referenced and are forgotten once
+    nothing else refers to them.
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self):
+        self.hits = 0
+        self._objects = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._objects)
+
+    def get(self, cls, id):
+        """Returns the loaded ``cls`` resource with this ID, or ``None``."""
+        with self._lock:
+            obj = self._objects.get((cls, str(id)))
+            if obj is not None:
+                self.hits += 1
+            return obj
+
+    def merge(self, result):
+        """Merge a resource, or a list of resources, into the loaded objects.
+
+        :returns: The loaded object for each resource.
+        """
+        if isinstance(result, list):
+            return [self.merge(obj) for obj in result]
+        if not isinstance(result, DotDict) or 'id' not in result:
+            return result
+        key = (type(result), str(result['id']))
+        with self._lock:
+            obj = self._objects.get(key)
+            if obj is None:
+                self._objects[key] = result
+                return result
+        if obj is not result:
+            dict.update(obj, result)
+        return obj
+
+    def discard(self, obj):
+        """Forget a resource, such as one that was deleted."""
+        with self._lock:
+            self._objects.pop((type(obj), str(obj.get('id'))), None)
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+
+
+class TokenCache(object):
+    """Keeps identity responses on disk, sharing tokens between processes.
+
+        >>> vaporize.connect('username', 'apikey', token_cache=True)
+
+    Each user and region has a file of its own, readable only by the current
+    user. Processes authenticate one at a time under an exclusive lock, so a
+    token obtained by one is reused by the others until it nearly expires.
+
+    :param path: The cache directory (default:
+        ``$XDG_CACHE_HOME/vaporize`` or ``~/.cache/vaporize``).
+    :type path: str
+    :param margin: Seconds before expiry that a cached token is no longer
+        used.
+    :type margin: int
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, path=None, margin=REFRESH_MARGIN):
+        if path is None:
+            base = (os.environ.get('XDG_CACHE_HOME') or
+                    os.path.join(os.path.expanduser('~'), '.cache'))
+            path = os.path.join(base, 'vaporize')
+        self.path = path
+        self.margin = margin
+
+    def filename(self, user, region):
+        """Returns the path of the cache file for a user and region."""
+        key = '%s:%s' % (user, region.upper())
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest + '.json')
+
+    def makedirs(self):
+        try:
+            os.makedirs(self.path, 0o700)
+        except OSError:
+            if not os.path.isdir(self.path):
+                raise
+
+    @contextlib.contextmanager
+    def lock(self, user, region):
+        """Hold an exclusive lock on the cache file for a user and region."""
+        self.makedirs()
+        fd = os.open(self.filename(user, region) + '.lock',
+                     os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def load(self, user, region, reject=None):
+        """Returns a cached identity response.
+
+        :param reject: A token known to be invalid.
+        :type reject: str
+        :returns: The response body, or ``None`` if there is no cached token,
+            it is ``reject`` or it expires within :attr:`margin` seconds.
+        :rtype: bytes
+        """
+        try:
+            with open(self.filename(user, region), 'rb') as f:
+                content = f.read()
+            token = loads(content)['access']['token']
+            expires = convert_datetime(token['expires'])
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+        if token['id'] == reject or token_ttl(expires) < self.margin:
+            return None
+        return content
+
+    def store(self, user, region, content):
+        """Atomically replace the cached identity response."""
+        self.makedirs()
+        if not isinstance(content, bytes):
+            content = content.encode('utf-8')
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        getattr(os, 'replace', os.rename)(tmp, self.filename(user, region))
+
+    def clear(self, user, region):
+        """Remove the cached identity response."""
+        try:
+            os.remove(self.filename(user, region))
+        except OSError:
+            pass
+
+
+def gzip_body(data):
+    """Returns a request body compressed with gzip.
+
+    .. versionadded:: 0.4
+    """
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def rejects_encoding(response):
+    """Returns ``True`` if a response says the server cannot read a
+    compressed request body: a ``415``, or a ``400`` whose error is about
+    the encoding.
+
+    .. versionadded:: 0.4
+    """
+    if response.status_code == 415:
+        return True
+    if response.status_code != 400:
+        return False
+    content = response.content or b''
+    if not isinstance(content, str):
+        content = content.decode('utf-8', 'replace')
+    return ENCODING_ERROR_RE.search(content) is not None
+
+
+def wire_size(response, default):
+    """Returns the bytes a response body took on the wire, before it was
+    decompressed.
+
+    .. versionadded:: 0.4
+    """
+    try:
+        size = response.raw.tell()
+    except Exception:
+        size = None
+    if size:
+        return size
+    try:
+        return int(response.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return default
+
+
+class Transport(object):
+    """A pooled HTTP transport for the Rackspace Cloud API.
+
+    Every request made by Vaporize goes through a single Transport, which
+    keeps a pool of persistent connections per host so that concurrent
+    callers reuse sockets instead of opening new ones.
+
+    :param pool_connections: Number of per-host connection pools to cache.
+    :type pool_connections: int
+    :param pool_maxsize: Maximum number of connections kept per host.
+    :type pool_maxsize: int
+    :param pool_block: Block when a host's pool is exhausted instead of
+        opening throwaway connections.
+    :type pool_block: bool
+    :param connect_timeout: Seconds to wait for a connection to be made.
+    :type connect_timeout: float
+    :param read_timeout: Seconds to wait for the server to send data.
+    :type read_timeout: float
+    :param keep_alive: Enable TCP keep-alive probes on pooled sockets.
+    :type keep_alive: bool
+    :param nodelay: Disable Nagle's algorithm on pooled sockets.
+    :type nodelay: bool
+    :param conditional: Make GETs conditional on a cached ``ETag`` or
+        ``Last-Modified``, see :class:`ConditionalCache`. A ``304`` saves the
+        transfer of the body, not its decoding.
+    :type conditional: bool
+    :param cache_size: Maximum number of URLs in the conditional cache.
+    :type cache_size: int
+    :param cache_bytes: Maximum total size of the bodies in the conditional
+        cache.
+    :type cache_bytes: int
+    :param cache_bust: Append a unique ``fresh`` parameter to every GET so
+        that no intermediate HTTP cache can answer it.
+    :type cache_bust: bool
+    :param retry: How to retry throttled requests; ``True`` for the default
+        :class:`RetryPolicy` or ``False`` to never retry.
+    :type retry: bool or :class:`RetryPolicy`
+    :param limiter: Pace requests to stay within the account's rate limits.
+    :type limiter: :class:`RateLimiter`
+    :param cassette: Record requests to, or replay them from, a cassette.
+    :type cassette: :class:`~vaporize.cassette.Cassette`
+    :param compression: Ask for gzip or deflate compressed responses, and
+        gzip request bodies of at least ``compress_min_size`` bytes for the
+        requests that allow it. A body rejected for its encoding is resent
+        uncompressed, and a host that answers ``415`` is sent uncompressed
+        bodies from then on.
+    :type compression: bool
+    :param compress_min_size: Smallest request body to compress.
+    :type compress_min_size: int
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 connect_timeout=None, read_timeout=None, keep_alive=True,
+                 nodelay=True, conditional=True, cache_size=256,
+                 cache_bytes=8 * 1024 * 1024, cache_bust=False, retry=True,
+                 limiter=None, cassette=None, compression=True,
+                 compress_min_size=COMPRESS_MIN_SIZE):
+        socket_options = []
+        if nodelay:
+            socket_options.append((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1))
+        if keep_alive:
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        self.adapter = PoolAdapter(socket_options=socket_options,
+                                   pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize,
+                                   pool_block=pool_block)
+        adapter = self.adapter
+        if cassette is not None:
+            adapter = cassette.adapter(adapter)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Accept-Encoding'] = (
+            'gzip, deflate' if compression else 'identity')
+        self.cassette = cassette
+        self.compression = compression
+        self.compress_min_size = compress_min_size
+        self._uncompressed = set()
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = (ConditionalCache(cache_size, cache_bytes)
+                      if conditional else None)
+        self.cache_bust = cache_bust
+        if retry is True:
+            retry = RetryPolicy()
+        self.retry = retry or None
+        self.limiter = limiter
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._requests = 0
+        self._bytes = dict.fromkeys(['sent', 'sent_wire', 'received',
+                                     'received_wire'], 0)
+
+    @property
+    def headers(self):
+        return self.session.headers
+
+    @property
+    def auth(self):
+        return self.session.auth
+
+    @auth.setter
+    def auth(self, auth):
+        self.session.auth = auth
+
+    def request(self, verb, url, data=None, compress=False, **kwargs):
+        """Perform an HTTP request using a pooled connection.
+
+        :param verb: An HTTP verb, such as ``get`` or ``post``.
+        :type verb: str
+        :param url: The URL to request.
+        :type url: str
+        :param data: An optional request body.
+        :type data: str
+        :param compress: Allow the body to be gzipped, for endpoints known
+            to accept ``Content-Encoding: gzip``.
+        :type compress: bool
+        :returns: The HTTP response.
+        :rtype: :class:`requests.Response`
+
+        .. versionadded:: 0.4
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        conditional = (verb == 'get' and self.cache is not None and
+                       not kwargs.get('stream'))
+        if conditional:
+            headers = self.cache.headers(url)
+            if headers:
+                headers.update(kwargs.get('headers') or {})
+                response = self.send(verb, url, data, data,
+                                     **dict(kwargs, headers=headers))
+                if response.status_code != 304:
+                    return self.validate(url, response, True)
+                content = self.cache.fetch(url)
+                if content is not None:
+                    response.status_code = 200
+                    response._content = content
+                    return response
+                # The cached body was evicted while the request was made;
+                # ask for the full body.
+        host = urlsplit(url).netloc
+        if (compress and self.compression and data is not None and
+                self.compress_min_size is not None and
+                len(data) >= self.compress_min_size and
+                host not in self._uncompressed):
+            headers = dict(kwargs.get('headers') or {})
+            headers['Content-Encoding'] = 'gzip'
+            response = self.send(verb, url, data, gzip_body(data),
+                                 **dict(kwargs, headers=headers))
+            if not rejects_encoding(response):
+                return self.validate(url, response, conditional)
+            if response.status_code == 415:
+                self._uncompressed.add(host)
+        response = self.send(verb, url, data, data, **kwargs)
+        return self.validate(url, response, conditional)
+
+    def send(self, verb, url, data, body, **kwargs):
+        """Send a request body, counting the bytes sent and received."""
+        with self._lock:
+            self._in_flight += 1
+            self._requests += 1
+        try:
+            response = self.session.request(verb.upper(), url, data=body,
+                                            **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        self.count(data, body, response, kwargs.get('stream'))
+        return response
+
+    def count(self, data, body, response, stream=False):
+        received = received_wire = 0
+        if not stream:
+            received = len(response.content or b'')
+            received_wire = wire_size(response, received)
+        with self._lock:
+            self._bytes['sent'] += len(data or b'')
+            self._bytes['sent_wire'] += len(body or b'')
+            self._bytes['received'] += received
+            self._bytes['received_wire'] += received_wire
+
+    def validate(self, url, response, conditional):
+        if conditional and response.status_code == 200:
+            self.cache.store(url, response)
+        return response
+
+    def stats(self):
+        """Returns connection pool utilisation for this Transport.
+
+        The ``pools`` entry maps each host to the pool's ``maxsize``, the
+        number of connections currently checked out (``in_use``), idle
+        connections ready for reuse (``idle``), connections opened over the
+        pool's lifetime (``created``) and requests served (``requests``). The
+        ``cache`` entry counts conditional GETs answered with ``304``
+        (``hits``) or a full body (``misses``) and the size of the cached
+        bodies (``bytes``), while the ``retry`` and
+        ``limiter`` entries come from :meth:`RetryPolicy.stats` and
+        :meth:`RateLimiter.stats`. The ``bytes`` entry counts request and
+        response bodies as the application sees them (``sent`` and
+        ``received``) and as they crossed the wire, compressed
+        (``sent_wire`` and ``received_wire``). Streamed responses are not
+        counted.
+
+        :returns: Pool statistics.
+        :rtype: dict
+
+        .. versionadded:: 0.4
+        """
+        pools = {}
+        manager = self.adapter.poolmanager
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+            queued = list(pool.pool.queue)
+            idle = len([c for c in queued if c is not None])
+            pools['%s://%s:%s' % (pool.scheme, pool.host, pool.port)] = {
+                'maxsize': pool.pool.maxsize,
+                'in_use': pool.pool.maxsize - len(queued),
+                'idle': idle,
+                'created': pool.num_connections,
+                'requests': pool.num_requests,
+                }
+        stats = {'pools': pools}
+        if self.cache is not None:
+            stats['cache'] = {'entries': len(self.cache),
+                              'bytes': self.cache.size,
+                              'hits': self.cache.hits,
+                              'misses': self.cache.misses}
+        if self.retry is not None:
+            stats['retry'] = self.retry.stats()
+        if self.limiter is not None:
+            stats['limiter'] = self.limiter.stats()
+        with self._lock:
+            stats['in_flight'] = self._in_flight
+            stats['requests'] = self._requests
+            stats['bytes'] = dict(self._bytes)
+        return stats
+
+    def close(self):
+        """Close all pooled connections.
+
+        .. versionadded:: 0.4
+        """
+        self.session.close()
+
+
+class Client(object):
+    """A session with the Rackspace Cloud API for one account and region.
+
+    Each Client has its own token, service catalog and :class:`Transport`,
+    so several accounts and regions can be used at once::
+
+        >>> dfw = vaporize.Client('username', 'apikey', 'DFW')
+        >>> lon = vaporize.Client('username', 'apikey', 'LON')
+        >>> with lon:
+        ...     servers = vaporize.servers.Server.list()
+        >>> servers = dfw.bind(vaporize.servers.Server).list()
+
+    Requests are made with the Client of the innermost ``with`` block in the
+    current thread, or else with the default Client used by
+    :func:`connect`. Batches, parallel pagination and prefetching carry the
+    Client over to their worker threads.
+
+    Resources do not remember the Client that loaded them. A method called
+    outside the ``with`` block, or on an object returned by a bound class,
+    is made with whichever Client is current at the time, so keep using the
+    Client explicitly::
+
+        >>> server = lon.bind(vaporize.servers.Server).find(1234)
+        >>> lon.bind(server).reboot()  # Not server.reboot()
+
+    The arguments are those of :func:`connect`. Without a ``user`` the
+    Client is created unconnected. With ``identity_map=True`` each resource
+    is loaded into a single object, see :class:`IdentityMap`.
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, user=None, apikey=None, region='DFW', token_cache=None,
+                 refresh=False, identity_map=False, **options):
+        self.settings = {}
+        self.session = None
+        self.credentials = None
+        self.refresher = None
+        self.identity = IdentityMap() if identity_map else None
+        self.lock = threading.RLock()
+        if user is not None:
+            self.connect(user, apikey, region, token_cache, refresh,
+                         **options)
+
+    def __repr__(self):
+        if self.credentials is not None:
+            return '<Client %s %s>' % (self.credentials[0],
+                                       self.credentials[2].upper())
+        return '<Client>'
+
+    def __enter__(self):
+        stack = getattr(_local, 'clients', None)
+        if stack is None:
+            stack = _local.clients = []
+        stack.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.clients.pop()
+
+    def connect(self, user, apikey, region='DFW', token_cache=None,
+                refresh=False, **options):
+        """Authenticate this Client, replacing any previous session.
+
+        :raises: ConnectionError
+        """
+        if token_cache is True:
+            token_cache = TokenCache()
+        transport = Transport(**options)
+        try:
+            content = authenticate(transport, user, apikey, region,
+                                   token_cache or None)
+        except Exception:
+            transport.close()
+            raise
+        with self.lock:
+            self.handle_auth(content, region)
+            transport.auth = Auth(self.settings['token'])
+            if self.session is not None:
+                self.session.close()
+            self.session = transport
+            self.credentials = (user, apikey, region, token_cache or None,
+                                refresh)
+            self.schedule_refresh()
+
+    def close(self):
+        """Stop renewing the token and close all pooled connections."""
+        with self.lock:
+            self.credentials = None
+            self.schedule_refresh()
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+
+    def handle_auth(self, content, region='DFW'):
+        """Store the token and service catalog from an identity response."""
+        region = region.upper()
+        data = loads(content)['access']
+        self.settings['token'] = data['token']['id']
+        self.settings['expires'] = convert_datetime(data['token']['expires'])
+        for service in data['serviceCatalog']:
+            name = service['name'].lower()
+            if len(service['endpoints']) == 1:
+                url = service['endpoints'][0]['publicURL']
+            else:
+                for endpoint in service['endpoints']:
+                    if endpoint['region'] == region:
+                        url = endpoint['publicURL']
+            self.settings[name + '_url'] = url
+
+    def reauthenticate(self, token=None):
+        """Renew this Client's token.
+
+        :param token: The token found to be invalid. Nothing is done if the
+            token has changed since, so that concurrent requests failing with
+            the same token renew it once.
+        :type token: str
+        :returns: ``True`` if the Client has a new token.
+        :rtype: bool
+        :raises: ConnectionError
+        """
+        with self.lock:
+            if self.credentials is None or self.session is None:
+                return False
+            current = self.settings.get('token')
+            if token is not None and token != current:
+                return True
+            user, apikey, region, token_cache, refresh = self.credentials
+            content = authenticate(self.session, user, apikey, region,
+                                   token_cache, reject=current)
+            self.handle_auth(content, region)
+            self.session.auth = Auth(self.settings['token'])
+            self.schedule_refresh()
+            return True
+
+    def schedule_refresh(self, delay=None):
+        """Renew the token in the background shortly before it expires.
+
+        Does nothing unless the Client was connected with ``refresh=True``.
+        """
+        with self.lock:
+            if self.refresher is not None:
+                self.refresher.cancel()
+                self.refresher = None
+            if self.credentials is None or not self.credentials[4]:
+                return
+            if delay is None:
+                ttl = token_ttl(self.settings['expires'])
+                delay = max(ttl - REFRESH_MARGIN, 0)
+            self.refresher = threading.Timer(delay, self.refresh_token)
+            self.refresher.daemon = True
+            self.refresher.start()
+
+    def refresh_token(self):
+        try:
+            self.reauthenticate()
+        except Exception:
+            # Try again in a minute; requests still renew the token on 401.
+            self.schedule_refresh(60)
+
+    def get_url(self, service):
+        """Returns the endpoint of a service, such as ``clouddns``.
+
+        :raises: ConnectionError
+        """
+        try:
+            return self.settings['%s_url' % service]
+        except KeyError:
+            raise ConnectionError('Not connected to Rackspace Cloud')
+
+    def get_service(self, url):
+        """Returns the name of the service ``url`` belongs to, or ``None``."""
+        service = None
+        length = 0
+        for key, value in list(self.settings.items()):
+            if (key.endswith('_url') and url.startswith(value) and
+                    len(value) > length):
+                service = key[:-4]
+                length = len(value)
+        return service
+
+    def call(self, func, *args, **kwargs):
+        """Run any Vaporize function or method with this Client.
+
+            >>> lon.call(server.reboot, 'HARD')
+        """
+        with self:
+            return func(*args, **kwargs)
+
+    def bind(self, target):
+        """Returns a view of a module, resource class or object that makes
+        its requests with this Client.
+
+            >>> lon.bind(vaporize.loadbalancers).LoadBalancer.list()
+            >>> lon.bind(lb).add_nodes(node)
+        """
+        return Bound(self, target)
+
+
+class Bound(object):
+    """A view of a Vaporize module, resource class or object bound to a
+    :class:`Client`.
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, client, target):
+        self.__client = client
+        self.__target = target
+
+    def __repr__(self):
+        return '<Bound %r %r>' % (self.__client, self.__target)
+
+    def __getattr__(self, name):
+        with self.__client:
+            attr = getattr(self.__target, name)
+        if inspect.ismodule(attr) or inspect.isclass(attr):
+            return Bound(self.__client, attr)
+        if callable(attr):
+            return functools.partial(self.__client.call, attr)
+        return attr
+
+
+_client = Client()
+catalog_cache = CatalogCache()
+
+
+def current_client():
+    """Returns the :class:`Client` requests are made with in this thread.
+
+    .. versionadded:: 0.4
+    """
+    stack = getattr(_local, 'clients', None)
+    if stack:
+        return stack[-1]
+    return _client
+
+
+def connect(user, apikey, region='DFW', token_cache=None, refresh=False,
+            **options):
     """Create a session with the Rackspace Cloud API.
 
     .. note::
 
         Region support is not universal across all Rackspace Cloud services.
 
+    Any additional keyword arguments are used to build the :class:`Transport`
+    shared by all subsequent requests, for example::
+
+        >>> vaporize.connect('username', 'apikey', pool_maxsize=100,
+        ...                  connect_timeout=5, read_timeout=60)
+
     :param user: A Rackspace Cloud username.
     :type user: str
     :param apikey: A Rackspace Cloud API key.
     :type apikey: str
     :param region: A Rackspace Cloud region, such as ``DFW``, ``ORD`` or ``LON``.
     :type region: str
+    :param token_cache: Reuse tokens cached on disk (``True`` for the default
+        :class:`TokenCache`).
+    :type token_cache: bool or :class:`TokenCache`
+    :param refresh: Renew the token in the background before it expires.
+    :type refresh: bool
+    :returns: The default :class:`Client`.
     :raises: ConnectionError
 
+    Expired or revoked tokens are renewed when a request is answered with
+    ``401 Unauthorized``, and the request is sent again.
+
     .. versionadded:: 0.1
+
+    .. versionchanged:: 0.4
+        Accepts :class:`Transport` options, ``token_cache`` and ``refresh``,
+        and connects the default :class:`Client`.
+    """
+    _client.connect(user, apikey, region, token_cache, refresh, **options)
+    return _client
+
+
+def authenticate(transport, user, apikey, region='DFW', token_cache=None,
+                 reject=None):
+    """Returns an identity response, reusing a cached token if possible.
+
+    :param transport: The transport to make the identity request with.
+    :type transport: :class:`Transport`
+    :param token_cache: Where tokens are shared with other processes.
+    :type token_cache: :class:`TokenCache`
+    :param reject: A token known to be invalid.
+    :type reject: str
+    :returns: The identity response body.
+    :raises: ConnectionError
+
+    .. versionadded:: 0.4
+    """
+    auth_url, headers, data = auth_request(user, apikey, region)
+    transport.headers.update(headers)
+    if token_cache is None:
+        return request_token(transport, auth_url, data)
+    with token_cache.lock(user, region):
+        content = token_cache.load(user, region, reject)
+        if content is None:
+            content = request_token(transport, auth_url, data)
+            token_cache.store(user, region, content)
+    return content
+
+
+def request_token(transport, auth_url, data):
+    response = transport.request('post', auth_url, data=data)
+    if response.status_code not in [200, 203]:
+        raise ConnectionError("HTTP %d: %s" % (response.status_code,
+                                               response.content))
+    return response.content
+
+
+def token_ttl(expires):
+    """Returns the number of seconds until a token expires.
+
+    .. versionadded:: 0.4
+    """
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=dateutil.tz.tzutc())
+    now = datetime.datetime.now(dateutil.tz.tzutc())
+    return (expires - now).total_seconds()
+
+
+def auth_request(user, apikey, region='DFW'):
+    """Returns the URL, headers and body of an identity request.
+
+    :returns: A tuple of ``(url, headers, data)``.
+    :raises: ConnectionError
+
+    .. versionadded:: 0.4
     """
-    global _settings, _session
     region = region.upper()
     if region in ['DFW', 'ORD']:
         auth_url = US_AUTH_URL
@@ -62,61 +1432,613 @@ def connect(user, apikey, region='DFW'):
     headers = {'Content-Type': 'application/json',
                'Accept': 'application/json',
                'User-Agent': 'vaporize/%s' % __version__}
-    data = json.dumps({'auth': {
+    data = dumps({'auth': {
         'RAX-KSKEY:apiKeyCredentials': {
             'username': user,
             'apiKey': apikey
             }
         }})
-    response = requests.post(auth_url, headers=headers, data=data)
-    if response.status_code in [200, 203]:
-        data = json.loads(response.content)['access']
-        _settings['token'] = data['token']['id']
-        _settings['expires'] = convert_datetime(data['token']['expires'])
-        for service in data['serviceCatalog']:
-            name = service['name'].lower()
-            if len(service['endpoints']) == 1:
-                url = service['endpoints'][0]['publicURL']
-            else:
-                for endpoint in service['endpoints']:
-                    if endpoint['region'] == region:
-                        url = endpoint['publicURL']
-            _settings[name + '_url'] = url
-        auth = Auth(_settings['token'])
+    return auth_url, headers, data
+
+
+def handle_auth(content, region='DFW'):
+    """Store the token and service catalog from an identity response in the
+    current :class:`Client`.
+
+    .. versionadded:: 0.4
+    """
+    current_client().handle_auth(content, region)
+
+
+def handle_request(verb, url, data=None, wrapper=None, container=None,
+                   cache=False, stream=False, compress=False, **kwargs):
+    interceptor = getattr(_local, 'interceptor', None)
+    if interceptor is not None:
+        result = interceptor(verb, url, data, wrapper, container, **kwargs)
+        if stream:
+            return iter(result if isinstance(result, list) else [result])
+        return result
+    client = current_client()
+    session = client.session
+    if not isinstance(session, Transport):
+        raise ConnectionError('Not connected to the Rackspace Cloud API.')
+    key = None
+    if cache and not stream and verb == 'get' and catalog_cache.ttl:
+        generation = catalog_cache.generation
+        key = catalog_cache.key(client, url)
+        content = catalog_cache.get(key) if key is not None else None
+        if content is not None:
+            return merge(client, handle_response(200, content, wrapper,
+                                                 container, **kwargs))
+    if verb == 'get' and session.cache_bust:
+        url = munge_url(url)
+    options = {}
+    if stream:
+        options['stream'] = True
+    if compress:
+        options['compress'] = True
+    attempt = 0
+    tries = 0
+    reauthenticated = False
+    response = None
+    while True:
+        if response is not None and stream:
+            # Give the connection of the discarded response back to the pool.
+            response.close()
+        if session.limiter is not None:
+            session.limiter.wait(verb, url, session)
+        token = client.settings.get('token')
+        if _observers:
+            response = send(session, RequestInfo(client, verb, url, data,
+                                                 tries, stream), **options)
+        else:
+            response = session.request(verb, url, data=data, **options)
+        tries += 1
+        if (response.status_code == 401 and not reauthenticated and
+                client.reauthenticate(token)):
+            reauthenticated = True
+            continue
+        if response.status_code == 413 and session.limiter is not None:
+            service = client.get_service(url)
+            if service is not None:
+                session.limiter.throttled(service, verb, url)
+        if session.retry is None:
+            break
+        delay = session.retry.delay(verb, response.status_code,
+                                    response.headers, attempt)
+        if delay is None:
+            break
+        time.sleep(delay)
+        attempt += 1
+    if stream:
+        if response.status_code not in [200, 201, 202, 203, 204]:
+            try:
+                handle_exception(response.status_code, response.content)
+            finally:
+                response.close()
+        return stream_response(client, response, wrapper, container,
+                               **kwargs)
+    if key is not None and response.status_code == 200:
+        catalog_cache.store(key, response.content, generation)
+    return merge(client, handle_response(response.status_code,
+                                         response.content, wrapper,
+                                         container, **kwargs))
+
+
+def stream_response(client, response, wrapper=None, container=None,
+                    **kwargs):
+    """Yields each result of a streamed response as soon as it is decoded.
+
+    Only one result and a chunk of the body are held in memory at a time,
+    instead of the whole body and every result. The connection is released
+    once the results are exhausted or the generator is closed.
+
+    .. versionadded:: 0.4
+    """
+    if wrapper is None:
+        wrapper = DotDict
+    wrapper = getattr(wrapper, 'decode', wrapper)
+    try:
+        decoder = StreamDecoder(response.iter_content(STREAM_CHUNK_SIZE))
+        if not decoder.peek():
+            return
+        for item in decoder.items(container):
+            yield merge(client, wrapper(item, **kwargs))
+    finally:
+        response.close()
+
+
+class StreamDecoder(object):
+    """Decodes the elements of an array in a JSON object incrementally.
+
+        >>> decoder = StreamDecoder(response.iter_content(65536))
+        >>> for record in decoder.items('records'):
+        ...     print(record['name'])
+
+    Elements are decoded with :meth:`json.JSONDecoder.raw_decode` from a
+    buffer holding the body not yet decoded, which is refilled from
+    ``chunks`` whenever it ends in the middle of an element.
+
+    :param chunks: The response body, as an iterable of bytes.
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json = json.JSONDecoder()
+        self.buffer = u''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Append the next chunk to the buffer, dropping what was decoded.
+
+        :returns: ``False`` at the end of the body.
+        """
+        if self.eof:
+            return False
+        for chunk in self.chunks:
+            text = self.decoder.decode(chunk)
+            if text:
+                break
+        else:
+            text = self.decoder.decode(b'', True)
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return bool(text)
+
+    def peek(self):
+        """Returns the next character that is not whitespace, or ``''`` at
+        the end of the body."""
+        while True:
+            while (self.pos < len(self.buffer) and
+                    self.buffer[self.pos] in ' \t\n\r'):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of ``chars``."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('Expected one of %r at %r' % (
+                chars, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.json.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next
+            # chunk.
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return obj
+
+    def items(self, container=None):
+        """Yields each element of the array under the ``container`` key.
+
+        If the value under ``container`` is not an array, or ``container``
+        is ``None``, the value itself is the only item.
+
+        :raises: KeyError if the object has no ``container`` key.
+        """
+        if container is None:
+            yield self.value()
+            return
+        self.expect('{')
+        if self.peek() != '}':
+            while True:
+                key = self.value()
+                self.expect(':')
+                if key != container:
+                    self.value()
+                    if self.expect(',}') == '}':
+                        break
+                    continue
+                if self.peek() != '[':
+                    yield self.value()
+                    return
+                self.expect('[')
+                if self.peek() == ']':
+                    return
+                while True:
+                    yield self.value()
+                    if self.expect(',]') == ']':
+                        return
+        raise KeyError(container)
+
+
+class RequestInfo(object):
+    """One attempt at a request, as seen by an :class:`Observer`.
+
+    ``service`` is the name of the service, such as ``clouddns``, and
+    ``endpoint`` the path below the service's URL with IDs replaced by
+    ``{id}``, e.g. ``loadbalancers/{id}/nodes``. ``attempt`` counts from
+    ``0`` and is incremented by every retry. ``elapsed`` is set to the
+    seconds taken once a response or error is received. When ``stream`` is
+    ``True`` the response body has not been read yet; reading
+    ``response.content`` reads all of it.
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, client, verb, url, data=None, attempt=0,
+                 stream=False):
+        self.client = client
+        self.verb = verb
+        self.url = url
+        self.data = data
+        self.attempt = attempt
+        self.stream = stream
+        self.service = client.get_service(url)
+        base = client.settings.get('%s_url' % self.service)
+        self.endpoint = endpoint_template(url, base)
+        self.started = time.time()
+        self.elapsed = None
+
+    def __repr__(self):
+        return '<RequestInfo %s %s>' % (self.verb.upper(), self.url)
+
+
+class Observer(object):
+    """Base class for objects notified of every request made.
+
+        >>> class Logger(vaporize.core.Observer):
+        ...     def after_response(self, request, response):
+        ...         print(request.endpoint, response.status_code,
+        ...               request.elapsed)
+        >>> vaporize.core.add_observer(Logger())
+
+    Each attempt at a request, including retries, is notified separately.
+    Exceptions raised by observers are ignored.
+
+    .. versionadded:: 0.4
+    """
+    def before_request(self, request):
+        """Called with a :class:`RequestInfo` before it is sent."""
+
+    def after_response(self, request, response):
+        """Called with the :class:`requests.Response` received."""
+
+    def on_error(self, request, exception):
+        """Called when no response was received, e.g. on a timeout."""
+
+
+def add_observer(observer):
+    """Notify ``observer`` of every request made.
+
+    :type observer: :class:`Observer`
+
+    .. versionadded:: 0.4
+    """
+    _observers.append(observer)
+
+
+def remove_observer(observer):
+    """Stop notifying ``observer``.
+
+    .. versionadded:: 0.4
+    """
+    _observers.remove(observer)
+
+
+def notify(event, *args):
+    for observer in list(_observers):
+        try:
+            getattr(observer, event)(*args)
+        except Exception:
+            pass
+
+
+def send(session, request, **options):
+    """Make one attempt at a request, notifying the observers."""
+    notify('before_request', request)
+    try:
+        response = session.request(request.verb, request.url,
+                                   data=request.data, **options)
+    except BaseException:
+        request.elapsed = time.time() - request.started
+        notify('on_error', request, sys.exc_info()[1])
+        raise
+    request.elapsed = time.time() - request.started
+    notify('after_response', request, response)
+    return response
+
+
+class Span(object):
+    """A span that records nothing, and the interface of the spans
+    returned by a :class:`Tracer`.
+
+    .. versionadded:: 0.4
+    """
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, exception):
+        pass
+
+    def end(self):
+        pass
+
+
+class Tracer(object):
+    """Base class for tracers, which by default record nothing.
+
+    Subclasses adapt Vaporize to a tracing backend, for example::
+
+        >>> class OpenTelemetryTracer(vaporize.core.Tracer):
+        ...     def __init__(self, tracer):
+        ...         self.tracer = tracer
+        ...     def start_span(self, name, parent=None, attributes=None):
+        ...         context = parent and trace.set_span_in_context(parent)
+        ...         return self.tracer.start_span(name, context,
+        ...                                       attributes=attributes)
+        >>> vaporize.core.set_tracer(OpenTelemetryTracer(tracer))
+
+    Operations on resources, such as :meth:`LoadBalancer.create`, open a
+    span named after the resource and operation, with the resource type
+    (``vaporize.resource``) and ID (``vaporize.resource_id``). Each attempt
+    at an HTTP request, retries included, opens a child span named after
+    its verb and endpoint with the ``http.method``, ``http.url``,
+    ``http.status_code``, ``vaporize.service``, ``vaporize.endpoint`` and
+    ``vaporize.attempt`` attributes. The verb and endpoint of the last
+    request are also set on the operation's span.
+
+    .. versionadded:: 0.4
+    """
+    def start_span(self, name, parent=None, attributes=None):
+        """Returns a new :class:`Span`.
+
+        :param name: The span's name, such as ``LoadBalancer.create``.
+        :type name: str
+        :param parent: The enclosing span, if any.
+        :type parent: :class:`Span`
+        :param attributes: The span's initial attributes.
+        :type attributes: dict
+        """
+        return Span()
+
+
+class SpanObserver(Observer):
+    """Opens a span around each attempt at a request."""
+    def before_request(self, request):
+        parent = current_span()
+        if parent is not None:
+            parent.set_attribute('http.method', request.verb.upper())
+            parent.set_attribute('vaporize.endpoint', request.endpoint)
+        attributes = {'http.method': request.verb.upper(),
+                      'http.url': request.url,
+                      'vaporize.service': request.service,
+                      'vaporize.endpoint': request.endpoint,
+                      'vaporize.attempt': request.attempt}
+        request.span = _tracer.start_span(
+            '%s %s' % (request.verb.upper(), request.endpoint), parent,
+            attributes)
+
+    def after_response(self, request, response):
+        request.span.set_attribute('http.status_code', response.status_code)
+        request.span.end()
+
+    def on_error(self, request, exception):
+        request.span.record_exception(exception)
+        request.span.end()
+
+
+_span_observer = SpanObserver()
+
+
+def set_tracer(tracer):
+    """Trace operations and requests with ``tracer``, or stop tracing with
+    ``None``.
+
+    :type tracer: :class:`Tracer`
+
+    .. versionadded:: 0.4
+    """
+    global _tracer
+    if tracer is None and _span_observer in _observers:
+        remove_observer(_span_observer)
+    elif tracer is not None and _span_observer not in _observers:
+        add_observer(_span_observer)
+    _tracer = tracer
+
+
+def get_tracer():
+    """Returns the current :class:`Tracer`.
+
+    .. versionadded:: 0.4
+    """
+    return _tracer if _tracer is not None else Tracer()
+
+
+def current_span():
+    """Returns the span of the operation running in this thread, or
+    ``None``.
+
+    .. versionadded:: 0.4
+    """
+    spans = getattr(_local, 'spans', None)
+    return spans[-1] if spans else None
+
+
+@contextlib.contextmanager
+def span(name, attributes=None):
+    """Run the enclosed block in a span of the current tracer.
+
+        >>> with vaporize.core.span('deploy', {'release': '1.2'}):
+        ...     lb.add_nodes(node)
+
+    .. versionadded:: 0.4
+    """
+    current = get_tracer().start_span(name, current_span(), attributes)
+    try:
+        with activate(current):
+            yield current
+    finally:
+        current.end()
+
+
+@contextlib.contextmanager
+def activate(current):
+    """Make ``current`` the span of this thread within the enclosed block,
+    recording any exception raised in it."""
+    spans = getattr(_local, 'spans', None)
+    if spans is None:
+        spans = _local.spans = []
+    spans.append(current)
+    try:
+        yield current
+    except Exception:
+        current.record_exception(sys.exc_info()[1])
+        raise
+    finally:
+        spans.pop()
+
+
+def operation_span(resource, name):
+    """Returns a new span of the current tracer for operation ``name`` of
+    ``resource``, a resource or resource class.
+
+    .. versionadded:: 0.4
+    """
+    cls = resource if inspect.isclass(resource) else type(resource)
+    attributes = {'vaporize.resource': cls.__name__}
+    if isinstance(resource, dict) and resource.get('id') is not None:
+        attributes['vaporize.resource_id'] = str(resource['id'])
+    return get_tracer().start_span('%s.%s' % (cls.__name__, name),
+                                   current_span(), attributes)
+
+
+def traced(func):
+    """Decorate a resource method to run in a span of the current tracer.
+
+    Without a tracer the method is called directly. When the method returns
+    a generator the span lasts until the generator is exhausted or closed,
+    and is the current span only while the generator runs.
+
+    Methods are not traced while requests are intercepted, as the runs of
+    a method suspended by :mod:`vaporize.aio` are replayed; each awaited
+    call has one span of its own instead.
+
+    .. versionadded:: 0.4
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if _tracer is None or intercepted():
+            return func(self, *args, **kwargs)
+        current = operation_span(self, func.__name__)
         try:
-            _session = requests.session(auth=auth, headers=headers)
-        except TypeError:
-            _session = requests.Session()
-            _session.auth = auth
-            _session.headers.update(headers)
-        except:
+            with activate(current):
+                result = func(self, *args, **kwargs)
+        except BaseException:
+            current.end()
             raise
+        if inspect.isgenerator(result):
+            return traced_steps(current, result)
+        current.end()
+        return result
+    return wrapper
+
+
+def traced_steps(current, generator):
+    """Yields from ``generator``, running each step in span ``current`` and
+    ending it once the generator is done."""
+    try:
+        while True:
+            with activate(current):
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        generator.close()
+        current.end()
+
+
+def endpoint_template(url, base=None):
+    """Returns the path of ``url`` below ``base`` with IDs replaced by
+    ``{id}``, grouping requests to the same endpoint.
+
+        >>> endpoint_template('https://lb/v1.0/123/loadbalancers/42/nodes',
+        ...                   'https://lb/v1.0/123')
+        'loadbalancers/{id}/nodes'
+
+    .. versionadded:: 0.4
+    """
+    url = url.split('?', 1)[0]
+    if base and url.startswith(base):
+        path = url[len(base):]
     else:
-        raise ConnectionError("HTTP %d: %s" % (response.status_code,
-                                               response.content))
+        path = urlsplit(url).path
+    return '/'.join('{id}' if ID_RE.search(part) else part
+                    for part in path.strip('/').split('/'))
 
 
-def handle_request(verb, url, data=None, wrapper=None, container=None, **kwargs):
-    if not isinstance(_session, requests.sessions.Session):
-        raise ConnectionError('Not connected to the Rackspace Cloud API.')
-    if verb == 'get':
-        request = _session.get
-        url = munge_url(url)
-    elif verb == 'post':
-        request = _session.post
-    elif verb == 'put':
-        request = _session.put
-    elif verb == 'delete':
-        request = _session.delete
-    response = request(url, data=data)
-    if response.status_code not in [200, 201, 202, 203, 204]:
-        handle_exception(response.status_code, response.content)
-    content = response.content.strip()
+def merge(client, result):
+    """Returns ``result`` merged into the Client's identity map, if any."""
+    if client.identity is None:
+        return result
+    return client.identity.merge(result)
+
+
+def lookup(cls, id):
+    """Returns the loaded ``cls`` resource with this ID from the current
+    Client's identity map, or ``None``.
+
+    .. versionadded:: 0.4
+    """
+    identity = current_client().identity
+    if identity is None:
+        return None
+    return identity.get(cls, id)
+
+
+def forget(obj):
+    """Drops a deleted resource from the current Client's identity map.
+
+    .. versionadded:: 0.4
+    """
+    identity = current_client().identity
+    if identity is not None:
+        identity.discard(obj)
+
+
+def handle_response(status_code, content, wrapper=None, container=None,
+                    **kwargs):
+    """Raise for an error status or wrap a response body.
+
+    :param status_code: The HTTP status code of the response.
+    :type status_code: int
+    :param content: The raw response body.
+    :type content: str
+    :param wrapper: The class to wrap each result with.
+    :param container: The key in the response holding the result(s).
+    :type container: str
+
+    .. versionadded:: 0.4
+    """
+    if status_code not in [200, 201, 202, 203, 204]:
+        handle_exception(status_code, content)
+    content = content.strip()
     if not content:
         return True
-    content = json.loads(content)
+    content = loads(content)
     if wrapper is None:
         wrapper = DotDict
+    wrapper = getattr(wrapper, 'decode', wrapper)
     if container and isinstance(content[container], list):
         return [wrapper(i, **kwargs) for i in content[container]]
     elif container is None:
@@ -125,16 +2047,221 @@ def handle_request(verb, url, data=None, wrapper=None, container=None, **kwargs)
         return wrapper(content[container], **kwargs)
 
 
+class PageFetcher(threading.Thread):
+    """Fetches a page of results in the background."""
+    def __init__(self, fetch, limit, position):
+        super(PageFetcher, self).__init__()
+        self.daemon = True
+        self.fetch = fetch
+        self.limit = limit
+        self.position = position
+        self.client = current_client()
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            with self.client:
+                self.result = self.fetch(self.limit, self.position)
+        except Exception:
+            self.error = sys.exc_info()[1]
+
+    def get(self):
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def paginate(fetch, page_size=100, marker=False, prefetch=False):
+    """Lazily yield every result of a paginated collection.
+
+    ``fetch`` is called as ``fetch(limit, position)`` and returns one page
+    as a list. For offset pagination ``position`` is the offset of the page;
+    for marker pagination it is the ``id`` of the last result of the previous
+    page (``None`` for the first page). Iteration stops at the first page
+    shorter than ``page_size``.
+
+    :param fetch: Returns a page of results.
+    :type fetch: callable
+    :param page_size: Number of results to request per page.
+    :type page_size: int
+    :param marker: Use marker instead of offset pagination.
+    :type marker: bool
+    :param prefetch: Fetch the next page in the background while the current
+        one is being consumed. Ignored while requests are intercepted.
+    :type prefetch: bool
+
+    .. versionadded:: 0.4
+    """
+    prefetch = prefetch and not intercepted()
+    position = None if marker else 0
+    page = fetch(page_size, position)
+    while page:
+        if len(page) < page_size:
+            for result in page:
+                yield result
+            return
+        if marker:
+            position = page[-1]['id']
+        else:
+            position += len(page)
+        if prefetch:
+            following = PageFetcher(fetch, page_size, position)
+            following.start()
+        for result in page:
+            yield result
+        if prefetch:
+            page = following.get()
+        else:
+            page = fetch(page_size, position)
+
+
+def stream_pages(fetch, page_size=100):
+    """Yield every result of an offset-paginated collection, streaming each
+    page.
+
+    ``fetch`` is called as ``fetch(limit, offset)`` and returns an iterator
+    over one page, such as the generator :func:`handle_request` returns with
+    ``stream=True``. Pages are requested one after another until one comes
+    back short. The first page is requested before this returns, so that
+    errors are raised at once.
+
+    :param fetch: Returns an iterator over a page of results.
+    :type fetch: callable
+    :param page_size: Number of results to request per page.
+    :type page_size: int
+    :returns: A generator of results.
+
+    .. versionadded:: 0.4
+    """
+    return stream_following(fetch, page_size, fetch(page_size, 0))
+
+
+def stream_following(fetch, page_size, page):
+    offset = 0
+    while True:
+        count = 0
+        try:
+            for result in page:
+                count += 1
+                yield result
+        finally:
+            # Release the connection of a page abandoned part way through.
+            close = getattr(page, 'close', None)
+            if close is not None:
+                close()
+        if count < page_size:
+            return
+        offset += page_size
+        page = fetch(page_size, offset)
+
+
+def fetch_all(url, container, wrapper=None, page_size=100, workers=4,
+              total='totalEntries', **kwargs):
+    """Fetch every page of an offset-paginated collection concurrently.
+
+    The first page is fetched on its own. If its response carries the size
+    of the collection (CloudDNS returns ``totalEntries``) the remaining pages
+    are requested across ``workers`` threads at once; otherwise pages are
+    requested ``workers`` at a time until one comes back short. Results are
+    returned in collection order.
+
+    :param url: The URL of the collection.
+    :type url: str
+    :param container: The key in each response holding the results.
+    :type container: str
+    :param wrapper: The class to wrap each result with.
+    :param page_size: Number of results to request per page.
+    :type page_size: int
+    :param workers: Maximum number of pages requested at once.
+    :type workers: int
+    :param total: The key in the first response holding the size of the
+        collection.
+    :type total: str
+    :returns: Every result in the collection.
+    :rtype: list
+
+    .. versionadded:: 0.4
+    """
+    def fetch(offset):
+        page_url = query(url, limit=page_size, offset=offset)
+        return handle_request('get', page_url, wrapper=dict)
+
+    def wrap(content):
+        decode = getattr(wrapper or DotDict, 'decode', wrapper)
+        return [decode(i, **kwargs) for i in content[container]]
+
+    first = fetch(0)
+    results = wrap(first)
+    if len(results) < page_size:
+        return results
+    if total in first:
+        offsets = range(page_size, int(first[total]), page_size)
+        for result in batch.run([(fetch, (o,)) for o in offsets], workers):
+            results.extend(wrap(result.get()))
+        return results
+    offset = page_size
+    while True:
+        offsets = [offset + i * page_size for i in range(workers)]
+        for result in batch.run([(fetch, (o,)) for o in offsets], workers):
+            page = wrap(result.get())
+            results.extend(page)
+            if len(page) < page_size:
+                return results
+        offset = offsets[-1] + page_size
+
+
 def get_session():
-    return _session
+    """Returns the :class:`requests.Session` of the current client.
+
+    ``None`` until the client is connected. Use :func:`get_transport` for the
+    :class:`Transport` wrapping it.
+    """
+    transport = get_transport()
+    return transport.session if transport is not None else None
+
+
+def get_transport():
+    """Returns the :class:`Transport` of the current client.
+
+    .. versionadded:: 0.4
+    """
+    return current_client().session
+
+
+def intercept(interceptor):
+    """Route this thread's calls to :func:`handle_request` to ``interceptor``.
+
+    The interceptor is called with the same arguments as
+    :func:`handle_request`. Pass ``None`` to restore normal behaviour.
+
+    .. versionadded:: 0.4
+    """
+    _local.interceptor = interceptor
+
+
+def intercepted():
+    """Returns ``True`` if this thread's requests go to an interceptor.
+
+    Interceptors belong to a single thread, so work that would run in worker
+    threads or sleep between requests checks this first.
+
+    .. versionadded:: 0.4
+    """
+    return getattr(_local, 'interceptor', None) is not None
 
 
 def get_url(service):
-    service = '%s_url' % service
-    if service in _settings:
-        return _settings[service]
-    else:
-        raise ConnectionError('Not connected to Rackspace Cloud')
+    return current_client().get_url(service)
+
+
+def get_service(url):
+    """Returns the name of the service ``url`` belongs to, or ``None``.
+
+    .. versionadded:: 0.4
+    """
+    return current_client().get_service(url)
 
 
 def query(url, **kwargs):
@@ -155,7 +2282,56 @@ def munge_url(url):
     return urlunsplit((scheme, netloc, path, query, fragment))
 
 
+def parse_datetime(value):
+    """Parse a timestamp in one of the formats the Rackspace Cloud APIs use.
+
+    The result is the same as :func:`dateutil.parser.parse`'s. The time zone
+    of each distinct offset is looked up with dateutil once.
+
+    :param value: An ISO 8601 timestamp.
+    :type value: str
+    :returns: A datetime, or ``None`` if ``value`` is in another format.
+    :rtype: :class:`datetime.datetime`
+
+    .. versionadded:: 0.4
+    """
+    match = ISO8601_RE.match(value)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, tz = match.groups()
+    tzinfo = None
+    if tz is not None:
+        try:
+            tzinfo = _tzinfos[tz]
+        except KeyError:
+            tzinfo = dateutil.parser.parse('2000-01-01T00:00:00' + tz).tzinfo
+            _tzinfos[tz] = tzinfo
+    microsecond = int(fraction.ljust(6, '0')) if fraction else 0
+    try:
+        return datetime.datetime(int(year), int(month), int(day), int(hour),
+                                 int(minute), int(second), microsecond, tzinfo)
+    except ValueError:
+        return None
+
+
 def convert_datetime(value):
-    if not isinstance(value, datetime.datetime):
-        value = dateutil.parser.parse(value)
-    return value
+    """Convert a timestamp from an API response to a datetime.
+
+    Timestamps are parsed with :func:`parse_datetime`, falling back to
+    :func:`dateutil.parser.parse` for other formats. Up to
+    :data:`DATETIME_CACHE_SIZE` recent timestamps are remembered, as
+    resources listed together often share them.
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        return _datetime_cache[value]
+    except KeyError:
+        pass
+    result = parse_datetime(value)
+    if result is None:
+        result = dateutil.parser.parse(value)
+    if len(_datetime_cache) >= DATETIME_CACHE_SIZE:
+        _datetime_cache.clear()
+    _datetime_cache[value] = result
+    return result
@@ -1,9 +1,8 @@
 # -*- coding: utf-8 -*-
 
-import json
-
-from vaporize.core import convert_datetime, get_url, handle_request, query
-from vaporize.utils import DotDict
+from vaporize.core import (convert_datetime, dumps, get_url, handle_request,
+                           paginate, query, traced)
+from vaporize.utils import DotDict, Field, Nested
 
 
 STATUSES = {
@@ -27,6 +26,7 @@ class Database(DotDict):
             return '<Database %s>' % self['name']
         return super(Database, self).__repr__()
 
+    @traced
     def delete(self):
         """Deletes the specified database.
 
@@ -99,7 +99,25 @@ class Flavor(DotDict):
         url = '/'.join([get_url('clouddatabases'), 'flavors'])
         if limit is not None or offset is not None:
             url = query(url, limit=limit, offset=offset)
-        return handle_request('get', url, wrapper=cls, container='flavors')
+        return handle_request('get', url, wrapper=cls, container='flavors',
+                              cache=True)
+
+    @classmethod
+    @traced
+    def iter_all(cls, page_size=100, prefetch=False):
+        """Iterate over every Flavor, fetching a page at a time.
+
+        :param page_size: Number of Flavors to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of CloudDatabases Flavors.
+        :rtype: :class:`Flavor`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, offset: cls.list(limit, offset)
+        return paginate(fetch, page_size, prefetch=prefetch)
 
     @classmethod
     def find(cls, id):
@@ -125,6 +143,17 @@ class Flavor(DotDict):
 
 class Instance(DotDict):
     """A CloudDatabase Instance."""
+    fields = (
+        Field('id'), Field('name'), Field('status'), Field('hostname'),
+        Field('created', convert=convert_datetime, lazy=True),
+        Field('updated', convert=convert_datetime, lazy=True),
+        Field('flavor', convert=Flavor),
+        Field('volume', convert=lambda v: Volume(v)),
+        Nested('databases', Database, many=True, parent='instance_id'),
+        Nested('users', 'User', many=True, parent='instance_id'),
+        Field('links'),
+    )
+
     def __repr__(self):
         if 'name' in self:
             return '<Instance %s>' % self['name']
@@ -149,6 +178,7 @@ class Instance(DotDict):
             value = Volume(value)
         super(Instance, self).__setitem__(key, value)
 
+    @traced
     def reload(self):
         """Reload this CloudDatabases Instance.
 
@@ -162,6 +192,7 @@ class Instance(DotDict):
         self.update(response)
         return self
 
+    @traced
     def delete(self):
         """Delete this CloudDatabases Instance.
 
@@ -181,6 +212,7 @@ class Instance(DotDict):
         handle_request('delete', url)
 
     @property
+    @traced
     def databases(self):
         """Lists databases for the specified instance.
 
@@ -200,6 +232,7 @@ class Instance(DotDict):
             self['databases'] = response
         return self['databases']
 
+    @traced
     def add_databases(self, *databases):
         """Creates a new database within the specified instance.
 
@@ -215,12 +248,13 @@ class Instance(DotDict):
         for database in databases:
             if isinstance(database, Database):
                 data['databases'].append(database.to_dict())
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('clouddatabases'), 'instances', str(self['id']),
                         'databases'])
         handle_request('post', url, data)
 
     @property
+    @traced
     def users(self):
         """Lists the users in the specified database instance.
 
@@ -241,6 +275,7 @@ class Instance(DotDict):
             self['users'] = response
         return self['users']
 
+    @traced
     def add_users(self, *users):
         """Creates a user for the specified database instance.
 
@@ -259,12 +294,13 @@ class Instance(DotDict):
         for user in users:
             if isinstance(user, User):
                 data['users'].append(user.to_dict())
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('clouddatabases'), 'instances', str(self['id']),
                         'users'])
         handle_request('post', url, data)
 
     @property
+    @traced
     def root_enabled(self):
         """
         Returns true if root user is enabled for the specified database
@@ -287,6 +323,7 @@ class Instance(DotDict):
                                                   'rootEnabled')
         return self['root_enabled']
 
+    @traced
     def enable_root(self):
         """Enable root access for this CloudDatabase Instance.
 
@@ -303,6 +340,7 @@ class Instance(DotDict):
                         str(self['id']), 'root'])
         return handle_request('post', url, wrapper=User, container='user')
 
+    @traced
     def restart(self):
         """Restart the database service on the instance.
 
@@ -313,11 +351,12 @@ class Instance(DotDict):
         .. versionadded:: 0.2
         """
         assert 'id' in self
-        data = json.dumps({'restart': {}})
+        data = dumps({'restart': {}})
         url = '/'.join([get_url('clouddatabases'), 'instances',
                         str(self['id']), 'action'])
         handle_request('post', url, dataa)
 
+    @traced
     def resize(self, flavor=None, size=None):
         """Resize the memory and/or volume of the instance.
 
@@ -339,12 +378,13 @@ class Instance(DotDict):
             data['resize']['flavorRef'] = flavor
         if size is not None:
             data['resize']['volume'] = {'size': int(size)}
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('clouddatabases'), 'instances',
                         str(self['id']), 'action'])
         handle_request('post', url, data)
  
     @classmethod
+    @traced
     def list(cls):
         """Returns a list of CloudDatabase instances.
 
@@ -360,6 +400,39 @@ class Instance(DotDict):
         return handle_request('get', url, wrapper=cls, container='instances')
 
     @classmethod
+    def wait_all(cls, instances, status='ACTIVE', timeout=3600.0, interval=5.0,
+                 callback=None):
+        """Wait until every Instance reaches a status.
+
+        Each tick lists every Instance with one request and updates the
+        tracked ones in place, so polling costs the same however many are
+        waited on.
+
+            >>> instances = [Instance.create(...) for i in range(200)]
+            >>> Instance.wait_all(instances, 'ACTIVE')
+
+        :param instances: The Instances to wait on.
+        :type instances: list of :class:`Instance`
+        :param status: The status, or statuses, to wait for.
+        :type status: str or tuple
+        :param timeout: Seconds to wait for each Instance.
+        :type timeout: float
+        :param interval: Seconds between ticks while statuses are changing.
+        :type interval: float
+        :param callback: Called with each :class:`~vaporize.waiters.Handle`
+            as soon as it is done.
+        :type callback: callable
+        :returns: A handle for each Instance, in the same order.
+        :rtype: list of :class:`~vaporize.waiters.Handle`
+
+        .. versionadded:: 0.4
+        """
+        from vaporize import waiters
+        return waiters.wait(instances, status, timeout=timeout,
+                            interval=interval, callback=callback)
+
+    @classmethod
+    @traced
     def find(cls, id):
         """Returns an Instance by ID.
 
@@ -377,6 +450,7 @@ class Instance(DotDict):
         return handle_request('get', url, wrapper=cls, container='instance')
 
     @classmethod
+    @traced
     def create(cls, name, flavor, size, databases, users):
         """Create a CloudDatabases Instance.
 
@@ -417,7 +491,7 @@ class Instance(DotDict):
             for user in users:
                 if isinstance(user, User):
                     data['users'].append(user.to_dict())
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('clouddatabases'), 'instances'])
         return handle_request('post', url, data, cls, 'instance')
 
@@ -429,6 +503,7 @@ class User(DotDict):
             return '<Instance %s>' % self['name']
         return super(Instance, self).__repr__()
 
+    @traced
     def delete(self):
         """
         Deletes the user identified by {name} for the specified database
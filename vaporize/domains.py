@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
 
-import json
-
-from vaporize.core import convert_datetime, get_url, handle_request, query
-from vaporize.utils import DotDict
+from vaporize.core import (convert_datetime, dumps, fetch_all, forget,
+                           get_url, handle_request, lookup, paginate, query,
+                           stream_pages, traced)
+from vaporize.utils import DotDict, Field, Nested, compact_type
 
 
 class Change(DotDict):
@@ -13,6 +13,16 @@ class Change(DotDict):
 
 class Domain(DotDict):
     """A CloudDNS Domain."""
+    fields = (
+        Field('id'), Field('name'), Field('accountId'), Field('ttl'),
+        Field('emailAddress'), Field('comment'),
+        Field('created', convert=convert_datetime, lazy=True),
+        Field('updated', convert=convert_datetime, lazy=True),
+        Nested('recordsList', 'Record', 'records', many=True,
+               container='records', parent='domain_id'),
+        Nested('subdomains', 'Subdomain', many=True, container='domains'),
+    )
+
     def __repr__(self):
         if 'name' in self:
             return '<Domain %s>' % self.name
@@ -31,6 +41,7 @@ class Domain(DotDict):
             value = convert_datetime(value)
         super(Domain, self).__setitem__(key, value)
 
+    @traced
     def reload(self):
         """
         Reload this Domain (an implicit :func:`get`).
@@ -41,10 +52,15 @@ class Domain(DotDict):
         .. versionadded:: 0.1
         """
         assert 'id' in self
-        response = self.find(self['id'], records=True, subdomains=True)
-        self.update(response)
+        url = '/'.join([get_url('clouddns'), 'domains', str(self['id'])])
+        url = query(url, showRecords='true')
+        url = query(url, showSubdomains='true')
+        response = handle_request('get', url, wrapper=type(self))
+        if response is not self:
+            self.update(response)
         return self
 
+    @traced
     def modify(self, ttl=None, email_address=None, comment=None):
         """Modify this Domain's properties.
 
@@ -66,7 +82,7 @@ class Domain(DotDict):
             data['emailAddress'] = email_address
         if comment is not None:
             data['comment'] = comment
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('clouddns'), 'domains', str(self['id'])])
         handle_request('put', url, data)
         if ttl is not None:
@@ -77,6 +93,7 @@ class Domain(DotDict):
             self['comment'] = comment
         return self
 
+    @traced
     def delete(self, subdomains=False):
         """Delete this Domain.
 
@@ -95,27 +112,113 @@ class Domain(DotDict):
         url = '/'.join([get_url('clouddns'), 'domains', str(self['id'])])
         url = query(url, deleteSubdomains=subdomains)
         handle_request('delete', url)
+        forget(self)
 
     @property
+    @traced
     def records(self):
         """Returns a list of CloudDNS Records.
 
+        Every page of Records is fetched the first time, see
+        :func:`fetch_records`.
+
         :returns: A list of Records.
         :rtype: A list of :class:`Record`
 
         .. versionadded:: 0.1
         """
         if 'records' not in self:
-            assert 'id' in self
-            url = '/'.join([get_url('clouddns'), 'domains', str(self['id']),
-                            'records'])
-            response = handle_request('get', url,
-                                      wrapper=Record,
-                                      container='records',
-                                      domain_id=self['id'])
-            self['records'] = response
+            self.fetch_records()
+        return self['records']
+
+    @traced
+    def fetch_records(self, page_size=100, workers=4, compact=False):
+        """Fetch every Record of this Domain, requesting pages concurrently.
+
+        The Records are also stored as this Domain's :attr:`records`.
+
+        :param page_size: Number of Records to request per page
+        :type page_size: int
+        :param workers: Maximum number of pages requested at once
+        :type workers: int
+        :param compact: Return compact Records (see
+            :func:`vaporize.utils.compact_type`)
+        :type compact: bool
+        :returns: A list of Records.
+        :rtype: A list of :class:`Record`
+
+        .. versionadded:: 0.4
+        """
+        assert 'id' in self
+        url = '/'.join([get_url('clouddns'), 'domains', str(self['id']),
+                        'records'])
+        wrapper = compact_type(Record) if compact else Record
+        self['records'] = fetch_all(url, 'records', wrapper, page_size,
+                                    workers, domain_id=self['id'])
         return self['records']
 
+    @traced
+    def iter_records(self, page_size=100, prefetch=False, compact=False):
+        """Iterate over every Record of this Domain, a page at a time.
+
+        Unlike :attr:`records` the result is not cached on the Domain.
+
+        :param page_size: Number of Records to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :param compact: Return compact Records (see
+            :func:`vaporize.utils.compact_type`)
+        :type compact: bool
+        :returns: A generator of Records.
+        :rtype: :class:`Record`
+
+        .. versionadded:: 0.4
+        """
+        assert 'id' in self
+        url = '/'.join([get_url('clouddns'), 'domains', str(self['id']),
+                        'records'])
+
+        wrapper = compact_type(Record) if compact else Record
+
+        def fetch(limit, offset):
+            return handle_request('get', query(url, limit=limit, offset=offset),
+                                  wrapper=wrapper, container='records',
+                                  domain_id=self['id'])
+        return paginate(fetch, page_size, prefetch=prefetch)
+
+    @traced
+    def stream_records(self, compact=False, page_size=100):
+        """Iterate over every Record of this Domain as the responses arrive.
+
+        The Records are requested a page at a time, and each is decoded as
+        soon as it is read from the connection instead of after the whole
+        page, so that zones with many Records are not held in memory twice.
+        The result is not cached on the Domain.
+
+        :param compact: Return compact Records (see
+            :func:`vaporize.utils.compact_type`)
+        :type compact: bool
+        :param page_size: Number of Records to request per page (at most
+            100)
+        :type page_size: int
+        :returns: A generator of Records.
+        :rtype: :class:`Record`
+
+        .. versionadded:: 0.4
+        """
+        assert 'id' in self
+        url = '/'.join([get_url('clouddns'), 'domains', str(self['id']),
+                        'records'])
+        wrapper = compact_type(Record) if compact else Record
+
+        def fetch(limit, offset):
+            return handle_request('get', query(url, limit=limit, offset=offset),
+                                  wrapper=wrapper, container='records',
+                                  stream=True, domain_id=self['id'])
+        return stream_pages(fetch, page_size)
+
+    @traced
     def add_records(self, *records):
         """Add Records to a Domain.
 
@@ -143,13 +246,14 @@ class Domain(DotDict):
                     'priority': record.priority,
                     'comment': record.comment
                     })
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('clouddns'), 'domains', str(self['id']),
                         'records'])
         self['records'] = handle_request('post', url, data, Record, 'records',
                                           domain_id=self['id'])
         return self['records']
 
+    @traced
     def remove_record(self, record):
         """Remove a Record from this Domain.
 
@@ -165,6 +269,7 @@ class Domain(DotDict):
         handle_request('delete', url)
 
     @property
+    @traced
     def subdomains(self):
         """Returns a list of Subdomains.
 
@@ -183,6 +288,7 @@ class Domain(DotDict):
             self['subdomains'] = response
         return self['subdomains']
 
+    @traced
     def changes(self, since):
         """Returns a list of CloudDNS changes for this domain.
 
@@ -200,6 +306,7 @@ class Domain(DotDict):
         return handle_request('get', url, wrapper=Change, container='changes')
 
     @property
+    @traced
     def export_zone(self):
         """Export the raw BIND zone for this Domain.
 
@@ -212,6 +319,7 @@ class Domain(DotDict):
         return handle_request('get', url, wrapper=Export)
 
     @classmethod
+    @traced
     def list(cls, limit=None, offset=None, filter=None):
         """List of Domains.
 
@@ -235,6 +343,51 @@ class Domain(DotDict):
         return handle_request('get', url, wrapper=cls, container='domains')
 
     @classmethod
+    @traced
+    def iter_all(cls, filter=None, page_size=100, prefetch=False):
+        """Iterate over every Domain, fetching a page at a time.
+
+        :param filter: Filter results by a domain name
+        :type filter: str
+        :param page_size: Number of Domains to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of Domains.
+        :rtype: :class:`Domain`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, offset: cls.list(limit, offset, filter)
+        return paginate(fetch, page_size, prefetch=prefetch)
+
+    @classmethod
+    @traced
+    def list_all(cls, filter=None, page_size=100, workers=4, compact=False):
+        """List every Domain, requesting pages concurrently.
+
+        :param filter: Filter results by a domain name
+        :type filter: str
+        :param page_size: Number of Domains to request per page
+        :type page_size: int
+        :param workers: Maximum number of pages requested at once
+        :type workers: int
+        :param compact: Return compact Domains (see
+            :func:`vaporize.utils.compact_type`)
+        :type compact: bool
+        :returns: A list of Domains
+        :rtype: A list of :class:`Domain`
+
+        .. versionadded:: 0.4
+        """
+        url = '/'.join([get_url('clouddns'), 'domains'])
+        if filter is not None:
+            url = query(url, name=filter)
+        wrapper = compact_type(cls) if compact else cls
+        return fetch_all(url, 'domains', wrapper, page_size, workers)
+
+    @classmethod
+    @traced
     def find(cls, id, records=False, subdomains=False):
         """Retrieve a Domain using an ID.
 
@@ -246,7 +399,16 @@ class Domain(DotDict):
         :rtype: :class:`Domain`
 
         .. versionadded:: 0.1
+
+        .. versionchanged:: 0.4
+            Returns the Domain already loaded, if the Client keeps an
+            :class:`~vaporize.core.IdentityMap` and it has the Records and
+            Subdomains asked for.
         """
+        domain = lookup(cls, id)
+        if (domain is not None and (not records or 'records' in domain) and
+                (not subdomains or 'subdomains' in domain)):
+            return domain
         url = '/'.join([get_url('clouddns'), 'domains', str(id)])
         if records is True:
             url = query(url, showRecords='true')
@@ -255,6 +417,7 @@ class Domain(DotDict):
         return handle_request('get', url, wrapper=cls)
 
     @classmethod
+    @traced
     def create(cls, name, ttl=300, records=None, subdomains=None, comment=None,
                email_address=None):
         """Create a CloudDNS Domain.
@@ -319,11 +482,12 @@ class Domain(DotDict):
             data['domains'][0]['comment'] = comment
         if email_address is not None:
             data['domains'][0]['email_address'] = email_address
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('clouddns'), 'domains'])
         return handle_request('post', url, data, cls, 'domains')
 
     @classmethod
+    @traced
     def import_zone(cls, contents, type='BIND_9'):
         """Import a raw BIND zone into CloudDNS.
 
@@ -337,9 +501,9 @@ class Domain(DotDict):
         """
         data = {'domains': [{'contentType': type,
                              'contents': contents}]}
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('clouddns'), 'import'])
-        return handle_request('post', url, data, cls, 'domains')
+        return handle_request('post', url, data, cls, 'domains', compress=True)
 
 
 class Export(DotDict):
@@ -357,6 +521,14 @@ class Nameserver(DotDict):
 
 class Record(DotDict):
     """A CloudDNS Record."""
+    fields = (
+        Field('id'), Field('name'), Field('type'), Field('data'),
+        Field('ttl'), Field('priority'), Field('comment'),
+        Field('created', convert=convert_datetime, lazy=True),
+        Field('updated', convert=convert_datetime, lazy=True),
+        Field('domain_id'),
+    )
+
     def __repr__(self):
         if 'name' in self:
             return '<Record %s>' % self['name']
@@ -400,6 +572,7 @@ class Record(DotDict):
         return cls(name=name, type=type, data=data, ttl=ttl, priority=priority,
                    comment=comment)
 
+    @traced
     def reload(self):
         """Reload a Record.
 
@@ -416,6 +589,7 @@ class Record(DotDict):
         self.update(response)
         return self
 
+    @traced
     def modify(self, name=None, data=None, ttl=None):
         """Modify this Record's properties.
 
@@ -439,7 +613,7 @@ class Record(DotDict):
             _data['data'] = data
         if ttl is not None:
             _data['ttl'] = int(ttl)
-        _data = json.dumps(_data)
+        _data = dumps(_data)
         url = '/'.join([get_url('clouddns'), 'domains', str(self['domain_id']),
                         'records', str(self['id'])])
         handle_request('put', url, _data)
@@ -451,6 +625,7 @@ class Record(DotDict):
             self['ttl'] = int(ttl)
         return self
 
+    @traced
     def delete(self, subdomains=False):
         """Delete this Record.
 
@@ -46,6 +46,21 @@ class UnknownError(Exception):
     pass
 
 
+class WaitError(Exception):
+    """A resource reached a failure status while being waited on."""
+    pass
+
+
+class WaitTimeout(WaitError):
+    """A resource did not reach its status in time."""
+    pass
+
+
+class CassetteError(Exception):
+    """A replayed request has no recorded response left."""
+    pass
+
+
 def handle_exception(code, msg):
     if code == 400:
         raise BadRequest(msg)
@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
 
 import datetime
-import json
 
-from vaporize.core import convert_datetime, get_url, handle_request, query
-from vaporize.utils import DotDict
+from vaporize.core import (convert_datetime, dumps, forget, get_url,
+                           handle_request, lookup, paginate, query, traced)
+from vaporize.utils import DotDict, Field, Nested
+
+
+def convert_time(value):
+    """Convert a ``{'time': ...}`` timestamp to a datetime."""
+    if not isinstance(value, datetime.datetime) and 'time' in value:
+        return convert_datetime(value['time'])
+    return value
 
 
 class AccessRule(DotDict):
@@ -18,6 +25,11 @@ class AccessRule(DotDict):
     items except for those with the ALLOW type, add a networkItem with an
     address of "0.0.0.0/0" and a DENY type.
     """
+    fields = (
+        Field('id'), Field('address'), Field('type'),
+        Field('loadbalancer_id'),
+    )
+
     def __repr__(self):
         if 'type' in self and 'address' in self:
             return '<AccessRule %s %s>' % (self['type'], self['address'])
@@ -38,6 +50,7 @@ class AccessRule(DotDict):
         """
         return cls(type=type, address=address)
 
+    @traced
     def delete(self):
         """Delete this Access Rule.
 
@@ -93,7 +106,24 @@ class Algorithm(DotDict):
         if limit is not None or offset is not None or marker is not None:
             url = query(url, limit=limit, offset=offset, marker=marker)
         return handle_request('get', url, wrapper=cls,
-                              container='algorithms')
+                              container='algorithms', cache=True)
+
+    @classmethod
+    @traced
+    def iter_all(cls, page_size=100, prefetch=False):
+        """Iterate over every Algorithm, fetching a page at a time.
+
+        :param page_size: Number of Algorithms to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of supported CloudLoadBalancer algorithms.
+        :rtype: :class:`Algorithm`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, offset: cls.list(limit, offset)
+        return paginate(fetch, page_size, prefetch=prefetch)
 
 
 class AllowedDomain(DotDict):
@@ -135,7 +165,24 @@ class AllowedDomain(DotDict):
         if limit is not None or offset is not None or marker is not None:
             url = query(url, limit=limit, offset=offset, marker=marker)
         return handle_request('get', url, wrapper=cls,
-                              container='allowedDomains')
+                              container='allowedDomains', cache=True)
+
+    @classmethod
+    @traced
+    def iter_all(cls, page_size=100, prefetch=False):
+        """Iterate over every allowed domain, fetching a page at a time.
+
+        :param page_size: Number of allowed domains to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of CloudLoadBalancer allowed domains.
+        :rtype: :class:`AllowedDomain`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, offset: cls.list(limit, offset)
+        return paginate(fetch, page_size, prefetch=prefetch)
 
 
 class ContentCaching(DotDict):
@@ -275,6 +322,22 @@ class HealthMonitor(DotDict):
 
 class LoadBalancer(DotDict):
     """A CloudLoadBalancer Load Balancer."""
+    fields = (
+        Field('id'), Field('name'), Field('protocol'), Field('port'),
+        Field('algorithm'), Field('status'), Field('nodeCount'),
+        Field('created', convert=convert_time, lazy=True),
+        Field('updated', convert=convert_time, lazy=True),
+        Field('connectionLogging', convert=ConnectionLogging),
+        Field('connectionThrottle', convert=ConnectionThrottle),
+        Field('contentCaching', convert=ContentCaching),
+        Field('errorpage', convert=ErrorPage),
+        Field('healthMonitor', convert=HealthMonitor),
+        Field('sessionPersistence', convert=lambda v: SessionPersistence(v)),
+        Nested('accessList', AccessRule, many=True, parent='loadbalancer_id'),
+        Nested('nodes', 'Node', many=True, parent='loadbalancer_id'),
+        Nested('virtualIps', 'VirtualIP', many=True, parent='loadbalancer_id'),
+    )
+
     def __repr__(self):
         if 'name' in self:
             return '<LoadBalancer %s>' % self['name']
@@ -309,20 +372,25 @@ class LoadBalancer(DotDict):
             else:
                 value = [VirtualIP(v) for v in value]
         elif key in ['created', 'updated']:
-            if not isinstance(value, datetime.datetime) and 'time' in value:
-                    value = convert_datetime(value['time'])
+            value = convert_time(value)
         super(LoadBalancer, self).__setitem__(key, value)
 
+    @traced
     def reload(self):
         """Reload this Load Balancer (an implicit :func:`get`).
 
         .. versionadded:: 0.1
         """
         assert 'id' in self
-        response = LoadBalancer.find(self['id'])
-        self.update(response)
+        url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
+                        str(self['id'])])
+        response = handle_request('get', url, wrapper=LoadBalancer,
+                                  container='loadBalancer')
+        if response is not self:
+            self.update(response)
         return self
 
+    @traced
     def modify(self, name=None, protocol=None, port=None, algorithm=None,
                connection_logging=None):
         """Modify this Load Balancer's properties.
@@ -373,7 +441,7 @@ class LoadBalancer(DotDict):
         if connection_logging is not None:
             connection_logging = bool(connection_logging)
             data['loadBalancer']['connectionLogging'] = connection_logging
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
                         str(self['id'])])
         handle_request('put', url, data)
@@ -389,6 +457,7 @@ class LoadBalancer(DotDict):
             self['connectionLogging']['enabled'] = bool(connection_logging)
         return self
 
+    @traced
     def delete(self):
         """Delete this Load Balancer.
 
@@ -407,8 +476,10 @@ class LoadBalancer(DotDict):
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
                         str(self['id'])])
         handle_request('delete', url)
+        forget(self)
 
     @property
+    @traced
     def nodes(self):
         """Returns a list of Nodes for this Load Balancer.
 
@@ -426,6 +497,7 @@ class LoadBalancer(DotDict):
                                            loadbalancer_id=self['id'])
         return self['nodes']
 
+    @traced
     def add_nodes(self, *nodes):
         """Add Nodes to this Load Balancer.
 
@@ -452,13 +524,14 @@ class LoadBalancer(DotDict):
                     'type': node.type,
                     'weight': node.weight
                     })
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
                         str(self['id']), 'nodes'])
         self['nodes'] = handle_request('post', url, data, Node, 'nodes',
                                        loadbalancer_id=self['id'])
         return self['nodes']
 
+    @traced
     def remove_node(self, node):
         """Remove a Node from this Load Balancer.
 
@@ -474,6 +547,7 @@ class LoadBalancer(DotDict):
         handle_request('delete', url)
 
     @property
+    @traced
     def virtual_ips(self):
         """Returns a list of VirtualIPs for this Load Balancer.
 
@@ -492,6 +566,7 @@ class LoadBalancer(DotDict):
             self['virtual_ips'] = response
         return self['virtual_ips']
 
+    @traced
     def add_virtual_ips(self, *virtual_ips):
         """Add Virtual IPs to this Load Balancer.
 
@@ -515,7 +590,7 @@ class LoadBalancer(DotDict):
                     'ipVersion': virtual_ip.version,
                     'type': virtual_ip.type
                     })
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
                         str(self['id']), 'virtualips'])
         self['virtual_ips'] = handle_request('post', url, data, VirtualIP,
@@ -523,6 +598,7 @@ class LoadBalancer(DotDict):
                                              loadbalancer_id=self['id'])
         return self['virtual_ips']
 
+    @traced
     def remove_virtual_ip(self, virtual_ip):
         """Remove a VirtualIP from this Load Balancer.
 
@@ -540,6 +616,7 @@ class LoadBalancer(DotDict):
         handle_request('delete', url)
 
     @property
+    @traced
     def access_list(self):
         """Returns a list of AccessRules for this Load Balancer.
 
@@ -557,6 +634,7 @@ class LoadBalancer(DotDict):
                                                  loadbalancer_id=self['id'])
         return self['access_list']
 
+    @traced
     def add_access_rules(self, *access_rules):
         """Add AccessRules to this Load Balancer.
 
@@ -580,7 +658,7 @@ class LoadBalancer(DotDict):
                     'type': access_rule.type,
                     'address': access_rule.address
                     })
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
                         str(self['id']), 'accesslist'])
         self['access_list'] = handle_request('post', url, data, AccessRule,
@@ -588,6 +666,7 @@ class LoadBalancer(DotDict):
                                              loadbalancer_id=self['id'])
         return self['access_list']
 
+    @traced
     def remove_access_rule(self, access_rule):
         """Remove an AccessRule from this Load Balancer.
 
@@ -605,6 +684,7 @@ class LoadBalancer(DotDict):
         handle_request('delete', url)
 
     @property
+    @traced
     def connection_logging(self):
         """Returns the ConnectionLogging setting for this Load Balancer.
 
@@ -629,6 +709,7 @@ class LoadBalancer(DotDict):
         return self['connection_logging']
 
     @connection_logging.setter
+    @traced
     def connection_logging(self, enabled):
         """Enable/disable Connection Logging for this Load Balancer.
 
@@ -648,13 +729,14 @@ class LoadBalancer(DotDict):
         .. versionadded:: 0.1
         """
         assert 'id' in self
-        data = json.dumps({'connectionLogging': {'enabled': bool(enabled)}})
+        data = dumps({'connectionLogging': {'enabled': bool(enabled)}})
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
                         str(self['id']), 'connectionlogging'])
         handle_request('put', url, data)
         self['connection_logging']['enabled'] = True
 
     @property
+    @traced
     def content_caching(self):
         """Returns the Connection Caching setting for this Load Balancer.
 
@@ -673,6 +755,7 @@ class LoadBalancer(DotDict):
         return self['content_caching']
 
     @content_caching.setter
+    @traced
     def content_caching(self, enabled):
         """Enable/disable Content Caching for this Load Balancer.
 
@@ -700,13 +783,14 @@ class LoadBalancer(DotDict):
         .. versionadded:: 0.1
         """
         assert 'id' in self
-        data = json.dumps({'contentCaching': {'enabled': bool(enabled)}})
+        data = dumps({'contentCaching': {'enabled': bool(enabled)}})
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
                         str(self['id']), 'contentCaching'])
         handle_request('put', url, data)
         self['content_caching']['enabled'] = bool(enabled)
 
     @property
+    @traced
     def connection_throttle(self):
         """Return the Connection Throttle setting for this Load Balancer.
 
@@ -725,6 +809,7 @@ class LoadBalancer(DotDict):
         return self['connection_throttle']
 
     @connection_throttle.setter
+    @traced
     def connection_throttle(self, connection_throttle):
         """Enable Connection Throttle setting for this Load Balancer.
 
@@ -749,7 +834,7 @@ class LoadBalancer(DotDict):
             'maxConnectionRate': connection_throttle.max_connection_rate,
             'rateInterval': connection_throttle.rate_interval
             }}
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
                         str(self['id']), 'connectionthrottle'])
         handle_request('put', url, data)
@@ -757,6 +842,7 @@ class LoadBalancer(DotDict):
         return self['connection_throttle']
 
     @connection_throttle.deleter
+    @traced
     def connection_throttle(self):
         """Disable Connection Throttle for this Load Balancer.
 
@@ -774,6 +860,7 @@ class LoadBalancer(DotDict):
         del self['connection_throttle']
 
     @property
+    @traced
     def health_monitor(self):
         """Returns the Health Monitor setting for this Load Balancer.
 
@@ -792,6 +879,7 @@ class LoadBalancer(DotDict):
         return self['health_monitor']
 
     @health_monitor.setter
+    @traced
     def health_monitor(self, health_monitor):
         """Enable Health Monitor for this Load Balancer.
 
@@ -814,7 +902,7 @@ class LoadBalancer(DotDict):
             'timeout': health_monitor.timeout,
             'attemptsBeforeDeactivation': health_monitor.attempts_before_deactivation
             }}
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
                         str(self['id']), 'healthmonitor'])
         response = handle_request('put', url, data, HealthMonitor,
@@ -822,6 +910,7 @@ class LoadBalancer(DotDict):
         self['health_monitor'] = response
 
     @health_monitor.deleter
+    @traced
     def health_monitor(self):
         """Disable Health Monitor for this Load Balancer.
 
@@ -839,6 +928,7 @@ class LoadBalancer(DotDict):
         del self['health_monitor']
 
     @property
+    @traced
     def session_persistence(self):
         """Return Session Persistence setting for this Load Balancer.
 
@@ -857,6 +947,7 @@ class LoadBalancer(DotDict):
         return self['session_persistence']
 
     @session_persistence.setter
+    @traced
     def session_persistence(self, persistence_type):
         """Enable Session Persistence for this Load Balancer.
 
@@ -868,7 +959,7 @@ class LoadBalancer(DotDict):
         """
         assert 'id' in self
         assert persistence_type in ['HTTP_COOKIE', 'SOURCE_IP']
-        data = json.dumps({'sessionPersistence': {
+        data = dumps({'sessionPersistence': {
             'persistenceType': persistence_type
             }})
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
@@ -879,6 +970,7 @@ class LoadBalancer(DotDict):
                 )
 
     @session_persistence.deleter
+    @traced
     def session_persistence(self):
         """Disable Session Persistance for this Load Balancer.
 
@@ -891,6 +983,7 @@ class LoadBalancer(DotDict):
         del self['session_persistence']
 
     @property
+    @traced
     def error_page(self):
         """Returns the Error Page for this Load Balancer.
 
@@ -914,6 +1007,7 @@ class LoadBalancer(DotDict):
         return self['error_page']
 
     @error_page.setter
+    @traced
     def error_page(self, content):
         """Set a Custom Error Page for this Load Balancer.
 
@@ -929,13 +1023,14 @@ class LoadBalancer(DotDict):
         .. versionadded:: 0.1
         """
         assert 'id' in self
-        data = json.dumps({'errorpage': {'content': content}})
+        data = dumps({'errorpage': {'content': content}})
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
                         str(self['id']), 'errorpage'])
         handle_request('put', url, data)
         self['error_page'] = ErrorPage(content=content)
 
     @error_page.deleter
+    @traced
     def error_page(self):
         """Reset the Error Page for this Load Balancer.
 
@@ -948,6 +1043,7 @@ class LoadBalancer(DotDict):
         del self['error_page']
 
     @property
+    @traced
     def stats(self):
         """Returns stats for this Load Balancer.
 
@@ -978,6 +1074,7 @@ class LoadBalancer(DotDict):
                         str(self['id']), 'stats'])
         return handle_request('get', url, wrapper=Stat)
 
+    @traced
     def usage(self, start_time=None, end_time=None):
         """Returns Usage Report for this Load Balancer.
 
@@ -1002,6 +1099,7 @@ class LoadBalancer(DotDict):
                               container='loadBalancerUsage')
 
     @classmethod
+    @traced
     def list(cls, limit=None, offset=None, marker=None, node=None,
              deleted=False):
         """Returns a list of Load Balancers.
@@ -1025,6 +1123,29 @@ class LoadBalancer(DotDict):
                               container='loadBalancers')
 
     @classmethod
+    @traced
+    def iter_all(cls, node=None, deleted=False, page_size=100, prefetch=False):
+        """Iterate over every Load Balancer, fetching a page at a time.
+
+        :param node: Only Load Balancers with a Node at this address
+        :type node: str
+        :param deleted: Only deleted Load Balancers
+        :type deleted: bool
+        :param page_size: Number of Load Balancers to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of CloudLoadBalancer Load Balancers.
+        :rtype: :class:`LoadBalancer`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, marker: cls.list(limit, None, marker, node,
+                                               deleted)
+        return paginate(fetch, page_size, marker=True, prefetch=prefetch)
+
+    @classmethod
+    @traced
     def find(cls, id):
         """Return a Load Balancer by ID.
 
@@ -1034,12 +1155,20 @@ class LoadBalancer(DotDict):
         :rtype: :class:`LoadBalancer`
 
         .. versionadded:: 0.1
+
+        .. versionchanged:: 0.4
+            Returns the Load Balancer already loaded, if the Client keeps an
+            :class:`~vaporize.core.IdentityMap`.
         """
+        lb = lookup(cls, id)
+        if lb is not None:
+            return lb
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers', str(id)])
         return handle_request('get', url, wrapper=cls,
                               container='loadBalancer')
 
     @classmethod
+    @traced
     def create(cls, name, protocol, virtual_ips, nodes, port=None, algorithm=None,
                access_list=None, connection_logging=None, connection_throttle=None,
                health_monitor=None, session_persistence=None, metadata=None):
@@ -1164,7 +1293,7 @@ class LoadBalancer(DotDict):
             data['loadBalancer']['sessionPersistence'] = {
                     'persistenceType': session_persistence
                     }
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers'])
         return handle_request('post', url, data, wrapper=cls,
                               container='loadBalancer')
@@ -1208,6 +1337,12 @@ class Node(DotDict):
 
     `Node Reference <http://docs.rackspace.com/loadbalancers/api/v1.0/clb-devguide/content/Nodes-d1e2173.html>`_
     """
+    fields = (
+        Field('id'), Field('address'), Field('port'), Field('condition'),
+        Field('status'), Field('type'), Field('weight'),
+        Field('loadbalancer_id'),
+    )
+
     def __repr__(self):
         if 'address' in self:
             return '<Node %s>' % self['address']
@@ -1259,6 +1394,7 @@ class Node(DotDict):
         return cls(address=address, port=int(port), condition=condition,
                    type=type, weight=int(weight))
 
+    @traced
     def reload(self):
         """Reload this Node.
 
@@ -1277,6 +1413,7 @@ class Node(DotDict):
         self.update(response)
         return self
 
+    @traced
     def modify(self, condition=None, type=None, weight=None):
         """Modify a Node's properties.
 
@@ -1302,7 +1439,7 @@ class Node(DotDict):
             data['node']['type'] = type
         if weight is not None:
             data['node']['weight'] = int(weight)
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudloadbalancers'), 'loadbalancers',
                         str(self['loadbalancer_id']), 'nodes',
                         str(self['id'])])
@@ -1316,6 +1453,7 @@ class Node(DotDict):
             self['weight'] = weight
         return self
 
+    @traced
     def delete(self):
         """Delete this Node.
 
@@ -1368,7 +1506,25 @@ class Protocol(DotDict):
         url = '/'.join(url)
         if limit is not None or offset is not None or marker is not None:
             url = query(url, limit=limit, offset=offset, marker=marker)
-        return handle_request('get', url, wrapper=cls, container='protocols')
+        return handle_request('get', url, wrapper=cls, container='protocols',
+                              cache=True)
+
+    @classmethod
+    @traced
+    def iter_all(cls, page_size=100, prefetch=False):
+        """Iterate over every Protocol, fetching a page at a time.
+
+        :param page_size: Number of Protocols to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of supported CloudLoadBalancer protocols.
+        :rtype: :class:`Protocol`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, offset: cls.list(limit, offset)
+        return paginate(fetch, page_size, prefetch=prefetch)
 
 
 class SessionPersistence(DotDict):
@@ -1422,6 +1578,11 @@ class VirtualIP(DotDict):
     Internet, or a ServiceNet address, routable only within the region in which
     the load balancer resides. 
     """
+    fields = (
+        Field('id'), Field('address'), Field('type'), Field('ipVersion', 'version'),
+        Field('loadbalancer_id'),
+    )
+
     def __repr__(self):
         if 'address' in self:
             return '<VirtualIP %s>' % self['address']
@@ -1447,6 +1608,7 @@ class VirtualIP(DotDict):
         """
         return cls(version=version, type=type)
 
+    @traced
     def delete(self):
         """Delete this Virtual IP.
 
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""Measure the requests Vaporize makes to the Rackspace Cloud API.
+
+    >>> from vaporize import metrics
+    >>> collector = metrics.Metrics().install()
+    >>> servers = NextGenServer.list(detail=True)
+    >>> collector.stats()['cloudserversopenstack GET servers/detail']['count']
+    1
+    >>> print(collector.prometheus())
+
+Requests are grouped by service, HTTP verb and endpoint, where the endpoint
+is the path below the service's URL with IDs replaced by ``{id}``, such as
+``loadbalancers/{id}/nodes``. For each group a :class:`Metrics` collector
+keeps a latency histogram, the status codes received, the number of
+retries and errors, and the bytes sent and received.
+"""
+
+import threading
+
+from vaporize.core import Observer, add_observer, remove_observer
+
+# Upper bounds in seconds of the latency histogram buckets.
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Endpoint(object):
+    """Measurements for one service, verb and endpoint."""
+    def __init__(self, buckets):
+        self.buckets = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.statuses = {}
+        self.errors = {}
+        self.retries = 0
+        self.sent = 0
+        self.received = 0
+
+    def observe(self, bounds, elapsed):
+        self.count += 1
+        self.total += elapsed
+        for index, bound in enumerate(bounds):
+            if elapsed <= bound:
+                self.buckets[index] += 1
+
+    def to_dict(self, bounds):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'buckets': dict(zip(bounds, self.buckets)),
+            'statuses': dict(self.statuses),
+            'errors': dict(self.errors),
+            'retries': self.retries,
+            'sent': self.sent,
+            'received': self.received,
+            }
+
+
+class Metrics(Observer):
+    """Collects request metrics per service, verb and endpoint.
+
+    :param buckets: Upper bounds in seconds of the latency histogram
+        buckets.
+    :type buckets: tuple
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def install(self):
+        """Start collecting metrics. Returns the Metrics."""
+        add_observer(self)
+        return self
+
+    def uninstall(self):
+        """Stop collecting metrics."""
+        remove_observer(self)
+
+    def get(self, request):
+        key = (request.service or 'unknown', request.verb.upper(),
+               request.endpoint)
+        endpoint = self._endpoints.get(key)
+        if endpoint is None:
+            endpoint = self._endpoints.setdefault(key, Endpoint(self.bounds))
+        return endpoint
+
+    def before_request(self, request):
+        with self._lock:
+            endpoint = self.get(request)
+            if request.attempt:
+                endpoint.retries += 1
+            if request.data:
+                endpoint.sent += len(request.data)
+
+    def after_response(self, request, response):
+        status = response.status_code
+        with self._lock:
+            endpoint = self.get(request)
+            endpoint.observe(self.bounds, request.elapsed)
+            endpoint.statuses[status] = endpoint.statuses.get(status, 0) + 1
+            if request.stream:
+                # Don't read a streamed body before the caller does.
+                received = int(response.headers.get('Content-Length') or 0)
+            else:
+                received = len(response.content or b'')
+            endpoint.received += received
+
+    def on_error(self, request, exception):
+        name = type(exception).__name__
+        with self._lock:
+            endpoint = self.get(request)
+            endpoint.observe(self.bounds, request.elapsed)
+            endpoint.errors[name] = endpoint.errors.get(name, 0) + 1
+
+    def reset(self):
+        """Forget everything collected so far."""
+        with self._lock:
+            self._endpoints.clear()
+
+    def stats(self):
+        """Returns the metrics collected so far.
+
+        Each key is ``'<service> <VERB> <endpoint>'``, and each value has the
+        number of responses and errors (``count``), their total seconds
+        (``sum``), the cumulative count per latency bucket (``buckets``),
+        counts per status code (``statuses``) and exception name
+        (``errors``), the number of ``retries`` and the bytes ``sent`` and
+        ``received``.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(('%s %s %s' % key, endpoint.to_dict(self.bounds))
+                        for key, endpoint in self._endpoints.items())
+
+    def prometheus(self):
+        """Returns the metrics collected so far in the Prometheus text
+        exposition format.
+
+        :rtype: str
+        """
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = [
+                '# HELP vaporize_request_duration_seconds Rackspace Cloud API '
+                'request latency.',
+                '# TYPE vaporize_request_duration_seconds histogram',
+                ]
+            for key, endpoint in endpoints:
+                for bound, count in zip(self.bounds, endpoint.buckets):
+                    lines.append('vaporize_request_duration_seconds_bucket'
+                                 '{%s,le="%r"} %d' % (labels(key), bound,
+                                                      count))
+                lines.append('vaporize_request_duration_seconds_bucket'
+                             '{%s,le="+Inf"} %d' % (labels(key),
+                                                    endpoint.count))
+                lines.append('vaporize_request_duration_seconds_sum{%s} %r' %
+                             (labels(key), endpoint.total))
+                lines.append('vaporize_request_duration_seconds_count{%s} %d' %
+                             (labels(key), endpoint.count))
+            lines.extend([
+                '# HELP vaporize_responses_total Responses by status code.',
+                '# TYPE vaporize_responses_total counter',
+                ])
+            for key, endpoint in endpoints:
+                for status, count in sorted(endpoint.statuses.items()):
+                    lines.append('vaporize_responses_total'
+                                 '{%s,status="%d"} %d' % (labels(key), status,
+                                                          count))
+            lines.extend([
+                '# HELP vaporize_errors_total Requests that received no '
+                'response.',
+                '# TYPE vaporize_errors_total counter',
+                ])
+            for key, endpoint in endpoints:
+                for name, count in sorted(endpoint.errors.items()):
+                    lines.append('vaporize_errors_total{%s,error="%s"} %d' %
+                                 (labels(key), escape(name), count))
+            for name, attr, description in [
+                    ('retries', 'retries', 'Requests retried.'),
+                    ('sent_bytes', 'sent', 'Request body bytes sent.'),
+                    ('received_bytes', 'received',
+                     'Response body bytes received.')]:
+                lines.append('# HELP vaporize_%s_total %s' % (name,
+                                                               description))
+                lines.append('# TYPE vaporize_%s_total counter' % name)
+                for key, endpoint in endpoints:
+                    lines.append('vaporize_%s_total{%s} %d' % (
+                        name, labels(key), getattr(endpoint, attr)))
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    """Escape a Prometheus label value."""
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def labels(key):
+    service, verb, endpoint = key
+    return 'service="%s",method="%s",endpoint="%s"' % (
+        escape(service), escape(verb), escape(endpoint))
@@ -1,19 +1,24 @@
 # -*- coding: utf-8 -*-
 
-import json
-
-from vaporize.core import convert_datetime, get_url, handle_request, query
-from vaporize.utils import DotDict
+from vaporize.core import (catalog_cache, convert_datetime, dumps, forget,
+                           get_url, handle_request, lookup, paginate, query,
+                           traced)
+from vaporize.utils import DotDict, Field
 
 class NextGenFlavor(DotDict):
     """A CloudNextGenServers NextGenFlavor."""
+    fields = (
+        Field('id'), Field('name'), Field('ram'), Field('disk'),
+        Field('vcpus'), Field('swap'), Field('rxtx_factor'), Field('links'),
+    )
+
     def __repr__(self):
         if 'name' in self:
             return '<NextGenFlavor %s>' % self['name']
         return super(NextGenFlavor, self).__repr__()
 
     @classmethod
-    def list(cls, limit=None, offset=None, detail=False):
+    def list(cls, limit=None, offset=None, detail=False, marker=None):
         """Returns a list of NextGenFlavors.
 
         :param limit: Limit the result set by a number
@@ -22,6 +27,8 @@ class NextGenFlavor(DotDict):
         :type offset: int
         :param detail: Return additional details about each NextGenFlavor
         :type: bool
+        :param marker: Start after the NextGenFlavor with this ID
+        :type marker: str
         :returns: A list of CloudNextGenServers NextGenFlavors.
         :rtype: :class:`NextGenFlavor`
 
@@ -31,9 +38,30 @@ class NextGenFlavor(DotDict):
         if detail:
             url.append('detail')
         url = '/'.join(url)
-        if limit is not None or offset is not None:
-            url = query(url, limit=limit, offset=offset)
-        return handle_request('get', url, wrapper=cls, container='flavors')
+        if limit is not None or offset is not None or marker is not None:
+            url = query(url, limit=limit, offset=offset, marker=marker)
+        return handle_request('get', url, wrapper=cls, container='flavors',
+                              cache=True)
+
+    @classmethod
+    @traced
+    def iter_all(cls, detail=False, page_size=100, prefetch=False):
+        """Iterate over every NextGenFlavor, fetching a page at a time.
+
+        :param detail: Return additional details about each NextGenFlavor
+        :type detail: bool
+        :param page_size: Number of NextGenFlavors to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of CloudNextGenServers NextGenFlavors.
+        :rtype: :class:`NextGenFlavor`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, marker: cls.list(limit, None, detail,
+                                               marker)
+        return paginate(fetch, page_size, marker=True, prefetch=prefetch)
 
     @classmethod
     def find(cls, id):
@@ -52,6 +80,15 @@ class NextGenFlavor(DotDict):
 
 class NextGenImage(DotDict):
     """A CloudNextGenServers NextGenImage."""
+    fields = (
+        Field('id'), Field('name'), Field('status'), Field('progress'),
+        Field('minDisk'), Field('minRam'), Field('serverId'),
+        Field('created', convert=convert_datetime, lazy=True),
+        Field('updated', convert=convert_datetime, lazy=True),
+        Field('metadata'),
+        Field('links'),
+    )
+
     def __repr__(self):
         if 'name' in self:
             return '<NextGenImage %s>' % self['name']
@@ -64,6 +101,7 @@ class NextGenImage(DotDict):
             value = convert_datetime(value)
         super(NextGenImage, self).__setitem__(key, value)
 
+    @traced
     def reload(self):
         """Reload this NextGenImage (an implicit :func:`get`).
 
@@ -77,6 +115,7 @@ class NextGenImage(DotDict):
         self.update(response)
         return self
 
+    @traced
     def delete(self):
         """Delete this NextGenImage.
 
@@ -94,9 +133,11 @@ class NextGenImage(DotDict):
         assert 'id' in self
         url = '/'.join([get_url('cloudserversopenstack'), 'images', str(self['id'])])
         handle_request('delete', url)
+        catalog_cache.invalidate(url.rsplit('/', 1)[0])
 
     @classmethod
-    def list(cls, limit=None, offset=None, detail=False):
+    @traced
+    def list(cls, limit=None, offset=None, detail=False, marker=None):
         """Returns a list of CloudNextGenServers NextGenImages.
 
         :param limit: Limit the result set by a cetain number
@@ -105,6 +146,8 @@ class NextGenImage(DotDict):
         :type offset: int
         :param detail: Return additional details about each NextGenImage
         :type detail: bool
+        :param marker: Start after the NextGenImage with this ID
+        :type marker: str
         :returns: A list of CloudNextGenServers NextGenImages.
         :rtype: A list of :class:`NextGenImage`
 
@@ -114,11 +157,33 @@ class NextGenImage(DotDict):
         if detail:
             url.append('detail')
         url = '/'.join(url)
-        if limit is not None or offset is not None:
-            url = query(url, limit=limit, offset=offset)
-        return handle_request('get', url, wrapper=NextGenImage, container='images')
+        if limit is not None or offset is not None or marker is not None:
+            url = query(url, limit=limit, offset=offset, marker=marker)
+        return handle_request('get', url, wrapper=NextGenImage,
+                              container='images', cache=True)
+
+    @classmethod
+    @traced
+    def iter_all(cls, detail=False, page_size=100, prefetch=False):
+        """Iterate over every NextGenImage, fetching a page at a time.
+
+        :param detail: Return additional details about each NextGenImage
+        :type detail: bool
+        :param page_size: Number of NextGenImages to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of CloudNextGenServers NextGenImages.
+        :rtype: :class:`NextGenImage`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, marker: cls.list(limit, None, detail,
+                                               marker)
+        return paginate(fetch, page_size, marker=True, prefetch=prefetch)
 
     @classmethod
+    @traced
     def find(cls, id):
         """Return an NextGenImage by ID.
 
@@ -133,6 +198,7 @@ class NextGenImage(DotDict):
         return handle_request('get', url, wrapper=cls, container='image')
 
     @classmethod
+    @traced
     def create(cls, name, server):
         """Create an NextGenImage.
 
@@ -150,9 +216,11 @@ class NextGenImage(DotDict):
         server = int(server)
         data = {'image': {'serverId': server,
                           'name': name}}
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudserversopenstack'), 'images'])
-        return handle_request('post', url, data, cls, 'image')
+        image = handle_request('post', url, data, cls, 'image')
+        catalog_cache.invalidate(url)
+        return image
 
 
 class VolumeAttachment(DotDict):
@@ -169,11 +237,20 @@ class VolumeAttachment(DotDict):
 
 class NextGenServer(DotDict):
     """A CloudNextGenServers NextGenServer."""
+    fields = (
+        Field('id'), Field('name'), Field('status'), Field('progress'),
+        Field('image'), Field('flavor'), Field('hostId'), Field('tenant_id'),
+        Field('user_id'), Field('accessIPv4'), Field('accessIPv6'),
+        Field('addresses'), Field('metadata'), Field('created'),
+        Field('updated'), Field('links'),
+    )
+
     def __repr__(self):
         if 'name' in self:
             return "<NextGenServer %s>" % self['name']
         return super(NextGenServer, self).__repr__()
 
+    @traced
     def reload(self):
         """Reload this NextGenServer (an implicit :func:`get`).
 
@@ -183,11 +260,16 @@ class NextGenServer(DotDict):
         .. versionadded:: 0.3
         """
         assert 'id' in self
-        response = NextGenServer.find(self['id'])
-        self.update(response)
+        url = '/'.join([get_url('cloudserversopenstack'), 'servers',
+                        str(self['id'])])
+        response = handle_request('get', url, wrapper=NextGenServer,
+                                  container='server')
+        if response is not self:
+            self.update(response)
         return self
 
     @property
+    @traced
     def ips(self):
         """Returns a list of ip addresses attached to the NextGenServer instance.
 
@@ -197,6 +279,7 @@ class NextGenServer(DotDict):
                 str(self['id']), 'ips'])
         return  handle_request('get', url, container='addresses')
 
+    @traced
     def ips_by_networkid(self, network_id=None):
         """Returns the list of ip addresses attached to the NextGenServer by the
         specified network_id.
@@ -208,6 +291,7 @@ class NextGenServer(DotDict):
                 str(self['id']), 'ips', str(network_id)])
         return  handle_request('get', url, container='network')
 
+    @traced
     def update_server(self, name=None, accessIPv4=None, accessIPv6=None):
         """Update this NextGenServer's name or ip addresses.
 
@@ -230,7 +314,7 @@ class NextGenServer(DotDict):
             data['server']['addressIPv4'] = addressIPv4
         if addressIPv6 is not None:
             data['server']['addressIPv6'] = addressIPv6
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudserversopenstack'), 'servers', str(self['id'])])
         response = handle_request('put', url, data=data)
         if response:
@@ -238,6 +322,7 @@ class NextGenServer(DotDict):
                 self['name'] = name
         return self
 
+    @traced
     def delete(self):
         """Delete this NextGenServer.
 
@@ -252,7 +337,9 @@ class NextGenServer(DotDict):
         assert 'id' in self
         url = '/'.join([get_url('cloudserversopenstack'), 'servers', str(self['id'])])
         handle_request('delete', url)
+        forget(self)
 
+    @traced
     def volumes_list(self):
         """Return the list of volumes attached to this NextGenServer.
 
@@ -264,6 +351,7 @@ class NextGenServer(DotDict):
                 container='volumeAttachments', server_id=str(self['id']))
         return self['volumes']
 
+    @traced
     def volume_detach(self, volumeId):
         """Detach the volume specified by volume_id from this NextGenServer.
 
@@ -273,6 +361,7 @@ class NextGenServer(DotDict):
             str(self['id']), 'os-volume_attachments', str(volumeId)])
         handle_request('delete', url)
 
+    @traced
     def volume_attach(self, volumeId, device=''):
         """Attach the volume specified by volume_id to this NextGenServer.
 
@@ -287,11 +376,12 @@ class NextGenServer(DotDict):
         if len(device) > 0 :
             data['volumeAttachment']['device'] = device
 
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudserversopenstack'), 'servers',
             str(self['id']), 'os-volume_attachments'])
         handle_request('post', url, data=data)
 
+    @traced
     def change_admin_pass(self, password):
         """Change admin password.
 
@@ -304,9 +394,10 @@ class NextGenServer(DotDict):
         assert 'id' in self
         url = '/'.join([get_url('cloudserversopenstack'), 'servers',
             str(self['id']), 'action'])
-        data = json.dumps({ "changePassword": { "adminPass" : str(password)}})
+        data = dumps({ "changePassword": { "adminPass" : str(password)}})
         handle_request('post', url, data)
 
+    @traced
     def reboot(self, type='SOFT'):
         """Perform a soft/hard reboot on this NextGenServer.
 
@@ -317,11 +408,12 @@ class NextGenServer(DotDict):
         """
         assert 'id' in self, "Missing NextGenServer ID"
         assert type in ['SOFT', 'HARD'], "Reboot type must be 'SOFT' or 'HARD'"
-        data = json.dumps({'reboot': {'type': type}})
+        data = dumps({'reboot': {'type': type}})
         url = '/'.join([get_url('cloudserversopenstack'), 'servers',
                         str(self['id']), 'action'])
         handle_request('post', url, data)
 
+    @traced
     def rebuild(self, name, image, flavor, adminpass, accessIPv4=None,
             accessIPv6=None, metadata={}, files={}, diskConfig='AUTO'):
         """Rebuild this NextGenServer using a specified NextGenImage
@@ -368,12 +460,14 @@ class NextGenServer(DotDict):
             data['rebuild']['accessIPv6'] = str(accessIPv6)
         if isinstance(files, dict):
             for path, contents in list(files.items()):
-                data['rebuild']['personality'].append({'path': path, 'contents': contents})
-        data = json.dumps(data)
+                data['rebuild'].setdefault('personality', []).append(
+                    {'path': path, 'contents': contents})
+        data = dumps(data)
         url = '/'.join([get_url('cloudserversopenstack'), 'servers',
                         str(self['id']), 'action'])
-        handle_request('post', url, data)
+        handle_request('post', url, data, compress=True)
 
+    @traced
     def resize(self, name, flavor, diskConfig='AUTO'):
         """Resize this NextGenServer to a specific NextGenFlavor size
 
@@ -389,57 +483,62 @@ class NextGenServer(DotDict):
         if isinstance(flavor, NextGenFlavor):
             flavor = flavor.id
         flavor = int(flavor)
-        data = json.dumps({'resize': {'flavorId': flavor}})
+        data = dumps({'resize': {'flavorId': flavor}})
         data['resize']['name'] = self['name']
         data['resize']['OS-DCF:diskConfig'] = str(diskConfig)
         url = '/'.join([get_url('cloudserversopenstack'), 'servers', str(self['id']),
                         'action'])
         handle_request('post', url, data)
 
+    @traced
     def confirm_resize(self):
         """Confirm a successful resize operation
 
         .. versionadded:: 0.3
         """
         assert 'id' in self
-        data = json.dumps({'confirmResize': None})
+        data = dumps({'confirmResize': None})
         url = '/'.join([get_url('cloudserversopenstack'), 'servers',
                         str(self['id']), 'action'])
         handle_request('post', url, data)
 
+    @traced
     def revert_resize(self):
         """Revert an unsuccessful resize operation
 
         .. versionadded:: 0.3
         """
         assert 'id' in self
-        data = json.dumps({'revertResize': None})
+        data = dumps({'revertResize': None})
         url = '/'.join([get_url('cloudserversopenstack'), 'servers',
                         str(self['id']), 'action'])
         handle_request('post', url, data)
 
+    @traced
     def rescue(self):
         """Put server im rescue mode.
 
         .. versionadded:: 0.3
         """
         assert 'id' in self
-        data = json.dumps({'rescue': None})
+        data = dumps({'rescue': None})
         url = '/'.join([get_url('cloudserversopenstack'), 'servers',
                         str(self['id']), 'action'])
         return handle_request('post', url, data)
 
+    @traced
     def unrescue(self):
         """Take server out of rescue mode
 
         .. versionadded:: 0.3
         """
         assert 'id' in self
-        data = json.dumps({'unrescue': None})
+        data = dumps({'unrescue': None})
         url = '/'.join([get_url('cloudserversopenstack'), 'servers',
                         str(self['id']), 'action'])
         return handle_request('post', url, data)
 
+    @traced
     def create_image(self, name=None, metadata={}):
         """Create a server image.
 
@@ -451,13 +550,17 @@ class NextGenServer(DotDict):
                     'name' : str(name),
                     'metadata': metadata or {}
                     }}
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudserversopenstack'), 'servers',
                         str(self['id']), 'action'])
-        return handle_request('post', url, data)
+        response = handle_request('post', url, data)
+        catalog_cache.invalidate('/'.join([get_url('cloudserversopenstack'),
+                                           'images']))
+        return response
 
     @classmethod
-    def list(cls, limit=None, offset=None, detail=False):
+    @traced
+    def list(cls, limit=None, offset=None, detail=False, marker=None):
         """
         List of CloudNextGenServer NextGenServers
 
@@ -465,6 +568,10 @@ class NextGenServer(DotDict):
         :type limit: int
         :param offset: Offset the result set by a certain number
         :type offset: int
+        :param detail: Return detailed information about each NextGenServer
+        :type detail: bool
+        :param marker: Start after the NextGenServer with this ID
+        :type marker: str
         :returns: A list of CloudNextGenServers NextGenServers.
         :rtype: List of :class:`NextGenServer`
 
@@ -472,13 +579,65 @@ class NextGenServer(DotDict):
         """
         url = [get_url('cloudserversopenstack'), 'servers']
         if detail:
-            url.append(detail)
+            url.append('detail')
         url = '/'.join(url)
-        if limit is not None or offset is not None:
-            url = query(url, limit=limit, offset=offset)
+        if limit is not None or offset is not None or marker is not None:
+            url = query(url, limit=limit, offset=offset, marker=marker)
         return handle_request('get', url, wrapper=cls, container='servers')
 
     @classmethod
+    @traced
+    def iter_all(cls, detail=False, page_size=100, prefetch=False):
+        """Iterate over every NextGenServer, fetching a page at a time.
+
+        :param detail: Return additional details about each NextGenServer
+        :type detail: bool
+        :param page_size: Number of NextGenServers to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of CloudNextGenServers NextGenServers.
+        :rtype: :class:`NextGenServer`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, marker: cls.list(limit, None, detail,
+                                               marker)
+        return paginate(fetch, page_size, marker=True, prefetch=prefetch)
+
+    @classmethod
+    def wait_all(cls, servers, status='ACTIVE', timeout=3600.0, interval=5.0,
+                 callback=None):
+        """Wait until every NextGenServer reaches a status.
+
+        Each tick lists every NextGenServer in detail and updates the tracked
+        ones in place, so polling costs the same however many are waited on.
+
+            >>> servers = [NextGenServer.create(...) for i in range(200)]
+            >>> NextGenServer.wait_all(servers, 'ACTIVE')
+
+        :param servers: The NextGenServers to wait on.
+        :type servers: list of :class:`NextGenServer`
+        :param status: The status, or statuses, to wait for.
+        :type status: str or tuple
+        :param timeout: Seconds to wait for each NextGenServer.
+        :type timeout: float
+        :param interval: Seconds between ticks while statuses are changing.
+        :type interval: float
+        :param callback: Called with each :class:`~vaporize.waiters.Handle`
+            as soon as it is done.
+        :type callback: callable
+        :returns: A handle for each NextGenServer, in the same order.
+        :rtype: list of :class:`~vaporize.waiters.Handle`
+
+        .. versionadded:: 0.4
+        """
+        from vaporize import waiters
+        return waiters.wait(servers, status, timeout=timeout, interval=interval,
+                            callback=callback)
+
+    @classmethod
+    @traced
     def find(cls, id):
         """Return a NextGenServer using an ID
 
@@ -487,11 +646,19 @@ class NextGenServer(DotDict):
         :return: A :class:`NextGenServer`
 
         .. versionadded:: 0.3
+
+        .. versionchanged:: 0.4
+            Returns the NextGenServer already loaded, if the Client keeps an
+            :class:`~vaporize.core.IdentityMap`.
         """
+        server = lookup(cls, id)
+        if server is not None:
+            return server
         url = '/'.join([get_url('cloudserversopenstack'), 'servers', str(id)])
         return handle_request('get', url, wrapper=cls, container='server')
 
     @classmethod
+    @traced
     def create(cls, name, image, flavor, adminpass=None, diskConfig='AUTO',
             metadata={}, files={}, networksUUIDs=[], accessIPv4=None,
             accessIPv6=None):
@@ -544,9 +711,9 @@ class NextGenServer(DotDict):
             data['server']['accessIPv4'] = accessIPv4
         if accessIPv6:
             data['server']['accessIPv6'] = accessIPv6
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudserversopenstack'), 'servers'])
-        return handle_request('post', url, data, cls, 'server')
+        return handle_request('post', url, data, cls, 'server', compress=True)
 
 
 class Network(DotDict):
@@ -557,6 +724,7 @@ class Network(DotDict):
             return '<Network %s>' % self['label']
         return super(Network, self).__repr__()
 
+    @traced
     def delete(self):
         """Delete this Network"""
         assert 'id' in self
@@ -565,6 +733,7 @@ class Network(DotDict):
         handle_request('delete', url)
 
     @classmethod
+    @traced
     def list(cls):
         """Returns a list of networks.
 
@@ -576,6 +745,7 @@ class Network(DotDict):
         return handle_request('get', url, wrapper=cls, container='networks')
 
     @classmethod
+    @traced
     def find(cls, network_id):
         """Returns a Network by id
 
@@ -588,6 +758,7 @@ class Network(DotDict):
         return handle_request('get', url, wrapper=cls, container='network')
 
     @classmethod
+    @traced
     def create(cls, cidr, label):
         """Creates a Network.
 
@@ -603,7 +774,7 @@ class Network(DotDict):
                      'label': label
                      }
                 }
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudserversopenstack'), 'os-networksv2'])
         return handle_request('post', url, data, cls, 'network')
 
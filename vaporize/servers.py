@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
 
-import json
-
-from vaporize.core import convert_datetime, get_url, handle_request, query
-from vaporize.utils import DotDict
+from vaporize.core import (catalog_cache, convert_datetime, dumps, fetch_all,
+                           forget, get_url, handle_request, lookup, paginate,
+                           query, traced)
+from vaporize.utils import DotDict, Field, compact_type
 
 BACKUP_WEEKLY_DISABLED  = 'DISABLED'
 BACKUP_WEEKLY_SUNDAY    = 'SUNDAY'
@@ -53,6 +53,10 @@ class BackupSchedule(DotDict):
 
 class Flavor(DotDict):
     """A CloudServers Flavor."""
+    fields = (
+        Field('id'), Field('name'), Field('ram'), Field('disk'),
+    )
+
     def __repr__(self):
         if 'name' in self:
             return '<Flavor %s>' % self['name']
@@ -79,7 +83,27 @@ class Flavor(DotDict):
         url = '/'.join(url)
         if limit is not None or offset is not None:
             url = query(url, limit=limit, offset=offset)
-        return handle_request('get', url, wrapper=cls, container='flavors')
+        return handle_request('get', url, wrapper=cls, container='flavors',
+                              cache=True)
+
+    @classmethod
+    @traced
+    def iter_all(cls, detail=False, page_size=100, prefetch=False):
+        """Iterate over every Flavor, fetching a page at a time.
+
+        :param detail: Return additional details about each Flavor
+        :type detail: bool
+        :param page_size: Number of Flavors to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of CloudServers Flavors.
+        :rtype: :class:`Flavor`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, offset: cls.list(limit, offset, detail)
+        return paginate(fetch, page_size, prefetch=prefetch)
 
     @classmethod
     def find(cls, id):
@@ -98,6 +122,13 @@ class Flavor(DotDict):
 
 class Image(DotDict):
     """A CloudServers Image."""
+    fields = (
+        Field('id'), Field('name'), Field('status'), Field('progress'),
+        Field('serverId'),
+        Field('created', convert=convert_datetime, lazy=True),
+        Field('updated', convert=convert_datetime, lazy=True),
+    )
+
     def __repr__(self):
         if 'name' in self:
             return '<Image %s>' % self['name']
@@ -110,6 +141,7 @@ class Image(DotDict):
             value = convert_datetime(value)
         super(Image, self).__setitem__(key, value)
 
+    @traced
     def reload(self):
         """Reload this Image (an implicit :func:`get`).
 
@@ -123,6 +155,7 @@ class Image(DotDict):
         self.update(response)
         return self
 
+    @traced
     def delete(self):
         """Delete this Image.
 
@@ -140,8 +173,10 @@ class Image(DotDict):
         assert 'id' in self
         url = '/'.join([get_url('cloudservers'), 'images', str(self['id'])])
         handle_request('delete', url)
+        catalog_cache.invalidate(url.rsplit('/', 1)[0])
 
     @classmethod
+    @traced
     def list(cls, limit=None, offset=None, detail=False):
         """Returns a list of CloudServers Images.
 
@@ -162,9 +197,56 @@ class Image(DotDict):
         url = '/'.join(url)
         if limit is not None or offset is not None:
             url = query(url, limit=limit, offset=offset)
-        return handle_request('get', url, wrapper=Image, container='images')
+        return handle_request('get', url, wrapper=Image, container='images',
+                              cache=True)
 
     @classmethod
+    @traced
+    def iter_all(cls, detail=False, page_size=100, prefetch=False):
+        """Iterate over every Image, fetching a page at a time.
+
+        :param detail: Return additional details about each Image
+        :type detail: bool
+        :param page_size: Number of Images to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of CloudServers Images.
+        :rtype: :class:`Image`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, offset: cls.list(limit, offset, detail)
+        return paginate(fetch, page_size, prefetch=prefetch)
+
+    @classmethod
+    @traced
+    def list_all(cls, detail=False, page_size=100, workers=4, compact=False):
+        """List every CloudServers Image, requesting pages concurrently.
+
+        :param detail: Return additional details about each Image
+        :type detail: bool
+        :param page_size: Number of Images to request per page
+        :type page_size: int
+        :param workers: Maximum number of pages requested at once
+        :type workers: int
+        :param compact: Return compact Images (see
+            :func:`vaporize.utils.compact_type`)
+        :type compact: bool
+        :returns: A list of CloudServers Images.
+        :rtype: A list of :class:`Image`
+
+        .. versionadded:: 0.4
+        """
+        url = [get_url('cloudservers'), 'images']
+        if detail:
+            url.append('detail')
+        url = '/'.join(url)
+        wrapper = compact_type(cls) if compact else cls
+        return fetch_all(url, 'images', wrapper, page_size, workers)
+
+    @classmethod
+    @traced
     def find(cls, id):
         """Return an Image by ID.
 
@@ -179,6 +261,7 @@ class Image(DotDict):
         return handle_request('get', url, wrapper=cls, container='image')
 
     @classmethod
+    @traced
     def create(cls, name, server):
         """Create an Image.
 
@@ -196,9 +279,11 @@ class Image(DotDict):
         server = int(server)
         data = {'image': {'serverId': server,
                           'name': name}}
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudservers'), 'images'])
-        return handle_request('post', url, data, cls, 'image')
+        image = handle_request('post', url, data, cls, 'image')
+        catalog_cache.invalidate(url)
+        return image
 
 
 class IP(DotDict):
@@ -213,6 +298,12 @@ class IP(DotDict):
 
 class Server(DotDict):
     """A CloudServers Server."""
+    fields = (
+        Field('id'), Field('name'), Field('status'), Field('progress'),
+        Field('imageId'), Field('flavorId'), Field('hostId'),
+        Field('addresses', convert=IP), Field('metadata'),
+    )
+
     def __repr__(self):
         if 'name' in self:
             return "<Server %s>" % self['name']
@@ -223,6 +314,7 @@ class Server(DotDict):
             value = IP(value)
         super(Server, self).__setitem__(key, value)
 
+    @traced
     def reload(self):
         """Reload this Server (an implicit :func:`get`).
 
@@ -232,10 +324,14 @@ class Server(DotDict):
         .. versionadded:: 0.1
         """
         assert 'id' in self
-        response = Server.find(self['id'])
-        self.update(response)
+        url = '/'.join([get_url('cloudservers'), 'servers', str(self['id'])])
+        response = handle_request('get', url, wrapper=Server,
+                                  container='server')
+        if response is not self:
+            self.update(response)
         return self
 
+    @traced
     def modify(self, name=None, password=None):
         """Modify this Server's name or root password.
 
@@ -254,7 +350,7 @@ class Server(DotDict):
             data['server']['name'] = name
         if password is not None:
             data['server']['adminPass'] = password
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudservers'), 'servers', str(self['id'])])
         response = handle_request('put', url, data=data)
         if response:
@@ -262,6 +358,7 @@ class Server(DotDict):
                 self['name'] = name
         return self
 
+    @traced
     def delete(self):
         """Delete this Server.
 
@@ -276,8 +373,10 @@ class Server(DotDict):
         assert 'id' in self
         url = '/'.join([get_url('cloudservers'), 'servers', str(self['id'])])
         handle_request('delete', url)
+        forget(self)
 
     @property
+    @traced
     def ips(self):
         """
         Returns a list of public and private IPs for this Server.
@@ -297,6 +396,7 @@ class Server(DotDict):
         return self['addresses']
 
     @property
+    @traced
     def public_ips(self):
         """Returns the Server's Public IP.
 
@@ -313,6 +413,7 @@ class Server(DotDict):
         return self['addresses']['public']
 
     @property
+    @traced
     def private_ips(self):
         """Returns the Server's Private IP.
 
@@ -328,6 +429,7 @@ class Server(DotDict):
             self['addresses'].update(response)
         return self['addresses']['private']
 
+    @traced
     def share_ip(self, address, ipgroup, configure=True):
         """Share this Server's IP in a Shared IP Group.
 
@@ -346,12 +448,13 @@ class Server(DotDict):
         if isinstance(ipgroup, SharedIPGroup):
             ipgroup = ipgroup.id
         ipgroup = int(ipgroup)
-        data = json.dumps({'shareIp': {'sharedIpGroup': ipgroup,
+        data = dumps({'shareIp': {'sharedIpGroup': ipgroup,
                                        'configureServer': configure}})
         url = '/'.join([get_url('cloudservers'), 'servers', str(self['id']),
                         'ips', 'public', address])
         handle_request('put', url, data=data)
 
+    @traced
     def unshare_ip(self, address):
         """Unshare this Server's IP
 
@@ -362,6 +465,7 @@ class Server(DotDict):
                         'ips', 'public', address])
         handle_request('delete', url)
 
+    @traced
     def reboot(self, type='SOFT'):
         """Perform a soft/hard reboot on this Server.
 
@@ -372,11 +476,12 @@ class Server(DotDict):
         """
         assert 'id' in self, "Missing Server ID"
         assert type in ['SOFT', 'HARD'], "Reboot type must be 'SOFT' or 'HARD'"
-        data = json.dumps({'reboot': {'type': type}})
+        data = dumps({'reboot': {'type': type}})
         url = '/'.join([get_url('cloudservers'), 'servers',
                         str(self['id']), 'action'])
         handle_request('post', url, data)
 
+    @traced
     def rebuild(self, image):
         """Rebuild this Server using a specified Image
 
@@ -389,11 +494,12 @@ class Server(DotDict):
         if isinstance(image, Image):
             image = image.id
         image = int(image)
-        data = json.dumps({'rebuild': {'imageId': int(image)}})
+        data = dumps({'rebuild': {'imageId': int(image)}})
         url = '/'.join([get_url('cloudservers'), 'servers',
                         str(self['id']), 'action'])
         handle_request('post', url, data)
 
+    @traced
     def resize(self, flavor):
         """Resize this Server to a specific Flavor size
 
@@ -406,34 +512,37 @@ class Server(DotDict):
         if isinstance(flavor, Flavor):
             flavor = flavor.id
         flavor = int(flavor)
-        data = json.dumps({'resize': {'flavorId': flavor}})
+        data = dumps({'resize': {'flavorId': flavor}})
         url = '/'.join([get_url('cloudservers'), 'servers', str(self['id']),
                         'action'])
         handle_request('post', url, data)
 
+    @traced
     def confirm_resize(self):
         """Confirm a successful resize operation
 
         .. versionadded:: 0.1
         """
         assert 'id' in self
-        data = json.dumps({'confirmResize': None})
+        data = dumps({'confirmResize': None})
         url = '/'.join([get_url('cloudservers'), 'servers',
                         str(self['id']), 'action'])
         handle_request('post', url, data)
 
+    @traced
     def revert_resize(self):
         """Revert an unsuccessful resize operation
 
         .. versionadded:: 0.1
         """
         assert 'id' in self
-        data = json.dumps({'revertResize': None})
+        data = dumps({'revertResize': None})
         url = '/'.join([get_url('cloudservers'), 'servers',
                         str(self['id']), 'action'])
         handle_request('post', url, data)
 
     @property
+    @traced
     def backup_schedule(self):
         """Return this Server's backup schedule
 
@@ -451,6 +560,7 @@ class Server(DotDict):
         return self['backup_schedule']
 
     @backup_schedule.setter
+    @traced
     def backup_schedule(self, schedule):
         """Enable a backup schedule for this Server
 
@@ -473,6 +583,7 @@ class Server(DotDict):
         self['backup_schedule'] = schedule
 
     @backup_schedule.deleter
+    @traced
     def backup_schedule(self):
         """Disable a backup schedule for this Server
 
@@ -488,6 +599,7 @@ class Server(DotDict):
         del self['backup_schedule']
 
     @classmethod
+    @traced
     def list(cls, limit=None, offset=None, detail=False):
         """
         List of CloudServer Servers
@@ -512,6 +624,57 @@ class Server(DotDict):
         return handle_request('get', url, wrapper=cls, container='servers')
 
     @classmethod
+    @traced
+    def iter_all(cls, detail=False, page_size=100, prefetch=False):
+        """Iterate over every Server, fetching a page at a time.
+
+        :param detail: Return additional details about each Server
+        :type detail: bool
+        :param page_size: Number of Servers to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of CloudServers Servers.
+        :rtype: :class:`Server`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, offset: cls.list(limit, offset, detail)
+        return paginate(fetch, page_size, prefetch=prefetch)
+
+    @classmethod
+    def wait_all(cls, servers, status='ACTIVE', timeout=3600.0, interval=5.0,
+                 callback=None):
+        """Wait until every Server reaches a status.
+
+        Each tick lists every Server in detail and updates the tracked
+        ones in place, so polling costs the same however many are waited on.
+
+            >>> servers = [Server.create(...) for i in range(200)]
+            >>> Server.wait_all(servers, 'ACTIVE')
+
+        :param servers: The Servers to wait on.
+        :type servers: list of :class:`Server`
+        :param status: The status, or statuses, to wait for.
+        :type status: str or tuple
+        :param timeout: Seconds to wait for each Server.
+        :type timeout: float
+        :param interval: Seconds between ticks while statuses are changing.
+        :type interval: float
+        :param callback: Called with each :class:`~vaporize.waiters.Handle`
+            as soon as it is done.
+        :type callback: callable
+        :returns: A handle for each Server, in the same order.
+        :rtype: list of :class:`~vaporize.waiters.Handle`
+
+        .. versionadded:: 0.4
+        """
+        from vaporize import waiters
+        return waiters.wait(servers, status, timeout=timeout, interval=interval,
+                            callback=callback)
+
+    @classmethod
+    @traced
     def find(cls, id):
         """Return a Server using an ID
 
@@ -520,11 +683,19 @@ class Server(DotDict):
         :return: A :class:`Server`
 
         .. versionadded:: 0.1
+
+        .. versionchanged:: 0.4
+            Returns the Server already loaded, if the Client keeps an
+            :class:`~vaporize.core.IdentityMap`.
         """
+        server = lookup(cls, id)
+        if server is not None:
+            return server
         url = '/'.join([get_url('cloudservers'), 'servers', str(id)])
         return handle_request('get', url, wrapper=cls, container='server')
 
     @classmethod
+    @traced
     def create(cls, name, image, flavor, metadata=None, files=None):
         """Create a CloudServers Server
 
@@ -556,10 +727,12 @@ class Server(DotDict):
                            'personality': []}}
         if isinstance(files, dict):
             for path, contents in list(files.items()):
-                data['personality'].append({'path': path, 'contents': contents})
-        data = json.dumps(data)
+                data['server']['personality'].append({'path': path,
+                                                      'contents': contents})
+        data = dumps(data)
         url = '/'.join([get_url('cloudservers'), 'servers'])
-        return handle_request('post', url, data, cls, 'server')
+        return handle_request('post', url, data, cls, 'server',
+                              compress=True)
 
 
 class SharedIPGroup(DotDict):
@@ -576,6 +749,7 @@ class SharedIPGroup(DotDict):
             key = 'configured'
         super(SharedIPGroup, self).__setitem__(key, value)
 
+    @traced
     def delete(self):
         """Delete this Shared IP Group.
 
@@ -587,6 +761,7 @@ class SharedIPGroup(DotDict):
         handle_request('delete', url)
 
     @classmethod
+    @traced
     def list(cls, limit=None, offset=None, detail=False):
         """Returns a list of Shared IP Groups.
 
@@ -611,6 +786,26 @@ class SharedIPGroup(DotDict):
                               container='sharedIpGroups')
 
     @classmethod
+    @traced
+    def iter_all(cls, detail=False, page_size=100, prefetch=False):
+        """Iterate over every Shared IP Group, fetching a page at a time.
+
+        :param detail: Return additional details about each Shared IP Group
+        :type detail: bool
+        :param page_size: Number of Shared IP Groups to request per page
+        :type page_size: int
+        :param prefetch: Fetch the next page in the background
+        :type prefetch: bool
+        :returns: A generator of Shared IP Groups.
+        :rtype: :class:`SharedIPGroup`
+
+        .. versionadded:: 0.4
+        """
+        fetch = lambda limit, offset: cls.list(limit, offset, detail)
+        return paginate(fetch, page_size, prefetch=prefetch)
+
+    @classmethod
+    @traced
     def find(cls, id):
         """Return a Shared IP Group by ID.
 
@@ -625,6 +820,7 @@ class SharedIPGroup(DotDict):
                               container='sharedIpGroup')
 
     @classmethod
+    @traced
     def create(cls, name, server):
         """Create a Shared IP Group.
 
@@ -642,6 +838,6 @@ class SharedIPGroup(DotDict):
         server = int(server)
         data = {'sharedIpGroup': {'name': name,
                                   'server': server}}
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudservers'), 'server_ip_groups'])
         return handle_request('post', url, data, cls, 'sharedIpGroup')
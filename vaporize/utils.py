@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import re
+import sys
 
 
 class DotDict(dict):
@@ -31,4 +32,375 @@ class DotDict(dict):
     __getattr__ = dict.__getitem__
     __delattr__ = dict.__delitem__
 
-camelcase_to_underscore = lambda str: re.sub('(((?<=[a-z])[A-Z])|([A-Z](?![A-Z]|$)))', '_\\1', str).lower().strip('_')
+    @classmethod
+    def decode(cls, data, **kwargs):
+        """Wrap a dict from an API response, like ``cls(data, **kwargs)``.
+
+        Uses a decoder compiled from the class's ``fields`` the first time
+        it is called; see :func:`compile_decoder`.
+
+        .. versionadded:: 0.4
+        """
+        decoder = cls.__dict__.get('_decoder')
+        if decoder is None:
+            decoder = compile_decoder(cls)
+            cls._decoder = decoder
+        return decoder(data, **kwargs)
+
+
+CAMELCASE_RE = re.compile('(((?<=[a-z])[A-Z])|([A-Z](?![A-Z]|$)))')
+
+# Maximum number of keys remembered by camelcase_to_underscore, in addition
+# to KNOWN_KEYS.
+KEY_CACHE_SIZE = 4096
+
+# Keys returned by the Rackspace Cloud APIs, converted ahead of time.
+KNOWN_KEYS = (
+    'accessIPv4', 'accessIPv6', 'accessList', 'accountId', 'address',
+    'addresses', 'adminPass', 'algorithm', 'allowedDomain', 'attachments',
+    'attemptsBeforeDeactivation', 'availability_zone', 'backupSchedule',
+    'bodyRegex', 'characterSet', 'cluster', 'collate', 'comment', 'condition',
+    'configuredServer', 'connectionLogging', 'connectionThrottle',
+    'contentCaching', 'created', 'createdAt', 'daily', 'data', 'databases',
+    'delay', 'disk', 'display_description', 'display_name', 'emailAddress',
+    'enabled', 'flavor', 'flavorId', 'halfClosed', 'healthMonitor', 'hostId',
+    'hostname', 'href', 'id', 'image', 'imageId', 'ipVersion', 'label',
+    'links', 'maxConnectionRate', 'maxConnections', 'metadata',
+    'minConnections', 'name', 'nameservers', 'nodeCount', 'nodes', 'path',
+    'persistenceType', 'port', 'priority', 'private', 'progress', 'protocol',
+    'public', 'ram', 'rateInterval', 'recordsList', 'rel', 'rootEnabled',
+    'server', 'serverId', 'servers', 'sessionPersistence', 'sharedIpGroupId',
+    'size', 'snapshot_id', 'sourceAddresses', 'status', 'statusRegex',
+    'subdomains', 'tenant_id', 'time', 'timeout', 'totalEntries', 'ttl',
+    'type', 'updated', 'used', 'user_id', 'users', 'vcpus', 'virtualIps',
+    'volume', 'volumeId', 'volume_type', 'weekly', 'weight',
+)
+
+
+def convert_camelcase(key):
+    """Convert ``key`` from camelCase to underscore_case without caching."""
+    return CAMELCASE_RE.sub('_\\1', key).lower().strip('_')
+
+
+_key_cache = dict((key, convert_camelcase(key)) for key in KNOWN_KEYS)
+
+
+def camelcase_to_underscore(key):
+    """Convert ``key`` from camelCase to underscore_case.
+
+    Conversions are remembered, so wrapping a large response costs a dict
+    lookup per key rather than a regular expression substitution. Once
+    :data:`KEY_CACHE_SIZE` unknown keys have been seen, new keys are
+    converted without being cached.
+    """
+    try:
+        return _key_cache[key]
+    except KeyError:
+        pass
+    value = convert_camelcase(key)
+    if len(_key_cache) < len(KNOWN_KEYS) + KEY_CACHE_SIZE:
+        _key_cache[key] = value
+    return value
+
+
+class Field(object):
+    """A field of a Rackspace Cloud API resource.
+
+    :param key: The key of the field in API responses, e.g. ``hostId``.
+    :type key: str
+    :param name: The attribute name of the field (default: ``key`` converted
+        to underscore_case).
+    :type name: str
+    :param convert: Converts a value from an API response.
+    :type convert: callable
+    :param lazy: Compact resources convert the value on first access, so
+        ``convert`` must accept values it has already converted.
+    :type lazy: bool
+    """
+    __slots__ = ('key', 'name', 'convert', 'lazy')
+
+    def __init__(self, key, name=None, convert=None, lazy=False):
+        self.key = key
+        self.name = name or camelcase_to_underscore(key)
+        self.convert = convert
+        self.lazy = lazy
+
+    def __repr__(self):
+        return '<Field %s>' % self.name
+
+
+class Nested(Field):
+    """A field holding other resources, such as a LoadBalancer's Nodes.
+
+    :param key: The key of the field in API responses, e.g. ``virtualIps``.
+    :type key: str
+    :param resource: The resource class of the values, or its name in the
+        module of the resource the field belongs to.
+    :type resource: :class:`DotDict` subclass or str
+    :param name: The attribute name of the field.
+    :type name: str
+    :param many: The value is a list of resources.
+    :type many: bool
+    :param container: The key within the value holding the resource(s), e.g.
+        ``records`` for a Domain's ``recordsList``.
+    :type container: str
+    :param parent: The keyword the parent's ``id`` is passed to each resource
+        as, e.g. ``loadbalancer_id``.
+    :type parent: str
+    """
+    __slots__ = ('resource', 'many', 'container', 'parent')
+
+    def __init__(self, key, resource, name=None, many=False, container=None,
+                 parent=None):
+        super(Nested, self).__init__(key, name)
+        self.resource = resource
+        self.many = many
+        self.container = container
+        self.parent = parent
+
+    def decode(self, value, parent_id=None):
+        """Wrap the field's value from an API response."""
+        decode = self.resource.decode
+        if self.container is not None:
+            value = value[self.container]
+        if self.parent is not None and parent_id is not None:
+            kwargs = {self.parent: parent_id}
+        else:
+            kwargs = {}
+        if self.many:
+            return [decode(v, **kwargs) for v in value]
+        return decode(value, **kwargs)
+
+
+def compile_decoder(cls):
+    """Returns a function wrapping API responses in ``cls`` in one pass.
+
+    The decoder converts each key and value as described by the class's
+    ``fields``, then fills the new object with a single ``dict.update``
+    instead of a ``__setitem__`` call per key. Classes which override
+    ``__setitem__`` without declaring ``fields`` are decoded by calling the
+    class.
+
+    :param cls: A resource class.
+    :type cls: :class:`DotDict` subclass
+    :returns: A function taking ``(data, **kwargs)``.
+
+    .. versionadded:: 0.4
+    """
+    fields = cls.__dict__.get('fields')
+    if fields is None:
+        for klass in cls.__mro__:
+            if klass is DotDict:
+                break
+            if '__setitem__' in vars(klass):
+                return cls
+        fields = ()
+    convert_key = camelcase_to_underscore
+    module = sys.modules[cls.__module__]
+    table = {}
+    nested = []
+    for field in fields:
+        if isinstance(field, Nested):
+            if isinstance(field.resource, str):
+                field.resource = getattr(module, field.resource)
+            nested.append(field)
+            table[field.key] = None
+        else:
+            table[field.key] = field
+    new = dict.__new__
+    update = dict.update
+
+    def decode(data, **kwargs):
+        values = {}
+        for items in (data.items(), kwargs.items()):
+            for key, value in items:
+                try:
+                    field = table[key]
+                except KeyError:
+                    values[convert_key(key)] = value
+                    continue
+                if field is None:
+                    continue
+                if field.convert is not None and value is not None:
+                    value = field.convert(value)
+                values[field.name] = value
+        for field in nested:
+            if field.key in data:
+                value = data[field.key]
+                if value is not None:
+                    value = field.decode(value, data.get('id'))
+                values[field.name] = value
+        obj = new(cls)
+        update(obj, values)
+        return obj
+    return decode
+
+
+class Compact(object):
+    """Base class of compact resource representations.
+
+    Compact resources keep their fields in ``__slots__`` instead of a dict,
+    using a fraction of the memory of the equivalent :class:`DotDict`. They
+    support the same attribute access, but are plain data: :class:`Nested`
+    resources are kept as they are in the API response, and :meth:`expand`
+    returns the full resource.
+
+    Use :func:`compact_type` to get the compact class of a resource.
+    """
+    __slots__ = ('_extra',)
+    fields = ()
+    resource = None
+    _by_key = {}
+
+    def __init__(self, *args, **kwargs):
+        self._extra = None
+        by_key = self._by_key
+        for key, value in dict(*args, **kwargs).items():
+            try:
+                attr, convert = by_key[key]
+            except KeyError:
+                self._set_extra(camelcase_to_underscore(key), value)
+                continue
+            if convert is not None and value is not None:
+                value = convert(value)
+            object.__setattr__(self, attr, value)
+
+    def __repr__(self):
+        for name in ('name', 'address', 'id'):
+            value = getattr(self, name, None)
+            if value is not None:
+                return '<%s %s>' % (type(self).__name__, value)
+        return '<%s>' % type(self).__name__
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __getattr__(self, name):
+        # Unset slots, _extra included while copy or pickle rebuild an
+        # instance, are never extra fields.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        extra = object.__getattribute__(self, '_extra')
+        if extra is not None and name in extra:
+            return extra[name]
+        raise AttributeError(name)
+
+    def __reduce__(self):
+        # Generated classes can't be found by name, so rebuild through the
+        # resource they were generated from.
+        values = []
+        for attr in type(self).__slots__:
+            try:
+                values.append((attr, object.__getattribute__(self, attr)))
+            except AttributeError:
+                pass
+        return (rebuild_compact, (self.resource, values,
+                                  object.__getattribute__(self, '_extra')))
+
+    def __setattr__(self, name, value):
+        try:
+            object.__setattr__(self, name, value)
+        except AttributeError:
+            self._set_extra(name, value)
+
+    def _set_extra(self, name, value):
+        if self._extra is None:
+            self._extra = {}
+        self._extra[name] = value
+
+    def to_dict(self):
+        """Returns the fields as a dict keyed like an API response."""
+        ret = {}
+        for field in self.fields:
+            try:
+                ret[field.key] = object.__getattribute__(self, field.name)
+            except AttributeError:
+                pass
+        if self._extra:
+            ret.update(self._extra)
+        return ret
+
+    def expand(self):
+        """Returns this resource as its full :class:`DotDict` resource."""
+        return self.resource(self.to_dict())
+
+    @classmethod
+    def from_resource(cls, resource):
+        """Returns the compact form of a :class:`DotDict` resource."""
+        obj = cls.__new__(cls)
+        obj._extra = None
+        by_name = dict((f.name, f) for f in cls.fields)
+        for name, value in resource.items():
+            if name in by_name:
+                object.__setattr__(obj, name, value)
+            else:
+                obj._set_extra(name, value)
+        return obj
+
+
+def compact_type(resource):
+    """Returns the compact class of a resource class.
+
+        >>> CompactRecord = compact_type(vaporize.domains.Record)
+        >>> records = list(domain.iter_records(compact=True))
+
+    The class is generated from the resource's ``fields`` the first time it
+    is asked for. Instances can be built from an API response, or from an
+    existing resource with :meth:`Compact.from_resource`.
+
+    :param resource: A resource class with a ``fields`` schema.
+    :type resource: :class:`DotDict` subclass
+    :returns: A :class:`Compact` subclass.
+    """
+    cls = resource.__dict__.get('_compact')
+    if cls is None:
+        fields = tuple(f for f in resource.fields
+                       if not isinstance(f, Nested))
+        namespace = {'fields': fields, 'resource': resource}
+        slots = []
+        by_key = {}
+        for field in fields:
+            if field.lazy and field.convert is not None:
+                attr = '_lazy_' + field.name
+                namespace[field.name] = lazy_property(field, attr)
+                entry = (attr, None)
+            else:
+                attr = field.name
+                entry = (attr, field.convert)
+            slots.append(attr)
+            by_key[field.key] = by_key[field.name] = entry
+        namespace['__slots__'] = tuple(slots)
+        namespace['_by_key'] = by_key
+        cls = type('Compact' + resource.__name__, (Compact,), namespace)
+        resource._compact = cls
+    return cls
+
+
+def rebuild_compact(resource, values, extra):
+    """Returns a compact ``resource`` with slot ``values``, for pickle."""
+    cls = compact_type(resource)
+    obj = cls.__new__(cls)
+    object.__setattr__(obj, '_extra', extra)
+    for attr, value in values:
+        object.__setattr__(obj, attr, value)
+    return obj
+
+
+def lazy_property(field, attr):
+    """Returns a property converting the raw value kept in slot ``attr``."""
+    convert = field.convert
+
+    def fget(self):
+        value = object.__getattribute__(self, attr)
+        if value is not None:
+            value = convert(value)
+            object.__setattr__(self, attr, value)
+        return value
+
+    def fset(self, value):
+        object.__setattr__(self, attr, value)
+
+    return property(fget, fset)
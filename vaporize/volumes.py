@@ -1,14 +1,21 @@
 # -*- coding: utf-8 -*-
 
-import json
-
-from vaporize.core import convert_datetime, get_url, handle_request
-from vaporize.utils import DotDict
+from vaporize.core import (convert_datetime, dumps, get_url, handle_request,
+                           traced)
+from vaporize.utils import DotDict, Field
 
 
 class Volume(DotDict):
     """A CloudBlockStorage Volume."""
 
+    fields = (
+        Field('id'), Field('display_name', 'name'),
+        Field('display_description', 'description'), Field('size'),
+        Field('status'), Field('volume_type'), Field('snapshot_id'),
+        Field('availability_zone'), Field('attachments'), Field('metadata'),
+        Field('createdAt', convert=convert_datetime, lazy=True),
+    )
+
     def __repr__(self):
         if 'display_name' in self:
             return '<Volume %s>' % self['display_name']
@@ -24,6 +31,7 @@ class Volume(DotDict):
             value = convert_datetime(value)
         super(Volume, self).__setitem__(key, value)
 
+    @traced
     def delete(self):
         """Delete this CloudBlockStorage Volume."""
         assert 'id' in self
@@ -32,6 +40,7 @@ class Volume(DotDict):
         handle_request('delete', url)
 
     @classmethod
+    @traced
     def list(cls):
         """Returns a list of Volumes.
 
@@ -41,6 +50,7 @@ class Volume(DotDict):
         return handle_request('get', url, wrapper=cls, container='volumes')
 
     @classmethod
+    @traced
     def find(cls, id):
         """Returns a Volume by ID.
 
@@ -52,6 +62,7 @@ class Volume(DotDict):
         return handle_request('get', url, wrapper=cls, container='volume')
 
     @classmethod
+    @traced
     def create(cls, size, name=None, description=None, snapshot=None,
                volume_type=None):
         """Create a CloudBlockStorage Volume.
@@ -81,7 +92,7 @@ class Volume(DotDict):
             if isinstance(volume_type, VolumeType):
                 volume_type = volume_type.name
             data['volume']['volume_type'] = str(volume_type)
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudblockstorage'), 'volumes'])
         return handle_request('post', url, data, cls, 'volume')
 
@@ -98,7 +109,8 @@ class VolumeType(DotDict):
     def list(cls):
         """Returns a list of CloudBlockStorage Volume Types."""
         url = '/'.join((get_url('cloudblockstorage'), 'types'))
-        return handle_request('get', url, wrapper=cls, container='volume_types')
+        return handle_request('get', url, wrapper=cls, container='volume_types',
+                              cache=True)
 
     @classmethod
     def find(cls, id):
@@ -129,6 +141,7 @@ class Snapshot(DotDict):
             value = convert_datetime(value)
         super(Snapshot, self).__setitem__(key, value)
 
+    @traced
     def delete(self):
         """Delete this CloudBlockStorage Snapshot."""
         assert 'id' in self
@@ -137,6 +150,7 @@ class Snapshot(DotDict):
         handle_request('delete', url)
 
     @classmethod
+    @traced
     def list(cls):
         """Returns a list of Snapshots.
 
@@ -147,6 +161,7 @@ class Snapshot(DotDict):
         return handle_request('get', url, wrapper=cls, container='snapshots')
 
     @classmethod
+    @traced
     def find(cls, id):
         """Returns a Snapshot by ID
 
@@ -158,6 +173,7 @@ class Snapshot(DotDict):
         return handle_request('get', url, wrapper=cls, container='snapshot')
 
     @classmethod
+    @traced
     def create(cls, volume, force=False, name=None, description=None):
         """Create a CloudBlockStorage Snapshot.
 
@@ -180,6 +196,6 @@ class Snapshot(DotDict):
             data['snapshot']['display_name'] = str(name)
         if description:
             data['snapshot']['display_descrition'] = str(description)
-        data = json.dumps(data)
+        data = dumps(data)
         url = '/'.join([get_url('cloudblockstorage'), 'snapshots'])
         return handle_request('post', url, data, cls, 'snapshot')
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""Wait for many resources to reach a status at once.
+
+    >>> from vaporize import waiters
+    >>> servers = [NextGenServer.create(...) for i in range(200)]
+    >>> handles = waiters.wait(servers, 'ACTIVE', timeout=1800)
+    >>> [h.obj for h in handles if h.exception()]
+    []
+
+Instead of reloading each resource, a :class:`Waiter` lists every resource
+of a type once per tick and updates the resources it tracks in place, so the
+cost of polling does not grow with the number of resources. Polling backs
+off while nothing changes and speeds up again when something does.
+
+Each tracked resource gets a :class:`Handle`, which works like a future:
+it can be waited on, and callbacks run as soon as the resource reaches its
+status, fails or times out.
+"""
+
+import sys
+import threading
+import time
+
+from vaporize import databases, loadbalancers, nextgen_servers, servers, volumes
+from vaporize.core import current_client, intercepted
+from vaporize.exceptions import WaitError, WaitTimeout
+
+# Servers per listing page; the largest page the API will return, so that
+# fleets of up to this size cost one request per tick.
+PAGE_SIZE = 1000
+
+# How to list every resource of a type with its current status.
+LISTERS = {
+    databases.Instance: lambda: databases.Instance.list(),
+    loadbalancers.LoadBalancer: lambda: loadbalancers.LoadBalancer.iter_all(),
+    nextgen_servers.NextGenServer:
+        lambda: nextgen_servers.NextGenServer.iter_all(True, PAGE_SIZE),
+    servers.Server: lambda: servers.Server.iter_all(True, PAGE_SIZE),
+    volumes.Volume: lambda: volumes.Volume.list(),
+}
+
+# Statuses a resource does not recover from without intervention.
+FAILURES = {
+    databases.Instance: ('ERROR', 'FAILED'),
+    loadbalancers.LoadBalancer: ('ERROR', 'SUSPENDED'),
+    nextgen_servers.NextGenServer: ('ERROR',),
+    servers.Server: ('ERROR', 'UNKNOWN'),
+    volumes.Volume: ('ERROR',),
+}
+
+
+def get_lister(cls):
+    """Returns the lister for a resource class or one of its bases."""
+    for klass in cls.__mro__:
+        if klass in LISTERS:
+            return LISTERS[klass]
+    raise TypeError('Cannot wait on %s resources' % cls.__name__)
+
+
+def check_blocking(name):
+    """Raise if requests are intercepted, as waiting would block them."""
+    if intercepted():
+        raise RuntimeError('%s sleeps between requests; await '
+                           'vaporize.aio.wait instead' % name)
+
+
+def get_failures(cls):
+    """Returns the failure statuses of a resource class."""
+    for klass in cls.__mro__:
+        if klass in FAILURES:
+            return FAILURES[klass]
+    return ('ERROR',)
+
+
+class Handle(object):
+    """Tracks one resource until it reaches a status.
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, obj, status, failure, deadline):
+        self.obj = obj
+        self.status = frozenset(s.upper() for s in status)
+        self.failure = frozenset(s.upper() for s in failure)
+        self.deadline = deadline
+        self._event = threading.Event()
+        self._exception = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        if not self.done():
+            return '<Handle %r pending>' % (self.obj,)
+        if self._exception is not None:
+            return '<Handle %r %r>' % (self.obj, self._exception)
+        return '<Handle %r done>' % (self.obj,)
+
+    def done(self):
+        """``True`` once the resource reached its status, failed or timed
+        out."""
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the resource and return it.
+
+        :param timeout: Seconds to wait (default: until the handle is done).
+        :type timeout: float
+        :raises: :class:`~vaporize.exceptions.WaitError` if the resource
+            failed, :class:`~vaporize.exceptions.WaitTimeout` if it timed out
+            or ``timeout`` elapsed first.
+        """
+        exception = self.exception(timeout)
+        if exception is not None:
+            raise exception
+        return self.obj
+
+    def exception(self, timeout=None):
+        """Wait for the resource and return its exception, if any.
+
+        :raises: :class:`~vaporize.exceptions.WaitTimeout` if ``timeout``
+            elapsed first.
+        """
+        if not self._event.wait(timeout):
+            raise WaitTimeout('%r is still pending' % (self.obj,))
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """Call ``callback(handle)`` once the handle is done, or now if it
+        already is."""
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def update(self, fresh, now):
+        """Update the resource from a listing.
+
+        :param fresh: The resource as listed, or ``None`` if it was not.
+        :param now: The time of the listing.
+        :returns: ``True`` if the resource's status changed.
+        :rtype: bool
+        """
+        previous = self.obj.get('status')
+        if fresh is None:
+            if 'DELETED' in self.status:
+                self.finish()
+                return True
+        else:
+            dict.update(self.obj, fresh)
+            status = (fresh.get('status') or '').upper()
+            if status in self.status:
+                self.finish()
+            elif status in self.failure:
+                self.finish(WaitError('%r is %s' % (self.obj, status)))
+        if not self.done() and now >= self.deadline:
+            self.finish(WaitTimeout('%r is still %s' % (self.obj, previous)))
+        return self.obj.get('status') != previous
+
+    def finish(self, exception=None):
+        with self._lock:
+            self._exception = exception
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                pass
+
+
+class Waiter(object):
+    """Polls many resources until each reaches a status.
+
+        >>> waiter = waiters.Waiter(interval=5)
+        >>> for server in servers:
+        ...     waiter.add(server, 'ACTIVE', callback=configure)
+        >>> waiter.add(lb, 'ACTIVE')
+        >>> waiter.run()
+
+    Each tick makes one listing per type of resource being waited on. The
+    requests are made with the :class:`~vaporize.core.Client` current when
+    the Waiter was created.
+
+    :param interval: Seconds between ticks while statuses are changing.
+    :type interval: float
+    :param max_interval: Longest time between ticks.
+    :type max_interval: float
+    :param backoff: Factor the time between ticks grows by after a tick in
+        which no status changed.
+    :type backoff: float
+    :param timeout: Default seconds to wait for each resource.
+    :type timeout: float
+
+    .. versionadded:: 0.4
+    """
+    def __init__(self, interval=5.0, max_interval=60.0, backoff=1.5,
+                 timeout=3600.0):
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.client = current_client()
+        self.pending = []
+        self.ticks = 0
+        self.error = None
+        self._interval = interval
+        self._changed = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, obj, status='ACTIVE', failure=None, timeout=None,
+            callback=None):
+        """Start waiting on a resource.
+
+        :param obj: A Server, NextGenServer, LoadBalancer, database Instance
+            or Volume.
+        :param status: The status, or statuses, to wait for. ``DELETED``
+            also matches a resource that is no longer listed.
+        :type status: str or tuple
+        :param failure: Statuses to stop waiting at (default: the error
+            statuses of the resource type).
+        :type failure: tuple
+        :param timeout: Seconds to wait (default: the Waiter's ``timeout``).
+        :type timeout: float
+        :param callback: Called with the :class:`Handle` once it is done.
+        :type callback: callable
+        :rtype: :class:`Handle`
+        """
+        get_lister(type(obj))
+        if not isinstance(status, (list, tuple, set, frozenset)):
+            status = (status,)
+        if failure is None:
+            failure = get_failures(type(obj))
+        if timeout is None:
+            timeout = self.timeout
+        handle = Handle(obj, status, failure, time.time() + timeout)
+        if callback is not None:
+            handle.add_done_callback(callback)
+        with self._lock:
+            self.pending.append(handle)
+        return handle
+
+    def poll(self):
+        """Make one tick of listings and update the pending resources.
+
+        A tick cut short by an exception can be polled again, as
+        :mod:`vaporize.aio` does: handles finished by the earlier attempt
+        are left as they are, and still count as changed.
+
+        :returns: The number of resources whose status changed.
+        :rtype: int
+        """
+        with self._lock:
+            pending = list(self.pending)
+        by_type = {}
+        for handle in pending:
+            by_type.setdefault(get_lister(type(handle.obj)), []).append(handle)
+        for lister, handles in by_type.items():
+            with self.client:
+                listed = dict((r['id'], r) for r in lister())
+            now = time.time()
+            for handle in handles:
+                if handle.done():
+                    continue
+                if handle.update(listed.get(handle.obj['id']), now):
+                    self._changed.add(handle)
+        changed = len(self._changed)
+        self._changed = set()
+        self.ticks += 1
+        with self._lock:
+            self.pending = [h for h in self.pending if not h.done()]
+        return changed
+
+    def tick(self):
+        """Poll once, timing out resources through errors.
+
+        :returns: Seconds to sleep before the next tick, or ``None`` once
+            every resource added so far is done.
+        :rtype: float
+        """
+        try:
+            changed = self.poll()
+            self.error = None
+        except Exception:
+            # Keep polling through transient errors until the resources
+            # time out.
+            self.error = sys.exc_info()[1]
+            changed = 0
+            now = time.time()
+            for handle in list(self.pending):
+                if now >= handle.deadline:
+                    handle.finish(WaitTimeout('%r timed out: %r' % (
+                        handle.obj, self.error)))
+            with self._lock:
+                self.pending = [h for h in self.pending if not h.done()]
+        with self._lock:
+            if not self.pending:
+                return None
+            deadline = min(h.deadline for h in self.pending)
+        if changed:
+            self._interval = self.interval
+        else:
+            self._interval = min(self._interval * self.backoff,
+                                 self.max_interval)
+        return max(min(self._interval, deadline - time.time()), 0)
+
+    def run(self):
+        """Poll until every resource added so far is done.
+
+        :raises: RuntimeError while requests are intercepted; await
+            :func:`vaporize.aio.wait` instead.
+        """
+        check_blocking('Waiter.run')
+        self._interval = self.interval
+        while True:
+            delay = self.tick()
+            if delay is None:
+                return
+            time.sleep(delay)
+
+    def start(self):
+        """Poll in a background thread. Returns the Waiter."""
+        check_blocking('Waiter.start')
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+
+def wait(objects, status='ACTIVE', failure=None, timeout=3600.0, interval=5.0,
+         max_interval=60.0, callback=None):
+    """Wait until every resource reaches a status.
+
+    Resources are updated in place. Failures and timeouts do not stop the
+    wait; check each handle's :meth:`~Handle.exception`.
+
+    :param objects: Servers, NextGenServers, LoadBalancers, database
+        Instances or Volumes, in any mix.
+    :type objects: list
+    :param status: The status, or statuses, to wait for.
+    :type status: str or tuple
+    :param failure: Statuses to stop waiting at.
+    :type failure: tuple
+    :param timeout: Seconds to wait for each resource.
+    :type timeout: float
+    :param interval: Seconds between ticks while statuses are changing.
+    :type interval: float
+    :param max_interval: Longest time between ticks.
+    :type max_interval: float
+    :param callback: Called with each :class:`Handle` as soon as it is done.
+    :type callback: callable
+    :returns: A handle for each resource, in the same order.
+    :rtype: list of :class:`Handle`
+
+    .. versionadded:: 0.4
+    """
+    waiter = Waiter(interval, max_interval, timeout=timeout)
+    handles = [waiter.add(obj, status, failure, callback=callback)
+               for obj in objects]
+    waiter.run()
+    return handles